@@ -0,0 +1,664 @@
+#!/usr/bin/env python3
+"""
+AI Gateway - UnifiedAI'ı OpenAI uyumlu tek bir HTTP servisi olarak çalıştır
+One shared UnifiedAI (one connection pool, one cache, one rate limiter,
+one set of circuit breakers) behind an OpenAI-compatible API, so every app
+can use the plain OpenAI SDK against it:
+
+    POST /v1/chat/completions   JSON or SSE (stream=true)
+    GET  /v1/models             'auto', provider names and 'provider/model'
+    GET  /health                200 while serving, 503 while draining
+    GET  /metrics               Prometheus text (call histograms)
+
+`model` selects the provider: "auto", "groq", "groq/llama3-70b-8192", or a
+model name with a known prefix (gpt-*, claude-*, gemini-*). The caller's
+`user` field (or an X-Tenant header) is charged against TokenBudget tenant
+quotas.
+
+Built on asyncio streams (no extra dependencies). SIGTERM / SIGINT stop
+accepting connections, close idle keep-alive connections and let in-flight
+requests (streams included) finish for up to --drain-timeout seconds.
+
+--workers N pre-forks N worker processes on one listening socket, so JSON
+and SDK work spreads over all cores. The workers share one SQLite (WAL)
+state file: the response cache, the rate-limit buckets and the circuit
+breakers, so more workers add throughput, not upstream quota usage. The
+parent restarts crashed workers and forwards SIGTERM / SIGINT to them
+(/metrics is per worker).
+
+Usage:
+    python ai_gateway.py --port 8080
+    python ai_gateway.py --port 8080 --workers 4 --state-db /var/tmp/ai_gateway.db
+    OPENAI_BASE_URL=http://127.0.0.1:8080/v1 OPENAI_API_KEY=unused python app.py
+"""
+
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+import uuid
+from typing import Optional, Dict, Any, List, Tuple, Set
+
+from unified_ai_client import (
+    UnifiedAI, ResponseCache, RateLimiter, SharedRateLimiter, SharedState,
+    Instrumentation, Metrics, DEFAULT_MODELS, FREE_TIER_LIMITS, is_throttle_error
+)
+
+# Async SDK clients per provider, built before serving (see AIGateway.start)
+ASYNC_CLIENTS = {'gemini': 'gemini', 'openai': 'openai_async', 'claude': 'claude_async', 'groq': 'groq_async'}
+
+# SDK modules the parent imports before forking, so workers share them copy-on-write
+SDK_MODULES = ('google.generativeai', 'openai', 'anthropic', 'groq')
+
+# Model name prefix -> provider, for clients that send plain model names
+MODEL_PREFIXES = {'gpt-': 'openai', 'o1': 'openai', 'claude-': 'claude', 'gemini-': 'gemini'}
+
+HTTP_REASONS = {
+    200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+    405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large',
+    429: 'Too Many Requests', 500: 'Internal Server Error', 502: 'Bad Gateway',
+    503: 'Service Unavailable'
+}
+
+
+class GatewayError(Exception):
+    """Request error answered with an OpenAI-style error body"""
+
+    def __init__(self, status: int, message: str, error_type: str = 'invalid_request_error'):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+    def body(self) -> Dict[str, Any]:
+        return {'error': {'message': str(self), 'type': self.error_type, 'code': None}}
+
+
+def _chunk(data: bytes) -> bytes:
+    """One HTTP/1.1 chunk"""
+    return b'%x\r\n%s\r\n' % (len(data), data)
+
+
+class AIGateway:
+    """OpenAI-compatible asyncio HTTP server in front of one UnifiedAI"""
+
+    def __init__(
+        self,
+        ai: UnifiedAI,
+        host: str = '127.0.0.1',
+        port: int = 8080,
+        api_keys: Optional[Set[str]] = None,
+        drain_timeout: float = 30.0,
+        keepalive_timeout: float = 75.0,
+        max_body: int = 1024 * 1024
+    ):
+        """
+        Args:
+            ai: The shared client (its cache / limiter / breakers serve every app)
+            api_keys: Accepted bearer tokens (None: no authentication)
+            drain_timeout: Seconds in-flight requests get to finish on shutdown
+            keepalive_timeout: Idle keep-alive connections are closed after this
+            max_body: Largest accepted request body (bytes)
+        """
+        self.ai = ai
+        self.host = host
+        self.port = port
+        self.api_keys = api_keys
+        self.drain_timeout = drain_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body = max_body
+        self.draining = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        # connection task -> True while it is handling a request
+        self._connections: Dict[asyncio.Task, bool] = {}
+        self._inflight = 0
+        self._drained: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    # ---- Lifecycle ----
+
+    async def start(self, sock: Optional[socket.socket] = None) -> 'AIGateway':
+        """
+        Start listening (port 0 picks a free port)
+        
+        Args:
+            sock: Already bound listening socket (pre-fork workers share one)
+        """
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._stop = asyncio.Event()
+        # Import the SDKs now, in a thread: a first-use import inside the event
+        # loop would stall every connection for the length of the import
+        await asyncio.get_running_loop().run_in_executor(None, self._warm_up)
+        if sock is not None:
+            self._server = await asyncio.start_server(self._handle_connection, sock=sock)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+        return self
+
+    async def serve_forever(self, sock: Optional[socket.socket] = None):
+        """Serve until SIGTERM / SIGINT (or stop()), then shut down gracefully"""
+        if self._server is None:
+            await self.start(sock)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass   # Windows / not the main thread: use stop()
+        if sock is None:
+            print(f"🚪 AI gateway on {self.url}/v1  (providers: {', '.join(self.ai.available_providers) or 'none'})", flush=True)
+        await self._stop.wait()
+        await self.shutdown()
+
+    def _warm_up(self):
+        for provider in self.ai.available_providers:
+            if provider in ASYNC_CLIENTS:
+                getattr(self.ai, ASYNC_CLIENTS[provider])
+
+    def stop(self):
+        """Ask serve_forever() to shut down"""
+        self._stop.set()
+
+    async def shutdown(self):
+        """Stop accepting, drain in-flight requests, close the client"""
+        self.draining = True
+        self._server.close()
+        # Let requests already on the wire be read before idle connections are closed
+        await asyncio.sleep(0.05)
+        for task, busy in list(self._connections.items()):
+            if not busy:
+                task.cancel()
+        if self._inflight:
+            print(f"⏳ Draining {self._inflight} in-flight request(s)...", flush=True)
+            try:
+                await asyncio.wait_for(self._drained.wait(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Drain timeout: cancelling {self._inflight} request(s)", flush=True)
+        for task in list(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        await self.ai.aclose()
+        self.ai.close()
+        if self.ai.shared_state is not None:
+            self.ai.shared_state.close()
+        print(f"👋 Gateway stopped (pid {os.getpid()})", flush=True)
+
+    # ---- HTTP/1.1 plumbing ----
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = False
+        try:
+            while not self.draining:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.keepalive_timeout)
+                except GatewayError as e:
+                    await self._send_json(writer, e.status, e.body(), keep_alive=False)
+                    break
+                except (ValueError, asyncio.LimitOverrunError):
+                    # StreamReader.readline() over its 64 KiB line limit
+                    await self._send_json(writer, 400, GatewayError(400, 'request line or header too long').body(),
+                                          keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._connections[task] = True
+                self._request_started()
+                try:
+                    keep_alive = await self._dispatch(writer, method, path, headers, body, keep_alive)
+                finally:
+                    self._request_finished()
+                    self._connections[task] = False
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    def _request_started(self):
+        self._inflight += 1
+        self._drained.clear()
+
+    def _request_finished(self):
+        self._inflight -= 1
+        if not self._inflight:
+            self._drained.set()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """(method, path, lower-cased headers, body), None on a closed connection"""
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise GatewayError(400, 'malformed request line')
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > 100:
+                raise GatewayError(400, 'too many headers')
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            raise GatewayError(411, 'chunked request bodies are not supported, send Content-Length')
+        content_length = headers.get('content-length') or '0'
+        if not content_length.isdigit():
+            raise GatewayError(400, f'invalid Content-Length: {content_length[:40]!r}')
+        length = int(content_length)
+        if length > self.max_body:
+            raise GatewayError(413, f'request body over {self.max_body} bytes')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target.split('?', 1)[0], headers, body
+
+    def _head(self, status: int, headers: Dict[str, str], keep_alive: bool) -> bytes:
+        lines = [f'HTTP/1.1 {status} {HTTP_REASONS.get(status, "")}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        lines.append(f"Connection: {'keep-alive' if keep_alive and not self.draining else 'close'}")
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str, keep_alive: bool = True):
+        writer.write(self._head(status, {'Content-Type': content_type, 'Content-Length': str(len(body))}, keep_alive) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, body: Any, keep_alive: bool = True):
+        await self._send(writer, status, json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json', keep_alive)
+
+    # ---- Routing ----
+
+    async def _dispatch(self, writer, method: str, path: str, headers: Dict[str, str], body: bytes, keep_alive: bool) -> bool:
+        """Answer one request, return whether the connection stays open"""
+        try:
+            if path == '/health':
+                status = 503 if self.draining else 200
+                await self._send_json(writer, status, {'status': 'draining' if self.draining else 'ok',
+                                                        'inflight': self._inflight, 'pid': os.getpid()}, keep_alive)
+                return keep_alive
+            if path == '/metrics':
+                metrics = self.ai.instrumentation.metrics if self.ai.instrumentation else None
+                if metrics is None:
+                    raise GatewayError(404, 'metrics are not enabled')
+                await self._send(writer, 200, metrics.prometheus_text().encode('utf-8'),
+                                 'text/plain; version=0.0.4; charset=utf-8', keep_alive)
+                return keep_alive
+            self._authenticate(headers)
+            if path == '/v1/models':
+                await self._send_json(writer, 200, self._models(), keep_alive)
+                return keep_alive
+            if path == '/v1/chat/completions':
+                if method != 'POST':
+                    raise GatewayError(405, 'use POST')
+                return await self._chat_completions(writer, headers, body, keep_alive)
+            raise GatewayError(404, f'unknown path: {path}')
+        except GatewayError as e:
+            await self._send_json(writer, e.status, e.body(), keep_alive)
+            return keep_alive
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception:
+            # A bug or an unexpected client/cache error: answer instead of
+            # dropping the connection, and close it (its state is unknown)
+            print(f"⚠️ Internal error on {method} {path}:", file=sys.stderr, flush=True)
+            traceback.print_exc()
+            await self._send_json(writer, 500, GatewayError(500, 'internal server error', 'server_error').body(),
+                                  keep_alive=False)
+            return False
+
+    def _authenticate(self, headers: Dict[str, str]):
+        if self.api_keys is None:
+            return
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or token not in self.api_keys:
+            raise GatewayError(401, 'invalid API key', 'authentication_error')
+
+    def _models(self) -> Dict[str, Any]:
+        created = int(time.time())
+        ids = [('auto', 'unified-ai')]
+        for provider in self.ai.available_providers:
+            ids += [(provider, provider), (f'{provider}/{DEFAULT_MODELS[provider]}', provider)]
+        return {'object': 'list', 'data': [
+            {'id': model_id, 'object': 'model', 'created': created, 'owned_by': owner}
+            for model_id, owner in ids
+        ]}
+
+    # ---- /v1/chat/completions ----
+
+    def _resolve_model(self, name: Optional[str]) -> Tuple[str, Optional[str]]:
+        """OpenAI `model` -> (provider, model)"""
+        if not name or name == 'auto':
+            return 'auto', None
+        provider, _, model = name.partition('/')
+        if provider in DEFAULT_MODELS:
+            return provider, model or None
+        for prefix, provider in MODEL_PREFIXES.items():
+            if name.startswith(prefix):
+                return provider, name
+        raise GatewayError(400, f"unknown model '{name}': use 'auto', a provider name or 'provider/model'")
+
+    @staticmethod
+    def _number(
+        request: Dict[str, Any],
+        name: str,
+        default: float,
+        minimum: float,
+        maximum: Optional[float],
+        integer: bool = False
+    ) -> float:
+        """Numeric request field (null / missing: default), 400 if out of type or range"""
+        value = request.get(name)
+        if value is None:
+            return default
+        kind = 'an integer' if integer else 'a number'
+        if isinstance(value, bool) or not isinstance(value, int if integer else (int, float)):
+            raise GatewayError(400, f"'{name}' must be {kind}")
+        if value < minimum or (maximum is not None and value > maximum):
+            bounds = f'>= {minimum:g}' if maximum is None else f'between {minimum:g} and {maximum:g}'
+            raise GatewayError(400, f"'{name}' must be {bounds}")
+        return value
+
+    @staticmethod
+    def _prompt(messages: List[Dict[str, Any]]) -> Tuple[str, Optional[str]]:
+        """OpenAI messages -> (prompt, system); earlier turns become a transcript"""
+        def text(content: Any) -> str:
+            if isinstance(content, list):   # content parts: keep the text ones
+                return ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+            return str(content or '')
+
+        system = '\n\n'.join(text(m.get('content')) for m in messages if m.get('role') in ('system', 'developer'))
+        turns = [m for m in messages if m.get('role') not in ('system', 'developer')]
+        if not turns:
+            raise GatewayError(400, 'messages must contain a user message')
+        if len(turns) == 1:
+            return text(turns[0].get('content')), system or None
+        transcript = '\n\n'.join(f"{m.get('role', 'user').capitalize()}: {text(m.get('content'))}" for m in turns)
+        return transcript + '\n\nAssistant:', system or None
+
+    @staticmethod
+    def _usage(usage: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """UnifiedAI usage -> OpenAI usage"""
+        if usage is None:
+            return None
+        return {
+            'prompt_tokens': usage['input_tokens'],
+            'completion_tokens': usage['output_tokens'],
+            'total_tokens': usage['total_tokens'],
+            'prompt_tokens_details': {'cached_tokens': usage['cached_tokens']}
+        }
+
+    @staticmethod
+    def _upstream_error(result: Dict[str, Any]) -> GatewayError:
+        error = result.get('error') or 'generation failed'
+        if is_throttle_error(error) or 'token budget' in error or 'rate limited' in error:
+            return GatewayError(429, error, 'rate_limit_error')
+        if 'not available' in error or 'Unknown provider' in error:
+            return GatewayError(400, error)
+        return GatewayError(502, error, 'upstream_error')
+
+    async def _chat_completions(self, writer, headers: Dict[str, str], body: bytes, keep_alive: bool) -> bool:
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise GatewayError(400, 'request body is not valid JSON')
+        if not isinstance(request, dict) or not isinstance(request.get('messages'), list):
+            raise GatewayError(400, "'messages' is required")
+        if not all(isinstance(m, dict) for m in request['messages']):
+            raise GatewayError(400, "'messages' must be a list of message objects")
+        provider, model = self._resolve_model(request.get('model'))
+        prompt, system = self._prompt(request['messages'])
+        max_tokens_field = 'max_completion_tokens' if request.get('max_completion_tokens') is not None else 'max_tokens'
+        options = dict(
+            provider=provider,
+            model=model,
+            temperature=self._number(request, 'temperature', 0.7, 0.0, 2.0),
+            max_tokens=self._number(request, max_tokens_field, 1000, 1, None, integer=True),
+            system=system,
+            tenant=headers.get('x-tenant') or request.get('user')
+        )
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+        created = int(time.time())
+
+        if not request.get('stream'):
+            result = await self.ai.agenerate(prompt, **options)
+            if not result['success']:
+                raise self._upstream_error(result)
+            await self._send_json(writer, 200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': f"{result['provider']}/{result['model']}",
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': result['text']},
+                    'finish_reason': 'stop'
+                }],
+                'usage': self._usage(result.get('usage'))
+            }, keep_alive)
+            return keep_alive
+
+        include_usage = bool((request.get('stream_options') or {}).get('include_usage'))
+        return await self._stream(writer, prompt, options, completion_id, created, include_usage, keep_alive)
+
+    async def _stream(
+        self,
+        writer: asyncio.StreamWriter,
+        prompt: str,
+        options: Dict[str, Any],
+        completion_id: str,
+        created: int,
+        include_usage: bool,
+        keep_alive: bool
+    ) -> bool:
+        """SSE response; writer.drain() applies the client's backpressure upstream"""
+        records = self.ai.agenerate_stream(prompt, **options)
+        started = False
+        model = options['provider'] if options['model'] is None else f"{options['provider']}/{options['model']}"
+
+        def event(payload: Any) -> bytes:
+            data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+            return _chunk(f'data: {data}\n\n'.encode('utf-8'))
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> Dict[str, Any]:
+            return {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}], **extra}
+
+        try:
+            async for record in records:
+                if record['type'] == 'chunk':
+                    if not started:
+                        # Headers wait for the first token: errors before it get a real status
+                        writer.write(self._head(200, {'Content-Type': 'text/event-stream',
+                                                      'Cache-Control': 'no-cache',
+                                                      'Transfer-Encoding': 'chunked'}, keep_alive))
+                        writer.write(event(chunk({'role': 'assistant', 'content': ''})))
+                        started = True
+                    writer.write(event(chunk({'content': record['text']})))
+                    await writer.drain()
+                    continue
+                result = record
+                if not started:
+                    if not result['success']:
+                        raise self._upstream_error(result)
+                    writer.write(self._head(200, {'Content-Type': 'text/event-stream',
+                                                  'Cache-Control': 'no-cache',
+                                                  'Transfer-Encoding': 'chunked'}, keep_alive))
+                    started = True
+                if result['success']:
+                    model = f"{result['provider']}/{result['model']}"
+                    writer.write(event(chunk({}, 'stop')))
+                    if include_usage:
+                        writer.write(event({**chunk({}), 'choices': [], 'usage': self._usage(result.get('usage'))}))
+                else:
+                    # Failed after the first token: OpenAI-style error event
+                    writer.write(event({'error': self._upstream_error(result).body()['error']}))
+                writer.write(event('[DONE]') + _chunk(b''))
+                await writer.drain()
+        except (GatewayError, ConnectionError):
+            raise
+        except Exception:
+            if not started:
+                raise   # no bytes sent yet: _dispatch answers with a 500
+            # Headers already sent: end the stream with an error event
+            print("⚠️ Internal error while streaming:", file=sys.stderr, flush=True)
+            traceback.print_exc()
+            writer.write(event(GatewayError(500, 'internal server error', 'server_error').body())
+                         + event('[DONE]') + _chunk(b''))
+            await writer.drain()
+            return False
+        finally:
+            await records.aclose()   # client gone: stop the upstream stream too
+        return keep_alive
+
+
+def build_client(args: argparse.Namespace, state_db: Optional[str] = None) -> UnifiedAI:
+    """
+    The shared UnifiedAI: cache, free-tier rate limits and metrics on by default
+    
+    With state_db (worker mode) the cache, the rate limiter and the circuit
+    breakers are backed by that file and shared by every worker process.
+    """
+    shared = SharedState(state_db) if state_db else None
+    cache = None
+    if args.cache_size:
+        cache = ResponseCache(max_entries=args.cache_size, sqlite_path=args.cache_db or state_db)
+    rate_limiter = None
+    if args.rate_limit:
+        rate_limiter = (SharedRateLimiter(shared, FREE_TIER_LIMITS, max_wait=args.max_queue_wait) if shared
+                        else RateLimiter(FREE_TIER_LIMITS, max_wait=args.max_queue_wait))
+    return UnifiedAI(
+        cache=cache,
+        rate_limiter=rate_limiter,
+        instrumentation=Instrumentation(metrics=Metrics(), labels={'service': 'gateway', 'worker': str(os.getpid())}),
+        shared_state=shared
+    )
+
+
+def run_worker(args: argparse.Namespace, sock: socket.socket, state_db: str):
+    """Worker process body (after fork): own event loop, SDK clients and pools"""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    gateway = AIGateway(build_client(args, state_db), api_keys=args.api_keys, drain_timeout=args.drain_timeout)
+    asyncio.run(gateway.serve_forever(sock))
+
+
+def run_workers(args: argparse.Namespace):
+    """Pre-fork supervisor: bind once, fork workers, restart crashed ones, forward signals"""
+    if not hasattr(os, 'fork'):
+        print("❌ --workers needs os.fork() (Linux / macOS)", file=sys.stderr)
+        sys.exit(1)
+    state_dir = None
+    state_db = args.state_db
+    if state_db is None:
+        state_dir = tempfile.mkdtemp(prefix='ai_gateway_')
+        state_db = os.path.join(state_dir, 'state.db')
+    SharedState(state_db).close()   # create the tables once, before the workers race for it
+    # Import the SDKs once here (seconds of CPU each); forked workers inherit
+    # them instead of importing them N times. Clients and pools are built per worker.
+    for module in SDK_MODULES:
+        if importlib.util.find_spec(module.split('.')[0]) and importlib.util.find_spec(module):
+            importlib.import_module(module)
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.setblocking(False)
+    host, port = sock.getsockname()[:2]
+    workers: Dict[int, int] = {}   # pid -> worker number
+    stopping = False
+
+    def spawn(number: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(args, sock, state_db)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = number
+
+    def forward(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for number in range(args.workers):
+        spawn(number)
+    print(f"🚪 AI gateway on http://{host}:{port}/v1  ({args.workers} workers, state: {state_db})", flush=True)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        number = workers.pop(pid, None)
+        if number is not None and not stopping:
+            print(f"⚠️ Worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting", flush=True)
+            time.sleep(0.5)   # no busy restart loop if workers crash on start
+            spawn(number)
+    sock.close()
+    if state_dir is not None:
+        for name in os.listdir(state_dir):
+            os.remove(os.path.join(state_dir, name))
+        os.rmdir(state_dir)
+    print("👋 Gateway stopped", flush=True)
+
+
+def main():
+    """Main CLI function"""
+    parser = argparse.ArgumentParser(description='OpenAI-compatible gateway in front of UnifiedAI')
+    parser.add_argument('--host', default=os.getenv('GATEWAY_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('GATEWAY_PORT', '8080')))
+    parser.add_argument('--api-key', action='append',
+                        help='Accepted bearer token (repeatable; default: GATEWAY_API_KEYS, comma separated; none = open)')
+    parser.add_argument('--cache-size', type=int, default=4096, help='Response cache entries (0 = off)')
+    parser.add_argument('--cache-db', help='SQLite file for the response cache (survives restarts)')
+    parser.add_argument('--no-rate-limit', dest='rate_limit', action='store_false', help='Disable free-tier rate limits')
+    parser.add_argument('--max-queue-wait', type=float, default=5.0, help='Longest a request queues on a rate limit (s)')
+    parser.add_argument('--drain-timeout', type=float, default=30.0, help='Seconds to finish in-flight requests on shutdown')
+    parser.add_argument('--workers', type=int, default=1, help='Pre-forked worker processes (e.g. one per core)')
+    parser.add_argument('--state-db', help='Shared state file for --workers (default: a temporary file)')
+    args = parser.parse_args()
+
+    keys = args.api_key or [k for k in os.getenv('GATEWAY_API_KEYS', '').split(',') if k]
+    args.api_keys = set(keys) or None
+    if args.workers > 1:
+        run_workers(args)
+        return
+    gateway = AIGateway(
+        build_client(args), args.host, args.port,
+        api_keys=args.api_keys, drain_timeout=args.drain_timeout
+    )
+    asyncio.run(gateway.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Provider Benchmark - UnifiedAI istemci tarafı performansını API key olmadan ölç
+Runs every provider path of UnifiedAI against the local mock servers in
+mock_providers.py (started in a separate process, so the numbers and the
+allocation tracing only cover the client) and reports:
+
+    throughput (req/s), p50/p95/p99 latency, p50 time to first token
+    (stream modes), and allocations per call (tracemalloc: peak KiB while
+    a call runs, bytes still held after it)
+
+With --latency 0 the latency columns are pure client + loopback overhead.
+
+Usage:
+    python benchmark_providers.py                              # all providers, sync
+    python benchmark_providers.py --mode sync async stream astream
+    python benchmark_providers.py --providers openai ollama --requests 500 --concurrency 32
+    python benchmark_providers.py --latency 0.2 --jitter 0.05 --stream-rate 50 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PROVIDERS = ['gemini', 'openai', 'claude', 'groq', 'huggingface', 'ollama']
+MODES = ['sync', 'async', 'stream', 'astream']
+
+# Pairs the client cannot run against the mock: Gemini is pointed at it over
+# the REST transport, and google-generativeai has no async calls over REST
+UNSUPPORTED = {
+    ('gemini', 'async'): 'no async over the Gemini REST transport',
+    ('gemini', 'astream'): 'no async over the Gemini REST transport',
+}
+
+
+def start_mock_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """Start mock_providers.py in a child process, return (process, url)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, 'mock_providers.py'), '--port', '0',
+         '--latency', str(args.latency), '--jitter', str(args.jitter),
+         '--stream-rate', str(args.stream_rate), '--output-tokens', str(args.output_tokens),
+         '--error-rate', str(args.error_rate), '--error-status', str(args.error_status)],
+        stdout=subprocess.PIPE, text=True
+    )
+    # First line: "🧪 Mock providers on http://127.0.0.1:PORT"
+    url = process.stdout.readline().strip().split()[-1]
+    return process, url
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Sample:
+    """One measured call"""
+    __slots__ = ('latency', 'ttft', 'success')
+
+    def __init__(self, latency: float, ttft: Optional[float], success: bool):
+        self.latency = latency
+        self.ttft = ttft
+        self.success = success
+
+
+def call_sync(ai, provider: str, mode: str, prompt: str, max_tokens: int) -> Sample:
+    started = time.perf_counter()
+    if mode == 'stream':
+        result = None
+        for record in ai.generate_stream(prompt, provider=provider, max_tokens=max_tokens):
+            result = record
+        return Sample(time.perf_counter() - started, result.get('time_to_first_token'), result['success'])
+    result = ai.generate(prompt, provider=provider, max_tokens=max_tokens)
+    return Sample(time.perf_counter() - started, None, result['success'])
+
+
+async def call_async(ai, provider: str, mode: str, prompt: str, max_tokens: int) -> Sample:
+    started = time.perf_counter()
+    if mode == 'astream':
+        result = None
+        async for record in ai.agenerate_stream(prompt, provider=provider, max_tokens=max_tokens):
+            result = record
+        return Sample(time.perf_counter() - started, result.get('time_to_first_token'), result['success'])
+    result = await ai.agenerate(prompt, provider=provider, max_tokens=max_tokens)
+    return Sample(time.perf_counter() - started, None, result['success'])
+
+
+def run_load(
+    ai,
+    loop: asyncio.AbstractEventLoop,
+    provider: str,
+    mode: str,
+    requests: int,
+    concurrency: int,
+    max_tokens: int
+) -> Tuple[List[Sample], float]:
+    """Fire `requests` calls with `concurrency` in flight, return (samples, wall time)"""
+    # Unique prompts: no response-cache hits, no request coalescing
+    prompts = [f'benchmark {provider} {mode} {i}' for i in range(requests)]
+    started = time.perf_counter()
+    if mode in ('sync', 'stream'):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(lambda p: call_sync(ai, provider, mode, p, max_tokens), prompts))
+    else:
+        async def run() -> List[Sample]:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one(prompt: str) -> Sample:
+                async with semaphore:
+                    return await call_async(ai, provider, mode, prompt, max_tokens)
+            return await asyncio.gather(*[one(p) for p in prompts])
+        samples = loop.run_until_complete(run())
+    return samples, time.perf_counter() - started
+
+
+def measure_allocations(
+    ai,
+    loop: asyncio.AbstractEventLoop,
+    provider: str,
+    mode: str,
+    calls: int,
+    max_tokens: int
+) -> Tuple[float, float]:
+    """
+    Sequential calls under tracemalloc
+
+    Returns:
+        (mean peak KiB allocated while a call runs, retained bytes per call)
+    """
+    if calls <= 0:
+        return float('nan'), float('nan')
+
+    async def run_async(prompt: str):
+        await call_async(ai, provider, mode, prompt, max_tokens)
+
+    def one(prompt: str):
+        if mode in ('sync', 'stream'):
+            call_sync(ai, provider, mode, prompt, max_tokens)
+        else:
+            loop.run_until_complete(run_async(prompt))
+
+    one(f'allocations warm-up {provider} {mode}')
+    tracemalloc.start()
+    try:
+        start_current, _ = tracemalloc.get_traced_memory()
+        peaks = []
+        for i in range(calls):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            one(f'allocations {provider} {mode} {i}')
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        end_current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.mean(peaks) / 1024, (end_current - start_current) / calls
+
+
+def benchmark(unified_ai_client, provider: str, mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Warm up, run the load, measure allocations - with a fresh client per row"""
+    # Fresh UnifiedAI: no circuit-breaker / router state carried over from
+    # another row; one event loop per row, the async SDK clients are bound to it
+    ai = unified_ai_client.UnifiedAI(
+        coalesce=False,
+        retry_policy=unified_ai_client.RetryPolicy(max_retries=args.retries),
+        transport=unified_ai_client.HTTPTransport(pool_size=max(20, args.concurrency))
+    )
+    loop = asyncio.new_event_loop()
+    try:
+        run_load(ai, loop, provider, mode, min(args.warmup, args.requests), args.concurrency, args.max_tokens)
+        samples, elapsed = run_load(ai, loop, provider, mode, args.requests, args.concurrency, args.max_tokens)
+        peak_kib, retained = measure_allocations(ai, loop, provider, mode, args.alloc_calls, args.max_tokens)
+    finally:
+        loop.run_until_complete(ai.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+        ai.close()
+
+    ok = [s for s in samples if s.success]
+    latencies = [s.latency * 1000 for s in ok]
+    ttfts = [s.ttft * 1000 for s in ok if s.ttft is not None]
+    return {
+        'provider': provider,
+        'mode': mode,
+        'ok': len(ok),
+        'errors': len(samples) - len(ok),
+        'throughput': len(ok) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'ttft_p50_ms': percentile(ttfts, 50) if ttfts else None,
+        'alloc_peak_kib': peak_kib,
+        'retained_bytes': retained,
+    }
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    header = (f"{'provider':<12}{'mode':<9}{'ok':>6}{'err':>5}{'req/s':>9}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ttft ms':>9}{'KiB/call':>10}{'held B':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        if r.get('unsupported'):
+            print(f"{r['provider']:<12}{r['mode']:<9}  unsupported: {r['unsupported']}")
+            continue
+        ttft = f"{r['ttft_p50_ms']:>9.1f}" if r['ttft_p50_ms'] is not None else f"{'-':>9}"
+        print(f"{r['provider']:<12}{r['mode']:<9}{r['ok']:>6}{r['errors']:>5}{r['throughput']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{ttft}"
+              f"{r['alloc_peak_kib']:>10.1f}{r['retained_bytes']:>9.0f}")
+
+
+def main():
+    """Main CLI function"""
+    parser = argparse.ArgumentParser(description='Offline UnifiedAI provider benchmark')
+    parser.add_argument('--providers', nargs='+', default=PROVIDERS, choices=PROVIDERS)
+    parser.add_argument('--mode', nargs='+', default=['sync'], choices=MODES)
+    parser.add_argument('--requests', type=int, default=200, help='Calls per provider and mode')
+    parser.add_argument('--concurrency', type=int, default=16, help='Calls in flight')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured calls first')
+    parser.add_argument('--alloc-calls', type=int, default=30, help='Sequential calls traced for allocations (0 = skip)')
+    parser.add_argument('--max-tokens', type=int, default=64)
+    parser.add_argument('--retries', type=int, default=0, help='RetryPolicy.max_retries (0 = report raw errors)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock time to first token (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Mock extra random delay (s)')
+    parser.add_argument('--stream-rate', type=float, default=0.0, help='Mock tokens/s (0 = instant)')
+    parser.add_argument('--output-tokens', type=int, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of injected errors')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    process, url = start_mock_server(args)
+    try:
+        # Point every provider at the mock before unified_ai_client reads its config
+        sys.path.insert(0, HERE)
+        from mock_providers import MockProviderServer
+        os.environ.update(MockProviderServer.environment_for(url))
+        import unified_ai_client
+
+        available = unified_ai_client.UnifiedAI().available_providers
+        providers = [p for p in args.providers if p in available]
+
+        if not args.json:
+            print("=" * 60)
+            print("📊 UnifiedAI Provider Benchmark (offline)")
+            print("=" * 60)
+            print(f"Mock: {url}  latency={args.latency}s jitter={args.jitter}s "
+                  f"stream_rate={args.stream_rate or '∞'} tok/s errors={args.error_rate:.0%}")
+            print(f"Requests: {args.requests} per row, concurrency {args.concurrency}")
+            print("")
+
+        rows = [
+            {'provider': provider, 'mode': mode, 'unsupported': UNSUPPORTED[provider, mode]}
+            if (provider, mode) in UNSUPPORTED else benchmark(unified_ai_client, provider, mode, args)
+            for provider in providers for mode in args.mode
+        ]
+
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_table(rows)
+            print("")
+            print("KiB/call: peak memory allocated while one call runs (tracemalloc)")
+            print("held B:   bytes still allocated per call afterwards (cache/pool growth or leaks)")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
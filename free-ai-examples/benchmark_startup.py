@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark - UnifiedAI başlangıç süresini ölç
+Measures import time, UnifiedAI() construction and provider discovery
+in fresh interpreter processes (cold start, like a CLI call or worker).
+
+Usage:
+    python benchmark_startup.py            # 10 runs
+    python benchmark_startup.py --runs 30
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside a fresh interpreter and prints timings (ms) as JSON
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import unified_ai_client
+t1 = time.perf_counter()
+ai = unified_ai_client.UnifiedAI()
+t2 = time.perf_counter()
+providers = ai.available_providers
+t3 = time.perf_counter()
+print(json.dumps({
+    'import': (t1 - t0) * 1000,
+    'init': (t2 - t1) * 1000,
+    'discovery': (t3 - t2) * 1000,
+    'total': (t3 - t0) * 1000,
+    'providers': providers,
+}))
+"""
+
+
+def run_once() -> dict:
+    """Run the probe in a new interpreter"""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, HERE],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    """Main CLI function"""
+    parser = argparse.ArgumentParser(description='UnifiedAI startup benchmark')
+    parser.add_argument('--runs', type=int, default=10, help='Number of cold starts')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  UnifiedAI Startup Benchmark")
+    print("=" * 60)
+    print("")
+
+    samples = [run_once() for _ in range(args.runs)]
+
+    print(f"Runs: {args.runs}   Providers: {', '.join(samples[-1]['providers']) or '-'}")
+    print("")
+    print(f"{'phase':<12}{'median ms':>12}{'min ms':>12}{'max ms':>12}")
+    for phase in ['import', 'init', 'discovery', 'total']:
+        values = [s[phase] for s in samples]
+        print(f"{phase:<12}{statistics.median(values):>12.1f}{min(values):>12.1f}{max(values):>12.1f}")
+    print("")
+    print("import/init: cost paid before the first call")
+    print("discovery:   extra wait if the full provider list is needed (Ollama probe)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,732 @@
+#!/usr/bin/env python3
+"""
+Mock Providers - yerel, API key gerektirmeyen provider sunucuları
+Local stand-in server speaking the wire protocols UnifiedAI talks to:
+
+    POST .../chat/completions                   OpenAI / Groq (JSON or SSE)
+    POST /v1/messages                           Anthropic (JSON or SSE)
+    POST /v1beta/models/{m}:generateContent     Gemini REST
+    POST /v1beta/models/{m}:streamGenerateContent
+    POST /models/{model}                        Hugging Face inference
+    POST /api/generate, GET /api/tags, /api/ps  Ollama (JSON or NDJSON)
+    POST /v1/files, /v1/batches, GET ...        OpenAI Batch API
+    POST /v1/messages/batches, GET ...          Anthropic Message Batches
+
+Latency, jitter, streaming rate and error injection are configurable, so the
+client-side overhead of each provider path can be measured offline. Batches
+finish batch_delay seconds after submission; requests whose prompt contains
+"FAIL" come back as per-request errors. Ollama models are loaded on first use
+(load_delay, reported as load_duration), listed by /api/ps and unloaded after
+their keep_alive. Hugging Face models are loading for load_delay after their
+first request.
+
+Usage:
+    server = MockProviderServer(MockConfig(latency=0.05, stream_rate=200))
+    server.start()
+    server.configure_environment()   # point the SDKs / UnifiedAI at it
+    ...
+    server.stop()
+
+    python mock_providers.py --port 8099 --latency 0.1   # standalone
+"""
+
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Iterator
+from urllib.parse import urlparse
+
+
+class MockConfig:
+    """Behaviour of the mock server (all times in seconds)"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        stream_rate: float = 0.0,
+        output_tokens: int = 20,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        retry_after: Optional[float] = None,
+        seed: Optional[int] = None,
+        batch_delay: float = 0.0,
+        load_delay: float = 0.0
+    ):
+        """
+        Args:
+            latency: Delay before the first byte (time to first token)
+            jitter: Extra uniform random delay in [0, jitter]
+            stream_rate: Output tokens per second after the first one (0 = instant);
+                         non-streaming responses wait for the whole generation too
+            output_tokens: Words in every generated answer
+            error_rate: Fraction of requests answered with error_status
+            error_status: Injected HTTP status (e.g. 429, 500, 503)
+            retry_after: Retry-After header sent with injected errors
+            seed: Random seed for reproducible jitter / error injection
+            batch_delay: Time until a submitted batch (OpenAI / Anthropic) is done
+            load_delay: Cold start of a model that is not loaded: Ollama waits and
+                        reports load_duration, Hugging Face answers 503 "loading"
+                        (with estimated_time) unless options.wait_for_model
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_rate = stream_rate
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.batch_delay = batch_delay
+        self.load_delay = load_delay
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def first_token_delay(self) -> float:
+        with self._lock:
+            return self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def token_delay(self) -> float:
+        return 1.0 / self.stream_rate if self.stream_rate > 0 else 0.0
+
+    def inject_error(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+
+def _words(config: MockConfig, prompt: str) -> List[str]:
+    """Deterministic answer: the prompt's words, cycled to output_tokens"""
+    source = prompt.split() or ['mock']
+    return [source[i % len(source)] for i in range(config.output_tokens)]
+
+
+def _openai_prompt(body: Dict[str, Any]) -> str:
+    return ' '.join(str(m.get('content', '')) for m in body.get('messages', []))
+
+
+def _openai_usage(prompt: str, words: List[str]) -> Dict[str, Any]:
+    return {
+        'prompt_tokens': len(prompt.split()),
+        'completion_tokens': len(words),
+        'total_tokens': len(prompt.split()) + len(words),
+        'prompt_tokens_details': {'cached_tokens': 0}
+    }
+
+
+def _openai_completion(body: Dict[str, Any], words: List[str]) -> Dict[str, Any]:
+    """Non-streaming chat.completion body"""
+    return {
+        'id': 'chatcmpl-mock',
+        'created': int(time.time()),
+        'model': body.get('model', 'mock'),
+        'object': 'chat.completion',
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': ' '.join(words)},
+            'finish_reason': 'stop'
+        }],
+        'usage': _openai_usage(_openai_prompt(body), words)
+    }
+
+
+def _anthropic_message(body: Dict[str, Any], words: List[str]) -> Dict[str, Any]:
+    """Non-streaming Messages API body"""
+    prompt = ' '.join(str(m.get('content', '')) for m in body.get('messages', []))
+    return {
+        'id': 'msg_mock',
+        'type': 'message',
+        'role': 'assistant',
+        'model': body.get('model', 'mock'),
+        'content': [{'type': 'text', 'text': ' '.join(words)}],
+        'stop_reason': 'end_turn',
+        'stop_sequence': None,
+        'usage': {
+            'input_tokens': len(prompt.split()),
+            'output_tokens': len(words),
+            'cache_read_input_tokens': 0,
+            'cache_creation_input_tokens': 0
+        }
+    }
+
+
+def _timestamp(seconds: float) -> str:
+    """RFC 3339 time, as the Anthropic API returns it"""
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class _BatchStore:
+    """Files and batches of one mock server (OpenAI and Anthropic)"""
+
+    def __init__(self):
+        self.files: Dict[str, Dict[str, Any]] = {}      # id -> {'meta': ..., 'content': bytes}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.RLock()
+        self._ids = itertools.count(1)
+
+    def next_id(self, prefix: str) -> str:
+        return f'{prefix}{next(self._ids):06d}'
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> Dict[str, Any]:
+        with self.lock:
+            meta = {'id': self.next_id('file-mock'), 'object': 'file', 'bytes': len(content),
+                    'created_at': int(time.time()), 'filename': filename, 'purpose': purpose,
+                    'status': 'processed'}
+            self.files[meta['id']] = {'meta': meta, 'content': content}
+        return meta
+
+
+def _keep_alive_seconds(value: Any) -> float:
+    """Ollama keep_alive ('5m', '1h', '30s', seconds, negative = forever)"""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        units = {'s': 1, 'm': 60, 'h': 3600}
+        text = str(value).strip()
+        seconds = float(text[:-1]) * units[text[-1]] if text[-1:] in units else float(text)
+    return float('inf') if seconds < 0 else seconds
+
+
+class _OllamaModels:
+    """Models loaded in the mock Ollama server: name -> expiry"""
+
+    MODELS = ['llama3:latest', 'mistral:latest', 'phi3:latest']
+
+    def __init__(self):
+        self.expires: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def name(model: str) -> str:
+        return model if ':' in model else f'{model}:latest'
+
+    def loaded(self) -> List[str]:
+        with self.lock:
+            now = time.time()
+            self.expires = {m: t for m, t in self.expires.items() if t > now}
+            return list(self.expires)
+
+    def use(self, model: str, keep_alive: Any) -> bool:
+        """Mark a model used; True if it had to be loaded first"""
+        name = self.name(model)
+        cold = name not in self.loaded()
+        with self.lock:
+            seconds = _keep_alive_seconds(keep_alive)
+            if seconds:
+                self.expires[name] = time.time() + seconds
+            else:
+                self.expires.pop(name, None)
+        return cold
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the real APIs
+
+    config: MockConfig = None       # set per server in MockProviderServer
+    store: _BatchStore = None
+    ollama: _OllamaModels = None
+    hf_ready: Dict[str, float] = None   # Hugging Face model -> time it is loaded
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---- Plumbing ----
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _read_json(self) -> Dict[str, Any]:
+        return json.loads(self._read_body() or b'{}')
+
+    def _send_bytes(self, content_type: str, data: bytes):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, content_type: str, pieces: Iterator[str]):
+        """Chunked response, one chunk per piece, paced at stream_rate"""
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        delay = self.config.token_delay()
+        for i, piece in enumerate(pieces):
+            if i and delay:
+                time.sleep(delay)
+            data = piece.encode('utf-8')
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def _wait(self, streaming: bool):
+        """Time to first token (+ whole generation time when not streaming)"""
+        delay = self.config.first_token_delay()
+        if not streaming:
+            delay += self.config.token_delay() * max(0, self.config.output_tokens - 1)
+        if delay:
+            time.sleep(delay)
+
+    def _injected_error(self, body: Any) -> bool:
+        if not self.config.inject_error():
+            return False
+        headers = {}
+        if self.config.retry_after is not None:
+            headers['Retry-After'] = str(self.config.retry_after)
+        self._send_json(self.config.error_status, body, headers)
+        return True
+
+    # ---- Routing ----
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/api/tags':
+            self._send_json(200, {'models': [{'name': m, 'model': m} for m in _OllamaModels.MODELS]})
+        elif path == '/api/ps':
+            self._send_json(200, {'models': [{'name': m, 'model': m} for m in self.ollama.loaded()]})
+        elif path.startswith('/v1/batches/'):
+            self._openai_batch(path.rsplit('/', 1)[1])
+        elif path.startswith('/v1/files/') and path.endswith('/content'):
+            self._openai_file_content(path.split('/')[3])
+        elif path.startswith('/v1/messages/batches/'):
+            batch_id, _, results = path[len('/v1/messages/batches/'):].partition('/')
+            self._anthropic_batch(batch_id, results == 'results')
+        else:
+            self._send_json(404, {'error': f'not found: {path}'})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path == '/v1/files':
+            self._openai_upload()
+            return
+        body = self._read_json()
+        if path == '/v1/batches':
+            self._openai_create_batch(body)
+        elif path == '/v1/messages/batches':
+            self._anthropic_create_batch(body)
+        elif path.endswith('/chat/completions'):
+            self._openai(body)
+        elif path == '/v1/messages':
+            self._anthropic(body)
+        elif ':generateContent' in path or ':streamGenerateContent' in path:
+            self._gemini(path, body)
+        elif path.startswith('/models/'):
+            self._huggingface(path, body)
+        elif path == '/api/generate':
+            self._ollama(body)
+        else:
+            self._send_json(404, {'error': f'not found: {path}'})
+
+    # ---- Protocols ----
+
+    def _openai(self, body: Dict[str, Any]):
+        if self._injected_error({'error': {'message': 'injected error', 'type': 'server_error', 'code': None}}):
+            return
+        prompt = _openai_prompt(body)
+        words = _words(self.config, prompt)
+        model = body.get('model', 'mock')
+        stream = bool(body.get('stream'))
+        self._wait(stream)
+        usage = _openai_usage(prompt, words)
+        base = {'id': 'chatcmpl-mock', 'created': int(time.time()), 'model': model}
+        if not stream:
+            self._send_json(200, _openai_completion(body, words))
+            return
+
+        def events() -> Iterator[str]:
+            for i, word in enumerate(words):
+                chunk = {**base, 'object': 'chat.completion.chunk', 'choices': [{
+                    'index': 0,
+                    'delta': {'content': word if i == 0 else ' ' + word},
+                    'finish_reason': None
+                }]}
+                yield f'data: {json.dumps(chunk)}\n\n'
+            final = {**base, 'object': 'chat.completion.chunk',
+                     'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+            if self.path.startswith('/openai/'):
+                final['x_groq'] = {'usage': usage}   # Groq reports stream usage here
+            yield f'data: {json.dumps(final)}\n\n'
+            if (body.get('stream_options') or {}).get('include_usage'):
+                # Extra chunk with empty choices, like the real API
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+            yield 'data: [DONE]\n\n'
+        self._send_stream('text/event-stream', events())
+
+    def _anthropic(self, body: Dict[str, Any]):
+        if self._injected_error({'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'injected error'}}):
+            return
+        prompt = ' '.join(str(m.get('content', '')) for m in body.get('messages', []))
+        words = _words(self.config, prompt)
+        stream = bool(body.get('stream'))
+        self._wait(stream)
+        message = _anthropic_message(body, words)
+        if not stream:
+            self._send_json(200, message)
+            return
+
+        def event(name: str, data: Dict[str, Any]) -> str:
+            return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+        def events() -> Iterator[str]:
+            start = dict(message, content=[], stop_reason=None,
+                         usage=dict(message['usage'], output_tokens=0))
+            yield (event('message_start', {'type': 'message_start', 'message': start})
+                   + event('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                                   'content_block': {'type': 'text', 'text': ''}}))
+            for i, word in enumerate(words):
+                yield event('content_block_delta', {'type': 'content_block_delta', 'index': 0, 'delta': {
+                    'type': 'text_delta', 'text': word if i == 0 else ' ' + word}})
+            yield (event('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+                   + event('message_delta', {'type': 'message_delta',
+                                             'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                             'usage': {'output_tokens': len(words)}})
+                   + event('message_stop', {'type': 'message_stop'}))
+        self._send_stream('text/event-stream', events())
+
+    def _gemini(self, path: str, body: Dict[str, Any]):
+        if self._injected_error({'error': {'code': self.config.error_status, 'message': 'injected error',
+                                           'status': 'UNAVAILABLE'}}):
+            return
+        prompt = ' '.join(
+            str(part.get('text', ''))
+            for content in body.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        words = _words(self.config, prompt)
+        stream = ':streamGenerateContent' in path
+        self._wait(stream)
+
+        def response(text: str, final: bool) -> Dict[str, Any]:
+            candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}
+            if final:
+                candidate['finishReason'] = 'STOP'
+            return {
+                'candidates': [candidate],
+                'usageMetadata': {
+                    'promptTokenCount': len(prompt.split()),
+                    'candidatesTokenCount': len(words),
+                    'totalTokenCount': len(prompt.split()) + len(words)
+                }
+            }
+
+        if not stream:
+            self._send_json(200, response(' '.join(words), True))
+            return
+
+        # REST streaming without alt=sse is one JSON array, sent element by element
+        def pieces() -> Iterator[str]:
+            for i, word in enumerate(words):
+                item = json.dumps(response(word if i == 0 else ' ' + word, i == len(words) - 1))
+                yield ('[' if i == 0 else ',\r\n') + item
+            yield ']'
+        self._send_stream('application/json', pieces())
+
+    def _huggingface(self, path: str, body: Dict[str, Any]):
+        if self._injected_error({'error': 'Model is currently loading', 'estimated_time': 0.1}):
+            return
+        model = path[len('/models/'):]
+        ready_at = self.hf_ready.setdefault(model, time.time() + self.config.load_delay)
+        loading = ready_at - time.time()
+        if loading > 0:
+            if not body.get('options', {}).get('wait_for_model'):
+                self._send_json(503, {'error': f'Model {model} is currently loading', 'estimated_time': loading})
+                return
+            time.sleep(loading)
+        inputs = body.get('inputs', '')
+        self._wait(False)
+        if isinstance(inputs, list):
+            self._send_json(200, [
+                [{'generated_text': f"{text} {' '.join(_words(self.config, str(text)))}"}]
+                for text in inputs
+            ])
+        else:
+            self._send_json(200, [{'generated_text': f"{inputs} {' '.join(_words(self.config, str(inputs)))}"}])
+
+    def _ollama(self, body: Dict[str, Any]):
+        if self._injected_error({'error': 'injected error'}):
+            return
+        prompt = body.get('prompt', '')
+        model = body.get('model', 'llama3')
+        stream = body.get('stream', True)
+        started = time.perf_counter_ns()
+        if self.ollama.use(model, body.get('keep_alive')) and self.config.load_delay:
+            time.sleep(self.config.load_delay)
+        load_duration = time.perf_counter_ns() - started
+        if not prompt:
+            # Empty prompt: only load (or, with keep_alive 0, unload) the model
+            self._send_json(200, {'model': model, 'response': '', 'done': True, 'load_duration': load_duration})
+            return
+        words = _words(self.config, prompt)
+        self._wait(stream)
+        stats = {
+            'done': True,
+            'model': model,
+            'prompt_eval_count': len(prompt.split()),
+            'eval_count': len(words),
+            'load_duration': load_duration,
+            'total_duration': time.perf_counter_ns() - started
+        }
+        if not stream:
+            stats['eval_duration'] = stats['total_duration'] - load_duration
+            self._send_json(200, {'response': ' '.join(words), **stats})
+            return
+
+        def lines() -> Iterator[str]:
+            for i, word in enumerate(words):
+                yield json.dumps({'response': word if i == 0 else ' ' + word, 'done': False}) + '\n'
+            stats['total_duration'] = time.perf_counter_ns() - started
+            stats['eval_duration'] = stats['total_duration'] - load_duration
+            yield json.dumps({'response': '', **stats}) + '\n'
+        self._send_stream('application/x-ndjson', lines())
+
+    # ---- Batch APIs ----
+
+    def _batch_words(self, prompt: str) -> Optional[List[str]]:
+        """Answer of one batched request, None for a request that fails"""
+        return None if 'FAIL' in prompt else _words(self.config, prompt)
+
+    def _openai_upload(self):
+        """multipart/form-data upload of a batch input file"""
+        raw = (b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + self._read_body())
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(raw)
+        fields = {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+        file_part = fields['file']
+        purpose = fields['purpose'].get_content().strip() if 'purpose' in fields else 'batch'
+        self._send_json(200, self.store.add_file(
+            file_part.get_payload(decode=True), file_part.get_filename() or 'upload.jsonl', purpose
+        ))
+
+    def _openai_batch_object(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Batch object; finishes (and writes its output files) once batch_delay has passed"""
+        store = self.store
+        if batch['status'] == 'in_progress' and time.time() >= batch['created_at'] + self.config.batch_delay:
+            output, errors = [], []
+            for line in store.files[batch['input_file_id']]['content'].decode('utf-8').splitlines():
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                words = self._batch_words(_openai_prompt(request['body']))
+                if words is None:
+                    errors.append({'id': store.next_id('batch_req_'), 'custom_id': request['custom_id'], 'response': {
+                        'status_code': 400, 'request_id': 'mock', 'body': {'error': {
+                            'message': 'injected batch error', 'type': 'invalid_request_error'}}}, 'error': None})
+                else:
+                    output.append({'id': store.next_id('batch_req_'), 'custom_id': request['custom_id'], 'response': {
+                        'status_code': 200, 'request_id': 'mock', 'body': _openai_completion(request['body'], words)},
+                        'error': None})
+            for records, key in ((output, 'output_file_id'), (errors, 'error_file_id')):
+                if records:
+                    content = ''.join(json.dumps(r) + '\n' for r in records).encode('utf-8')
+                    batch[key] = store.add_file(content, f'{batch["id"]}_{key}.jsonl', 'batch_output')['id']
+            batch['request_counts'] = {'total': len(output) + len(errors), 'completed': len(output),
+                                       'failed': len(errors)}
+            batch['status'] = 'completed'
+            batch['completed_at'] = int(time.time())
+        return batch
+
+    def _openai_create_batch(self, body: Dict[str, Any]):
+        if body.get('input_file_id') not in self.store.files:
+            self._send_json(400, {'error': {'message': 'unknown input_file_id', 'type': 'invalid_request_error'}})
+            return
+        lines = self.store.files[body['input_file_id']]['content'].splitlines()
+        with self.store.lock:
+            batch = {
+                'id': self.store.next_id('batch_mock'), 'object': 'batch', 'endpoint': body.get('endpoint'),
+                'input_file_id': body['input_file_id'], 'completion_window': body.get('completion_window', '24h'),
+                'status': 'in_progress', 'created_at': int(time.time()), 'output_file_id': None,
+                'error_file_id': None,
+                'request_counts': {'total': len([l for l in lines if l.strip()]), 'completed': 0, 'failed': 0}
+            }
+            self.store.batches[batch['id']] = batch
+        self._send_json(200, batch)
+
+    def _openai_batch(self, batch_id: str):
+        with self.store.lock:
+            batch = self.store.batches.get(batch_id)
+            if batch is None or batch.get('object') != 'batch':
+                self._send_json(404, {'error': {'message': 'batch not found', 'type': 'invalid_request_error'}})
+                return
+            self._send_json(200, self._openai_batch_object(batch))
+
+    def _openai_file_content(self, file_id: str):
+        entry = self.store.files.get(file_id)
+        if entry is None:
+            self._send_json(404, {'error': {'message': 'file not found', 'type': 'invalid_request_error'}})
+            return
+        self._send_bytes('application/jsonl', entry['content'])
+
+    def _anthropic_batch_object(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """Public message_batch object (the requests and results stay server-side)"""
+        if batch['processing_status'] == 'in_progress' and time.time() >= batch['created'] + self.config.batch_delay:
+            results = []
+            for request in batch['requests']:
+                words = self._batch_words(' '.join(
+                    str(m.get('content', '')) for m in request['params'].get('messages', [])))
+                if words is None:
+                    results.append({'custom_id': request['custom_id'], 'result': {'type': 'errored', 'error': {
+                        'type': 'error', 'error': {'type': 'invalid_request_error',
+                                                   'message': 'injected batch error'}}}})
+                else:
+                    results.append({'custom_id': request['custom_id'], 'result': {
+                        'type': 'succeeded', 'message': _anthropic_message(request['params'], words)}})
+            batch['results'] = results
+            batch['processing_status'] = 'ended'
+            batch['ended_at'] = _timestamp(time.time())
+            errored = sum(1 for r in results if r['result']['type'] == 'errored')
+            batch['request_counts'] = {'processing': 0, 'succeeded': len(results) - errored,
+                                       'errored': errored, 'canceled': 0, 'expired': 0}
+        public = {key: value for key, value in batch.items() if key not in ('requests', 'results', 'created')}
+        if batch['processing_status'] == 'ended':
+            public['results_url'] = f"http://{self.headers['Host']}/v1/messages/batches/{batch['id']}/results"
+        return public
+
+    def _anthropic_create_batch(self, body: Dict[str, Any]):
+        now = time.time()
+        requests = body.get('requests', [])
+        with self.store.lock:
+            batch = {
+                'id': self.store.next_id('msgbatch_mock'), 'type': 'message_batch',
+                'processing_status': 'in_progress', 'created': now,
+                'created_at': _timestamp(now), 'expires_at': _timestamp(now + 86400),
+                'ended_at': None, 'archived_at': None, 'cancel_initiated_at': None, 'results_url': None,
+                'request_counts': {'processing': len(requests), 'succeeded': 0, 'errored': 0,
+                                   'canceled': 0, 'expired': 0},
+                'requests': requests
+            }
+            self.store.batches[batch['id']] = batch
+            self._send_json(200, self._anthropic_batch_object(batch))
+
+    def _anthropic_batch(self, batch_id: str, results: bool):
+        with self.store.lock:
+            batch = self.store.batches.get(batch_id)
+            if batch is None or batch.get('type') != 'message_batch':
+                self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': 'batch not found'}})
+                return
+            public = self._anthropic_batch_object(batch)
+            if not results:
+                self._send_json(200, public)
+            elif batch['processing_status'] != 'ended':
+                self._send_json(400, {'type': 'error', 'error': {'type': 'invalid_request_error',
+                                                                 'message': 'batch is still processing'}})
+            else:
+                self._send_bytes('application/binary',
+                                 ''.join(json.dumps(r) + '\n' for r in batch['results']).encode('utf-8'))
+
+
+def _quiet_errors(server, request, client_address):
+    """Clients closing keep-alive connections is normal, not an error"""
+    if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+        ThreadingHTTPServer.handle_error(server, request, client_address)
+
+
+class MockProviderServer:
+    """Threaded mock server for every provider protocol"""
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or MockConfig()
+        handler = type('MockHandler', (_Handler,), {
+            'config': self.config, 'store': _BatchStore(), 'ollama': _OllamaModels(), 'hf_ready': {}
+        })
+        server_class = type('MockHTTPServer', (ThreadingHTTPServer,), {
+            'daemon_threads': True,
+            'request_queue_size': 1024,   # benchmarks open many connections at once
+            'handle_error': _quiet_errors
+        })
+        self.server = server_class((host, port), handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockProviderServer':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that point the SDKs and UnifiedAI here"""
+        return self.environment_for(self.url)
+
+    @staticmethod
+    def environment_for(url: str) -> Dict[str, str]:
+        """environment() for a mock server running elsewhere (e.g. another process)"""
+        return {
+            'OPENAI_API_KEY': 'mock',
+            'OPENAI_BASE_URL': f'{url}/v1',
+            'ANTHROPIC_API_KEY': 'mock',
+            'ANTHROPIC_BASE_URL': url,
+            'GROQ_API_KEY': 'mock',
+            'GROQ_BASE_URL': url,
+            'GEMINI_API_KEY': 'mock',
+            'GEMINI_API_ENDPOINT': url,
+            'HUGGINGFACE_API_KEY': 'mock',
+            'HF_API_URL': f'{url}/models/{{model}}',
+            'OLLAMA_URL': url,
+        }
+
+    def configure_environment(self):
+        """Apply environment() to os.environ (before importing unified_ai_client)"""
+        os.environ.update(self.environment())
+
+
+def main():
+    """Run the mock server standalone"""
+    parser = argparse.ArgumentParser(description='Local mock AI provider server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to first token')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay (s)')
+    parser.add_argument('--stream-rate', type=float, default=0.0, help='Tokens/s (0 = instant)')
+    parser.add_argument('--output-tokens', type=int, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--batch-delay', type=float, default=0.0, help='Seconds until a batch is done')
+    parser.add_argument('--load-delay', type=float, default=0.0, help='Ollama cold model load (s)')
+    args = parser.parse_args()
+
+    server = MockProviderServer(MockConfig(
+        latency=args.latency, jitter=args.jitter, stream_rate=args.stream_rate,
+        output_tokens=args.output_tokens, error_rate=args.error_rate,
+        error_status=args.error_status, batch_delay=args.batch_delay,
+        load_delay=args.load_delay
+    ), args.host, args.port)
+    print(f"🧪 Mock providers on {server.url}", flush=True)
+    for name, value in server.environment().items():
+        print(f"  export {name}={value}", flush=True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
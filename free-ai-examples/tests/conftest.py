@@ -0,0 +1,30 @@
+"""
+Shared fixtures: tests run against the local mock providers (mock_providers.py),
+no API keys or network needed
+"""
+
+import os
+import socket
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, HERE)
+
+from mock_providers import MockConfig, MockProviderServer  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def mock_server():
+    """One mock server for the session; unified_ai_client reads its config from the environment"""
+    server = MockProviderServer(MockConfig()).start()
+    server.configure_environment()
+    yield server
+    server.stop()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
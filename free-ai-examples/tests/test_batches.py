@@ -0,0 +1,76 @@
+"""
+Provider Batch APIs (OpenAI, Claude) against the mock batch endpoints:
+submit, poll until done, and map the results back to the inputs
+"""
+
+import time
+
+import pytest
+
+from mock_providers import MockConfig, MockProviderServer
+
+PROMPTS = [
+    {'id': 'q1', 'prompt': 'first question'},
+    {'id': 'q2', 'prompt': 'please FAIL this one'},   # the mock fails prompts containing FAIL
+    'third question',
+    {'id': 'q4', 'prompt': 'fourth question', 'max_tokens': 50},
+    'fifth question',
+]
+
+
+@pytest.fixture
+def batch_server(mock_server, monkeypatch):
+    """A mock whose batches take a while to finish; the SDKs are pointed at it"""
+    server = MockProviderServer(MockConfig(batch_delay=2.0)).start()
+    monkeypatch.setenv('OPENAI_BASE_URL', f'{server.url}/v1')
+    monkeypatch.setenv('ANTHROPIC_BASE_URL', server.url)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def ai(batch_server):
+    from unified_ai_client import UnifiedAI
+    return UnifiedAI()
+
+
+@pytest.mark.parametrize('provider', ['openai', 'claude'])
+def test_batch_results_map_back_to_inputs(ai, provider):
+    handle = ai.submit_batch(PROMPTS, provider=provider)
+    status = ai.batch_status(handle)
+    assert not status['done'] and status['counts']['processing'] == len(PROMPTS)
+
+    started = time.monotonic()
+    results = ai.collect_batch(handle, poll_interval=0.2, timeout=10)
+    assert time.monotonic() - started >= 0.5   # it did wait for the batch
+
+    assert [r['id'] for r in results] == ['q1', 'q2', 2, 'q4', 4]
+    assert [r['success'] for r in results] == [True, False, True, True, True]
+    assert 'injected batch error' in results[1]['error']
+    for result, item in zip(results, PROMPTS):
+        prompt = item if isinstance(item, str) else item['prompt']
+        assert result['provider'] == provider
+        assert result['batch_id'] == handle['batches'][0]['id']
+        if result['success']:
+            # The mock answers with words of the prompt: each answer is its own
+            assert prompt.split()[0] in result['text']
+            assert result['usage']['output_tokens'] > 0
+    assert ai.batch_status(handle)['counts'] == {'succeeded': 4, 'failed': 1, 'processing': 0}
+
+
+def test_large_input_is_split_over_batches(ai, monkeypatch):
+    import unified_ai_client
+    monkeypatch.setitem(unified_ai_client.BATCH_MAX_REQUESTS, 'openai', 2)
+    handle = ai.submit_batch(PROMPTS, provider='openai')
+    assert [(b['offset'], b['count']) for b in handle['batches']] == [(0, 2), (2, 2), (4, 1)]
+
+    results = ai.collect_batch(handle, poll_interval=0.2, timeout=10)
+    assert [r['id'] for r in results] == ['q1', 'q2', 2, 'q4', 4]
+    assert [r['batch_id'] for r in results] == [b['id'] for b in handle['batches'] for _ in range(b['count'])]
+    assert [r['success'] for r in results] == [True, False, True, True, True]
+
+
+def test_collect_times_out_while_processing(ai):
+    handle = ai.submit_batch(['only question'], provider='openai')
+    with pytest.raises(TimeoutError):
+        ai.collect_batch(handle, poll_interval=0.1, timeout=0.3)
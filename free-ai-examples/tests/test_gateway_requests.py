@@ -0,0 +1,52 @@
+"""
+Gateway request validation: malformed chat requests get an OpenAI-style
+400 invalid_request_error, never a 500
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+
+def post_all(bodies):
+    """POST each body to /v1/chat/completions of an in-process gateway"""
+    from ai_gateway import AIGateway
+    from unified_ai_client import UnifiedAI
+
+    async def run():
+        gateway = await AIGateway(UnifiedAI(cache=None), port=0).start()
+        try:
+            async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{gateway.port}') as client:
+                return [await client.post('/v1/chat/completions', json=body) for body in bodies]
+        finally:
+            await gateway.shutdown()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'temperature': 'hot'}, "'temperature' must be a number"),
+    ({'temperature': True}, "'temperature' must be a number"),
+    ({'temperature': 3}, "'temperature' must be between 0 and 2"),
+    ({'max_tokens': '100'}, "'max_tokens' must be an integer"),
+    ({'max_tokens': 1.5}, "'max_tokens' must be an integer"),
+    ({'max_tokens': 0}, "'max_tokens' must be >= 1"),
+    ({'max_completion_tokens': -1, 'max_tokens': 10}, "'max_completion_tokens' must be >= 1"),
+    ({'messages': ['hi']}, "'messages' must be a list of message objects"),
+])
+def test_invalid_fields_are_rejected(mock_server, fields, message):
+    (response,) = post_all([{'model': 'openai', 'messages': MESSAGES, **fields}])
+    assert response.status_code == 400
+    assert response.json()['error'] == {'message': message, 'type': 'invalid_request_error', 'code': None}
+
+
+def test_null_fields_use_defaults(mock_server):
+    responses = post_all([
+        {'model': 'openai', 'messages': MESSAGES, 'temperature': None, 'max_tokens': None},
+        {'model': 'openai', 'messages': MESSAGES, 'temperature': 0, 'max_completion_tokens': 5},
+    ])
+    assert [r.status_code for r in responses] == [200, 200]
+    assert all(r.json()['choices'][0]['message']['content'] for r in responses)
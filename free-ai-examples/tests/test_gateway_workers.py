@@ -0,0 +1,117 @@
+"""ai_gateway.py --workers: pre-forked workers sharing one SQLite state file"""
+
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from conftest import HERE, free_port
+
+
+def _get(url: str, timeout: float = 5.0):
+    request = urllib.request.Request(url, headers={'Connection': 'close'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def _chat(base: str, prompt: str, model: str = 'groq') -> int:
+    body = json.dumps({'model': model, 'messages': [{'role': 'user', 'content': prompt}]}).encode()
+    request = urllib.request.Request(f'{base}/v1/chat/completions', data=body, headers={
+        'Content-Type': 'application/json', 'Connection': 'close'
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=20) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.fixture
+def gateway(mock_server, tmp_path):
+    """Gateway with 2 workers; yields (base url, state db path)"""
+    port = free_port()
+    state_db = str(tmp_path / 'state.db')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, 'ai_gateway.py'), '--port', str(port), '--workers', '2',
+         '--state-db', state_db, '--max-queue-wait', '0'],
+        env=dict(os.environ, **mock_server.environment()),
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    base = f'http://127.0.0.1:{port}'
+    try:
+        line = ''
+        while '🚪' not in line:
+            line = process.stdout.readline()
+            assert line, 'gateway exited during startup'
+        # Wait until both workers answer
+        pids, deadline = set(), time.time() + 30
+        while len(pids) < 2 and time.time() < deadline:
+            try:
+                pids.add(_get(f'{base}/health')['pid'])
+            except OSError:
+                time.sleep(0.05)
+        assert len(pids) == 2
+        yield base, state_db
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.communicate(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+    assert process.returncode == 0
+
+
+def test_workers_share_rate_limit(gateway):
+    """
+    groq's 30 requests/min (burst 1, refill 0.5/s) are one bucket for all
+    workers: with --max-queue-wait 0 a burst gets one success, not one per worker
+    """
+    base, _ = gateway
+    statuses = []
+    threads = [threading.Thread(target=lambda i=i: statuses.append(_chat(base, f'quota {i}'))) for i in range(20)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    assert set(statuses) <= {200, 429}
+    assert 1 <= statuses.count(200) <= 1 + int(elapsed * 0.5)
+
+
+def test_state_lock_does_not_block_event_loop(gateway):
+    """
+    While another process holds the state file's write lock, requests that
+    need it wait in a thread; the workers keep answering everything else
+    """
+    base, state_db = gateway
+    holder = sqlite3.connect(state_db, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    statuses = []
+    try:
+        threads = [threading.Thread(target=lambda i=i: statuses.append(_chat(base, f'locked {i}', 'openai')))
+                   for i in range(6)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.3)   # the chat requests are now waiting for the lock
+        started = time.perf_counter()
+        for _ in range(10):
+            _get(f'{base}/health', timeout=2)
+        assert time.perf_counter() - started < 1.0
+        assert not statuses
+    finally:
+        time.sleep(0.5)
+        holder.execute('COMMIT')
+        holder.close()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * 6
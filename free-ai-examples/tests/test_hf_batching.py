@@ -0,0 +1,65 @@
+"""
+Hugging Face micro-batching against the mock Inference API: concurrent
+callers share upstream requests, each gets its own answer, and a cold
+model (503 "loading") is retried for the whole batch
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from mock_providers import MockConfig, MockProviderServer
+
+CALLERS = 12
+
+
+def make_client(monkeypatch, load_delay=0.0):
+    import unified_ai_client
+    from unified_ai_client import HuggingFaceBatcher, UnifiedAI
+    server = MockProviderServer(MockConfig(latency=0.05, load_delay=load_delay)).start()
+    monkeypatch.setattr(unified_ai_client, 'HF_API_URL', f'{server.url}/models/{{model}}')
+    ai = UnifiedAI(hf_batcher=HuggingFaceBatcher(window=0.05))
+
+    # Count the upstream requests (and the batch size of each)
+    posts = []
+    hf_post = ai._hf_post
+
+    def counting(model, inputs, *args):
+        posts.append(len(inputs))
+        return hf_post(model, inputs, *args)
+
+    ai._hf_post = counting
+    return ai, server, posts
+
+
+def ask_concurrently(ai):
+    start = threading.Barrier(CALLERS)
+
+    def ask(i):
+        start.wait()
+        return ai.generate(f'prompt number {i}', provider='huggingface', use_cache=False)
+
+    with ThreadPoolExecutor(max_workers=CALLERS) as executor:
+        return list(executor.map(ask, range(CALLERS)))
+
+
+@pytest.mark.parametrize('load_delay', [0.0, 0.5], ids=['warm', 'cold'])
+def test_concurrent_calls_share_requests(mock_server, monkeypatch, load_delay):
+    ai, server, posts = make_client(monkeypatch, load_delay)
+    try:
+        results = ask_concurrently(ai)
+    finally:
+        server.stop()
+
+    assert all(r['success'] for r in results), [r['error'] for r in results]
+    for i, result in enumerate(results):
+        # The mock echoes each input: every caller got the answer to its own prompt
+        assert result['text'].startswith(f'prompt number {i} ')
+    assert len(posts) < CALLERS
+    assert sum(r['batch_size'] for r in results) > CALLERS
+    if load_delay:
+        # The first batch met the cold model; its retry (and everything
+        # after) asked the API to wait for the model instead
+        assert ai.hf_batcher._loading == set()
+        assert sum(r['retries'] for r in results) > 0
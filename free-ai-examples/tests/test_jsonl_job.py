@@ -0,0 +1,103 @@
+"""
+JSONLJob checkpoint/resume against the mock providers: an interrupted or
+killed job, resumed, has every input line in its output exactly once
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import pytest
+
+from conftest import HERE
+from mock_providers import MockConfig, MockProviderServer
+
+LINES = 60
+
+
+@pytest.fixture
+def prompts(tmp_path):
+    path = tmp_path / 'prompts.jsonl'
+    path.write_text(''.join(json.dumps({'id': f'q{i}', 'prompt': f'question {i}'}) + '\n' for i in range(LINES)))
+    return path
+
+
+def output_ids(path):
+    """Ids in the results file (every line must be complete JSON)"""
+    with open(path, encoding='utf-8') as f:
+        return Counter(json.loads(line)['id'] for line in f)
+
+
+def resume(output, prompts):
+    from unified_ai_client import JSONLJob, UnifiedAI
+    job = JSONLJob(UnifiedAI(), str(output), concurrency=4, checkpoint_interval=0,
+                   defaults={'provider': 'ollama', 'use_cache': False})
+    with open(prompts, encoding='utf-8') as f:
+        return job.run(f)
+
+
+def test_interrupted_job_resumes_exactly_once(mock_server, prompts, tmp_path):
+    from unified_ai_client import JSONLJob, UnifiedAI
+    ai = UnifiedAI()
+    generate = ai.generate
+
+    def interrupted(prompt, **kwargs):
+        # Ctrl+C lands while this call is running
+        if prompt == 'question 17':
+            raise KeyboardInterrupt
+        return generate(prompt, **kwargs)
+
+    ai.generate = interrupted
+    output = tmp_path / 'results.jsonl'
+    job = JSONLJob(ai, str(output), concurrency=4, checkpoint_interval=0,
+                   defaults={'provider': 'ollama', 'use_cache': False})
+    with pytest.raises(KeyboardInterrupt):
+        with open(prompts, encoding='utf-8') as f:
+            job.run(f)
+    first = output_ids(output)
+    assert 'q17' not in first and 0 < len(first) < LINES
+
+    stats = resume(output, prompts)
+    assert stats['processed'] == LINES - stats['skipped']
+    assert output_ids(output) == Counter(f'q{i}' for i in range(LINES))
+
+
+def test_killed_job_resumes_exactly_once(mock_server, prompts, tmp_path):
+    slow = MockProviderServer(MockConfig(latency=0.05)).start()
+    output = tmp_path / 'results.jsonl'
+    try:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, 'unified_ai_client.py'), '--input', str(prompts),
+             '--output', str(output), '--provider', 'ollama', '--concurrency', '2',
+             '--checkpoint-interval', '0.1'],
+            env={**os.environ, **slow.environment()}, cwd=str(tmp_path),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + 30
+        while not (output.exists() and output.read_bytes().count(b'\n') >= LINES // 3):
+            assert process.poll() is None and time.monotonic() < deadline
+            time.sleep(0.02)
+        process.send_signal(signal.SIGKILL)
+        process.wait()
+    finally:
+        slow.stop()
+
+    checkpoint = json.loads((tmp_path / 'results.jsonl.ckpt').read_text())
+    assert not checkpoint.get('complete')
+    # A write torn by the kill: a trailing half line past the checkpoint
+    with open(output, 'ab') as f:
+        f.write(b'{"id": "q999", "line": 999, "te')
+
+    stats = resume(output, prompts)
+    assert stats['skipped'] > 0
+    assert output_ids(output) == Counter(f'q{i}' for i in range(LINES))
+    assert json.loads((tmp_path / 'results.jsonl.ckpt').read_text())['complete']
+
+    # Resuming a finished job does nothing
+    stats = resume(output, prompts)
+    assert stats['processed'] == 0 and stats['skipped'] == LINES
+    assert output_ids(output) == Counter(f'q{i}' for i in range(LINES))
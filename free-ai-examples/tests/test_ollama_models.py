@@ -0,0 +1,99 @@
+"""
+Ollama model residency against a mock Ollama host: warm-up, keep_alive,
+load timings, and routing to models that are already loaded
+"""
+
+import time
+
+import pytest
+
+from mock_providers import MockConfig, MockProviderServer
+
+
+@pytest.fixture
+def host(mock_server):
+    """A stand-in Ollama host with a noticeable cold start"""
+    server = MockProviderServer(MockConfig(load_delay=0.3)).start()
+    yield server
+    server.stop()
+
+
+def make_client(host, **model_options):
+    from unified_ai_client import OllamaModels, OllamaPool, UnifiedAI
+    model_options.setdefault('warm_up', [])
+    ai = UnifiedAI(ollama_models=OllamaModels(**model_options), ollama_pool=OllamaPool([host.url]))
+    assert ai._is_available('ollama')   # waits for the startup probe only
+    return ai
+
+
+def wait_warm_up(ai):
+    if ai._ollama_warm_up is not None:
+        ai._ollama_warm_up.join()
+
+
+def loaded(ai, host):
+    return {m['name'] for m in ai.http.client.get(f'{host.url}/api/ps').json()['models']}
+
+
+def test_warm_up_loads_models_at_startup(host):
+    ai = make_client(host, warm_up=['phi3'])
+    wait_warm_up(ai)
+    assert loaded(ai, host) == {'phi3:latest'}
+    assert ai.ollama_models.is_resident('phi3')
+
+    result = ai.generate('hi', provider='ollama', model='phi3', use_cache=False)
+    assert result['success']
+    assert result['timings']['load'] < 0.1
+
+
+def test_warm_up_does_not_delay_discovery(mock_server):
+    from unified_ai_client import OllamaModels, OllamaPool, UnifiedAI
+    slow = MockProviderServer(MockConfig(load_delay=3.0)).start()
+    try:
+        started = time.perf_counter()
+        ai = UnifiedAI(ollama_models=OllamaModels(warm_up=['phi3', 'mistral']), ollama_pool=OllamaPool([slow.url]))
+        assert ai._is_available('ollama')
+        assert 'ollama' in ai.available_providers
+        assert time.perf_counter() - started < 1.0
+        assert ai.ollama_models.is_resident('phi3') is False   # still loading
+
+        wait_warm_up(ai)
+        assert ai.ollama_models.is_resident('phi3') and ai.ollama_models.is_resident('mistral')
+    finally:
+        slow.stop()
+
+
+def test_cold_load_is_reported(host):
+    ai = make_client(host)
+    first = ai.generate('hi', provider='ollama', model='llama3', use_cache=False)
+    second = ai.generate('hi again', provider='ollama', model='llama3', use_cache=False)
+    assert first['timings']['load'] >= 0.3
+    assert second['timings']['load'] < 0.1
+    assert {'eval', 'total'} <= set(second['timings'])
+
+
+def test_keep_alive_per_model(host):
+    ai = make_client(host, keep_alive={'mistral': 0, '*': '10m'})
+    for model in ('llama3', 'mistral'):
+        assert ai.generate('hi', provider='ollama', model=model, use_cache=False)['success']
+    assert loaded(ai, host) == {'llama3:latest'}
+
+
+def test_resident_alternative_is_used(host):
+    ai = make_client(host, alternatives={'llama3': ['llama3', 'mistral']}, warm_up=['mistral'])
+    wait_warm_up(ai)
+    ai._refresh_ollama_ps()
+    result = ai.generate('hi', provider='ollama', model='llama3', use_cache=False)
+    assert result['model'] == 'mistral'
+    assert result['timings']['load'] < 0.1
+
+
+def test_auto_tries_cold_ollama_last(host):
+    ai = make_client(host)
+    chain, error = ai._resolve_chain('auto', None, [])
+    assert error is None and len(chain) > 1
+    assert chain[-1][0] == 'ollama'
+
+    ai.warm_up_ollama([chain[-1][1]])
+    ollama_first = [chain[-1]] + chain[:-1]
+    assert ai._demote_cold_ollama(ollama_first) == ollama_first
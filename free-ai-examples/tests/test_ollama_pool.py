@@ -0,0 +1,103 @@
+"""
+OllamaPool across several local mock Ollama hosts: ejection and
+readmission, model affinity, and routing to hosts that have the model loaded
+"""
+
+from collections import Counter
+
+import pytest
+
+from conftest import free_port
+from mock_providers import MockConfig, MockProviderServer
+
+
+@pytest.fixture
+def hosts(mock_server):
+    """Three stand-in Ollama hosts"""
+    servers = [MockProviderServer(MockConfig()).start() for _ in range(3)]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def make_client(urls, **pool_options):
+    from unified_ai_client import OllamaPool, UnifiedAI
+    ai = UnifiedAI(ollama_pool=OllamaPool(urls, **pool_options))
+    assert ai._is_available('ollama')   # waits for the startup probe
+    return ai
+
+
+def ask(ai, model='llama3', n=6):
+    """Hosts that served n sequential requests"""
+    results = [ai.generate(f'prompt {i}', provider='ollama', model=model, use_cache=False) for i in range(n)]
+    assert all(r['success'] for r in results), [r['error'] for r in results]
+    return Counter(r['host'] for r in results)
+
+
+def test_failures_eject_host_until_it_recovers():
+    from unified_ai_client import OllamaPool
+    pool = OllamaPool(['http://a', 'http://b'], eject_after=2, eject_seconds=60)
+    a, b = pool.acquire(), pool.acquire()
+    assert [a, b] == pool.hosts
+    pool.release(a, failed=True)
+    assert pool.live_hosts() == [a, b]   # one failure is not enough
+    assert pool.acquire() == a           # fewest requests in flight
+    pool.release(a, failed=True)
+    assert pool.live_hosts() == [b]
+    assert {pool.acquire() for _ in range(3)} == {b}   # however busy b gets
+
+    pool.health(a, True)
+    assert pool.live_hosts() == ['http://a', 'http://b']
+
+
+def test_dead_host_is_ejected_and_readmitted(hosts):
+    port = free_port()
+    dead = f'http://127.0.0.1:{port}'
+    ai = make_client([hosts[0].url, dead], eject_seconds=300)
+    assert ai.ollama_pool.stats()[dead]['ejected']
+    assert ask(ai) == {hosts[0].url: 6}
+
+    # The host comes back: the next health check reinstates it at once
+    revived = MockProviderServer(MockConfig(), port=port).start()
+    try:
+        ai._refresh_ollama_ps()
+        assert not ai.ollama_pool.stats()[dead]['ejected']
+        # Ties on requests in flight go to the host that served fewer so far
+        assert ask(ai) == {dead: 6}
+    finally:
+        revived.stop()
+
+
+def test_least_outstanding_spreads_requests(hosts):
+    ai = make_client([server.url for server in hosts])
+    assert ask(ai) == {server.url: 2 for server in hosts}
+
+
+def test_affinity_keeps_a_model_on_one_host(hosts):
+    ai = make_client([server.url for server in hosts], strategy='affinity')
+    served = ask(ai, 'llama3')
+    assert len(served) == 1
+    (home,) = served
+    assert ai.ollama_pool.stats()[home]['resident'] == ['llama3:latest']
+
+    # Still there after a /api/ps refresh, and for the same model under its full tag
+    ai._refresh_ollama_ps()
+    assert ask(ai, 'llama3:latest') == {home: 6}
+
+
+def test_affinity_prefers_hosts_with_the_model_loaded(hosts):
+    from unified_ai_client import OllamaPool
+    urls = [server.url for server in hosts]
+    hashed = OllamaPool(urls, strategy='affinity').acquire('mistral')
+    warm = [url for url in urls if url != hashed][0]
+
+    ai = make_client(urls, strategy='affinity')
+    ai.http.client.post(f'{warm}/api/generate', json={'model': 'mistral', 'prompt': ''}).raise_for_status()
+    ai._refresh_ollama_ps()
+    assert ai.ollama_pool.stats()[warm]['resident'] == ['mistral:latest']
+    assert ask(ai, 'mistral') == {warm: 6}
+
+    # The host is ejected: the model goes to a live host instead
+    ai.ollama_pool.health(warm, False)
+    served = ask(ai, 'mistral')
+    assert warm not in served and len(served) == 1
@@ -6,98 +6,2153 @@ Supports: Gemini, OpenAI, Claude, Groq, Hugging Face, Ollama
 
 import os
 import sys
-from typing import Optional, Dict, Any
+import json
+import argparse
+import asyncio
+import bisect
+import time
+import random
+import hashlib
+import zlib
+import sqlite3
+import importlib.util
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed as futures_as_completed, wait as futures_wait
+from typing import Optional, Dict, Any, Tuple, List, Iterable, Iterator, AsyncIterator, Union, Callable, Awaitable
 from dotenv import load_dotenv
 
-# AI Libraries - install: pip install google-generativeai openai anthropic groq requests
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-
-try:
-    import anthropic
-    CLAUDE_AVAILABLE = True
-except ImportError:
-    CLAUDE_AVAILABLE = False
-
-try:
-    from groq import Groq
-    GROQ_AVAILABLE = True
-except ImportError:
-    GROQ_AVAILABLE = False
-
-import requests
+# AI Libraries - install: pip install google-generativeai openai anthropic groq httpx
+# SDKs are imported lazily on first use of a provider (fast startup), so here
+# we only check that they are installed.
+def _installed(module: str) -> bool:
+    """Check if a module can be imported, without importing it"""
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ModuleNotFoundError:
+        return False
+
+GEMINI_AVAILABLE = _installed('google.generativeai')
+OPENAI_AVAILABLE = _installed('openai')
+CLAUDE_AVAILABLE = _installed('anthropic')
+GROQ_AVAILABLE = _installed('groq')
 
 load_dotenv()
 
+# Default model per provider (used when `model` is not given)
+DEFAULT_MODELS = {
+    'gemini': 'gemini-pro',
+    'openai': 'gpt-3.5-turbo',
+    'claude': 'claude-3-haiku-20240307',
+    'groq': 'llama3-70b-8192',
+    'huggingface': 'gpt2',
+    'ollama': 'llama3',
+}
+
+# Candidate order for provider="auto" (prefer free); the router breaks ties with it
+AUTO_PRIORITY = ['gemini', 'groq', 'ollama', 'huggingface', 'openai', 'claude']
+
+# Endpoints can be overridden from the environment (e.g. mock_providers.py);
+# the SDKs read OPENAI_BASE_URL / ANTHROPIC_BASE_URL / GROQ_BASE_URL themselves
+HF_API_URL = os.getenv('HF_API_URL', "https://api-inference.huggingface.co/models/{model}")
+OLLAMA_URL = os.getenv('OLLAMA_URL', "http://localhost:11434")
+# Several Ollama hosts (comma-separated) are load balanced by OllamaPool
+OLLAMA_URLS = [u.strip().rstrip('/') for u in os.getenv('OLLAMA_URLS', OLLAMA_URL).split(',') if u.strip()]
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')  # REST endpoint, e.g. http://127.0.0.1:8099
+
+# Gemini explicit context caching: only worth it (and only accepted by the API)
+# for long prefixes; shorter system prompts are sent as system_instruction
+GEMINI_CACHE_MIN_TOKENS = 32768
+GEMINI_CACHE_TTL = 3600  # seconds
+
+# Ollama residency: keep_alive sent with every request (e.g. '30m', '-1' =
+# forever; unset = server default, 5m) and models loaded at startup
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE')
+OLLAMA_WARM_MODELS = [m.strip() for m in os.getenv('OLLAMA_WARM_MODELS', '').split(',') if m.strip()]
+
+# Provider Batch APIs: max requests per batch, and OpenAI's terminal statuses
+BATCH_MAX_REQUESTS = {'openai': 50000, 'claude': 100000}
+OPENAI_BATCH_FINAL = ('completed', 'failed', 'expired', 'cancelled')
+
+
+class HTTPTransport:
+    """
+    Connection-pooled, keep-alive HTTP transport for the raw-HTTP providers
+    (Hugging Face, Ollama). One sync and one async httpx client are created
+    lazily and reused, so repeated calls skip the TCP/TLS handshake.
+    
+    Raw HTTP uses httpx (HTTP/2 needs: pip install "httpx[http2]"); it is
+    imported when the first client is built.
+    """
+    
+    def __init__(
+        self,
+        pool_size: int = 20,
+        keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 120.0,
+        http2: bool = False
+    ):
+        """
+        Args:
+            pool_size: Max open connections (per client)
+            keepalive: Max idle connections kept open
+            keepalive_expiry: Seconds an idle connection is kept
+            connect_timeout: Seconds to establish a connection
+            read_timeout: Seconds to wait for response data
+            http2: Enable HTTP/2 (requires the h2 package)
+        """
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.http2 = http2
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+    
+    def _client_options(self) -> Dict[str, Any]:
+        """Pool and timeout settings shared by the sync and async clients"""
+        import httpx
+        return {
+            'limits': httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.keepalive,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+            'timeout': httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            'http2': self.http2,
+        }
+    
+    @property
+    def client(self) -> 'httpx.Client':
+        """Shared sync client (thread-safe)"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    self._client = httpx.Client(**self._client_options())
+        return self._client
+    
+    @property
+    def async_client(self) -> 'httpx.AsyncClient':
+        """Shared async client"""
+        if self._async_client is None:
+            import httpx
+            self._async_client = httpx.AsyncClient(**self._client_options())
+        return self._async_client
+    
+    def close(self):
+        """Close pooled sync connections"""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+    
+    async def aclose(self):
+        """Close pooled sync and async connections"""
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+def request_key(
+    provider: str,
+    model: str,
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """Canonical SHA-256 of the request parameters (cache / coalescing key)"""
+    canonical = json.dumps(
+        [provider, model, prompt, float(temperature), int(max_tokens), options or {}],
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Response cache for UnifiedAI.generate()
+    
+    Two tiers: an in-memory LRU with TTL, and an optional SQLite file that
+    survives restarts. Any object with the same key()/get()/set() methods
+    can be passed to UnifiedAI(cache=...) instead.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 3600.0,
+        sqlite_path: Optional[str] = None,
+        skip_nondeterministic: bool = False
+    ):
+        """
+        Args:
+            max_entries: In-memory LRU size
+            ttl: Seconds an entry stays valid (None = forever)
+            sqlite_path: Optional on-disk cache file
+            skip_nondeterministic: Never cache calls with temperature > 0
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.skip_nondeterministic = skip_nondeterministic
+        self._memory: 'OrderedDict[str, Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'bypassed': 0}
+        
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS responses '
+                '(key TEXT PRIMARY KEY, expires REAL, result TEXT)'
+            )
+            self._db.commit()
+    
+    def key(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        options: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """
+        Canonical hash of the request parameters
+        
+        Returns None when the call must not be cached (non-deterministic).
+        """
+        if self.skip_nondeterministic and temperature > 0:
+            with self._lock:
+                self._stats['bypassed'] += 1
+            return None
+        return request_key(provider, model, prompt, temperature, max_tokens, options)
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, result = entry
+                if expires is None or expires > now:
+                    self._memory.move_to_end(key)
+                    self._stats['hits'] += 1
+                    self._stats['memory_hits'] += 1
+                    return dict(result, cached=True)
+                del self._memory[key]
+            
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT expires, result FROM responses WHERE key = ?', (key,)
+                ).fetchone()
+                if row and (row[0] is None or row[0] > now):
+                    result = json.loads(row[1])
+                    self._remember(key, row[0], result)
+                    self._stats['hits'] += 1
+                    self._stats['disk_hits'] += 1
+                    return dict(result, cached=True)
+            
+            self._stats['misses'] += 1
+            return None
+    
+    def set(self, key: str, result: Dict[str, Any]):
+        """Store a result"""
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        result = dict(result)
+        with self._lock:
+            self._remember(key, expires, result)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO responses (key, expires, result) VALUES (?, ?, ?)',
+                    (key, expires, json.dumps(result, ensure_ascii=False, default=str))
+                )
+                self._db.commit()
+    
+    def _remember(self, key: str, expires: Optional[float], result: Dict[str, Any]):
+        """Insert into the LRU tier (caller holds the lock)"""
+        self._memory[key] = (expires, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def clear(self):
+        """Drop all entries (both tiers)"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM responses')
+                self._db.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._memory)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+    
+    def close(self):
+        """Close the SQLite tier"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+# Relative cost per call for cheapest-within-SLO / weighted routing
+# (free tiers and local models are 0)
+PROVIDER_COSTS = {
+    'gemini': 0.0,
+    'groq': 0.0,
+    'ollama': 0.0,
+    'huggingface': 0.0,
+    'openai': 1.0,
+    'claude': 1.0,
+}
+
+
+def is_throttle_error(error: Optional[str]) -> bool:
+    """Does an error message look like a rate-limit / quota rejection?"""
+    if not error:
+        return False
+    error = error.lower()
+    return any(marker in error for marker in ('429', 'rate limit', 'rate_limit', 'quota', 'too many requests'))
+
+
+class ProviderRouter:
+    """
+    Adaptive routing for provider="auto"
+    
+    Keeps a rolling EWMA of latency, error rate and throttle rate per
+    (provider, model) and ranks candidates by policy:
+        'fastest'  - lowest expected latency (latency / success rate)
+        'cheapest' - cheapest provider whose latency is within `slo`
+                     (falls back to fastest if none is)
+        'weighted' - weighted sum of latency, error rate, throttle rate and cost
+        'priority' - fixed AUTO_PRIORITY order (legacy behaviour)
+    Providers without samples yet are tried first so every backend gets measured.
+    """
+    
+    POLICIES = ('fastest', 'cheapest', 'weighted', 'priority')
+    
+    def __init__(
+        self,
+        policy: str = 'weighted',
+        alpha: float = 0.2,
+        slo: float = 5.0,
+        max_error_rate: float = 0.5,
+        weights: Optional[Dict[str, float]] = None,
+        costs: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            policy: One of POLICIES
+            alpha: EWMA smoothing factor (higher = reacts faster)
+            slo: Latency target in seconds for the 'cheapest' policy
+            max_error_rate: Error rate above which 'cheapest' skips a provider
+            weights: 'weighted' policy weights for latency (per second),
+                     error, throttle and cost
+            costs: Relative cost per provider (default PROVIDER_COSTS)
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f'Unknown routing policy: {policy}')
+        self.policy = policy
+        self.alpha = alpha
+        self.slo = slo
+        self.max_error_rate = max_error_rate
+        self.weights = {'latency': 1.0, 'error': 5.0, 'throttle': 2.0, 'cost': 2.0, **(weights or {})}
+        self.costs = {**PROVIDER_COSTS, **(costs or {})}
+        self._stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, provider: str, model: str, latency: float, error: Optional[str] = None):
+        """Record the outcome of one call"""
+        failed = 1.0 if error else 0.0
+        throttled = 1.0 if is_throttle_error(error) else 0.0
+        with self._lock:
+            stats = self._stats.get((provider, model))
+            if stats is None:
+                stats = {'latency': None, 'error_rate': failed, 'throttle_rate': throttled,
+                         'calls': 0, 'errors': 0, 'throttled': 0}
+                self._stats[(provider, model)] = stats
+            else:
+                stats['error_rate'] += self.alpha * (failed - stats['error_rate'])
+                stats['throttle_rate'] += self.alpha * (throttled - stats['throttle_rate'])
+            # Fast failures would make a broken backend look quick, so only
+            # successful calls feed the latency average
+            if not error:
+                if stats['latency'] is None:
+                    stats['latency'] = latency
+                else:
+                    stats['latency'] += self.alpha * (latency - stats['latency'])
+            stats['calls'] += 1
+            stats['errors'] += int(failed)
+            stats['throttled'] += int(throttled)
+    
+    def rank(self, candidates: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Order (provider, model) candidates best-first for the current policy"""
+        if self.policy == 'priority':
+            return list(candidates)
+        with self._lock:
+            stats = {c: dict(self._stats[c]) for c in candidates if c in self._stats}
+        
+        # Not measured yet: try first, in priority order
+        unmeasured = [c for c in candidates if stats.get(c, {}).get('latency') is None
+                      and stats.get(c, {}).get('calls', 0) == 0]
+        measured = [c for c in candidates if c not in unmeasured]
+        
+        if self.policy == 'fastest':
+            ordered = sorted(measured, key=lambda c: self._expected_latency(stats[c]))
+        elif self.policy == 'cheapest':
+            within = [c for c in measured
+                      if self._expected_latency(stats[c]) <= self.slo
+                      and stats[c]['error_rate'] <= self.max_error_rate]
+            within.sort(key=lambda c: (self.costs.get(c[0], 0.0), self._expected_latency(stats[c])))
+            rest = sorted((c for c in measured if c not in within),
+                          key=lambda c: self._expected_latency(stats[c]))
+            ordered = within + rest
+        else:
+            ordered = sorted(measured, key=lambda c: self._score(c, stats[c]))
+        return unmeasured + ordered
+    
+    @staticmethod
+    def _expected_latency(stats: Dict[str, float]) -> float:
+        """Latency divided by success rate (expected time to a good answer)"""
+        if stats['latency'] is None:
+            return float('inf')
+        return stats['latency'] / max(1.0 - stats['error_rate'], 0.01)
+    
+    def _score(self, candidate: Tuple[str, str], stats: Dict[str, float]) -> float:
+        """Weighted policy score (lower is better)"""
+        latency = stats['latency'] if stats['latency'] is not None else self.slo
+        return (self.weights['latency'] * latency
+                + self.weights['error'] * stats['error_rate']
+                + self.weights['throttle'] * stats['throttle_rate']
+                + self.weights['cost'] * self.costs.get(candidate[0], 0.0))
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Current stats keyed by 'provider/model'"""
+        with self._lock:
+            return {f'{p}/{m}': dict(s) for (p, m), s in self._stats.items()}
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker
+    
+    closed    - calls pass; `failure_threshold` consecutive failures open it
+    open      - calls are skipped until `recovery_timeout` seconds pass
+    half_open - up to `half_open_probes` probe calls pass; a success closes
+                the circuit, a failure opens it again
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_probes: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        """Current state (open turns half_open once the timeout has passed)"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+            return self._state
+    
+    def allow(self) -> bool:
+        """May a call go through now?"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if now - self._opened_at < self.recovery_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probes = 0
+                self._opened_at = now
+            # Half-open: let a few probes through; if a probe never reports
+            # back (e.g. an abandoned stream), allow a new one after the timeout
+            if self._probes >= self.half_open_probes and now - self._opened_at >= self.recovery_timeout:
+                self._probes = 0
+                self._opened_at = now
+            if self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            return False
+    
+    def record_success(self):
+        """Report a successful call"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+    
+    def record_failure(self):
+        """Report a failed call"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+
+class SharedState:
+    """
+    SQLite (WAL) file shared by the processes of one host
+    
+    Holds rate-limit buckets (SharedRateLimiter) and circuit breaker state
+    (SharedCircuitBreaker) so pre-forked workers act as one client: N
+    workers still spend one upstream quota and see one circuit per
+    provider. Updates are short BEGIN IMMEDIATE transactions; the
+    connection is reopened after a fork.
+    """
+    
+    def __init__(self, path: str, timeout: float = 5.0):
+        """
+        Args:
+            path: State file (every worker opens the same one)
+            timeout: Seconds to wait for another process's write lock
+        """
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        with self.transaction() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS buckets '
+                '(key TEXT, kind TEXT, level REAL, updated REAL, PRIMARY KEY (key, kind))'
+            )
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS breakers '
+                '(name TEXT PRIMARY KEY, state TEXT, failures INTEGER, opened_at REAL, probes INTEGER)'
+            )
+    
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection (caller holds the lock)"""
+        if self._db is None or self._pid != os.getpid():
+            # A connection inherited over fork() must not be used: open a new one
+            self._db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+        return self._db
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Exclusive read-modify-write across threads and processes"""
+        with self._lock:
+            db = self._connection()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+    
+    def read(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        """Plain read (no write lock)"""
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+    
+    def close(self):
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            self._db = None
+
+
+class SharedCircuitBreaker(CircuitBreaker):
+    """
+    CircuitBreaker whose state lives in a SharedState: a provider that
+    fails in one worker is skipped by all of them. Same transitions as
+    CircuitBreaker; time.monotonic() is host-wide on Linux / macOS.
+    """
+    
+    def __init__(self, shared: SharedState, name: str, **options):
+        """
+        Args:
+            shared: State file shared by the workers
+            name: Breaker key (the provider)
+            **options: CircuitBreaker settings
+        """
+        super().__init__(**options)
+        self.shared = shared
+        self.name = name
+    
+    def _run(self, method: Callable[[], Any]) -> Any:
+        """Load the shared state, run the in-process transition, store it back"""
+        with self.shared.transaction() as db:
+            row = db.execute(
+                'SELECT state, failures, opened_at, probes FROM breakers WHERE name = ?', (self.name,)
+            ).fetchone()
+            self._state, self._failures, self._opened_at, self._probes = row or (self.CLOSED, 0, 0.0, 0)
+            result = method()
+            db.execute(
+                'INSERT OR REPLACE INTO breakers (name, state, failures, opened_at, probes) VALUES (?, ?, ?, ?, ?)',
+                (self.name, self._state, self._failures, self._opened_at, self._probes)
+            )
+        return result
+    
+    @property
+    def state(self) -> str:
+        return self._run(lambda: CircuitBreaker.state.fget(self))
+    
+    def allow(self) -> bool:
+        # Fast path: a closed circuit needs no write lock
+        rows = self.shared.read('SELECT state FROM breakers WHERE name = ?', (self.name,))
+        if not rows or rows[0][0] == self.CLOSED:
+            return True
+        return self._run(super().allow)
+    
+    def record_success(self):
+        rows = self.shared.read('SELECT state, failures FROM breakers WHERE name = ?', (self.name,))
+        if not rows or rows[0] == (self.CLOSED, 0):
+            return
+        self._run(super().record_success)
+    
+    def record_failure(self):
+        self._run(super().record_failure)
+
+
+# Free-tier quotas from .env.example - pass to RateLimiter() to stay under them
+FREE_TIER_LIMITS = {
+    'gemini': {'rpm': 60},
+    'groq': {'rpm': 30},
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), no tokenizer needed"""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate_per_minute`
+    
+    Callers reserve capacity up front and may drive the level negative;
+    the deficit is the time they have to wait, so concurrent callers
+    queue up in order instead of racing.
+    """
+    
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        """
+        Args:
+            rate_per_minute: Refill rate (requests or tokens per minute)
+            burst: Max saved-up capacity (default: one second's worth, at least 1)
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (refills first)"""
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+        return max(0.0, (amount - self._level) / self.rate)
+    
+    def reserve(self, amount: float):
+        """Take `amount` (after wait_time())"""
+        self._level -= amount
+
+
+class RateLimiter:
+    """
+    Client-side requests/min and tokens/min limits per provider and model
+    
+    limits keys are 'provider' or 'provider/model'; values are
+    {'rpm': ..., 'tpm': ...} (either optional). A call must pass every
+    matching bucket. Token cost is estimated as prompt tokens + max_tokens,
+    the same way providers count requests against TPM quotas.
+    """
+    
+    def __init__(self, limits: Dict[str, Dict[str, float]], max_wait: Optional[float] = None):
+        """
+        Args:
+            limits: e.g. {'groq': {'rpm': 30}, 'gemini/gemini-pro': {'tpm': 32000}}
+            max_wait: Longest a caller queues (seconds); beyond that the call
+                      is rejected locally so failover can try another provider.
+                      None = always wait.
+        """
+        self.limits = limits
+        self.max_wait = max_wait
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+    
+    def _matching(self, provider: str, model: str) -> List[Tuple[TokenBucket, str]]:
+        """Buckets that apply to this provider/model (caller holds the lock)"""
+        buckets = []
+        for key in (provider, f'{provider}/{model}'):
+            for kind, rate in self.limits.get(key, {}).items():
+                bucket = self._buckets.get((key, kind))
+                if bucket is None:
+                    bucket = self._buckets[(key, kind)] = TokenBucket(rate)
+                buckets.append((bucket, kind))
+        return buckets
+    
+    def reserve(self, provider: str, model: str, tokens: int) -> Optional[float]:
+        """
+        Reserve one request of `tokens` tokens
+        
+        Returns:
+            Seconds the caller must wait, or None if that exceeds max_wait
+            (nothing is reserved then)
+        """
+        with self._lock:
+            now = time.monotonic()
+            buckets = self._matching(provider, model)
+            amounts = [1 if kind == 'rpm' else tokens for _, kind in buckets]
+            wait = max([b.wait_time(a, now) for (b, _), a in zip(buckets, amounts)], default=0.0)
+            if self.max_wait is not None and wait > self.max_wait:
+                return None
+            for (bucket, _), amount in zip(buckets, amounts):
+                bucket.reserve(amount)
+            return wait
+    
+    def acquire(self, provider: str, model: str, tokens: int) -> bool:
+        """Block until the call may go out; False if rejected (max_wait)"""
+        wait = self.reserve(provider, model, tokens)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+    
+    async def aacquire(self, provider: str, model: str, tokens: int) -> bool:
+        """Async acquire() - waits without blocking the event loop"""
+        wait = self.reserve(provider, model, tokens)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter whose buckets live in a SharedState, so every worker
+    process draws from the same requests/min and tokens/min quotas
+    """
+    
+    def __init__(self, shared: SharedState, limits: Dict[str, Dict[str, float]], max_wait: Optional[float] = None):
+        """
+        Args:
+            shared: State file shared by the workers
+            limits, max_wait: As for RateLimiter
+        """
+        super().__init__(limits, max_wait)
+        self.shared = shared
+    
+    def reserve(self, provider: str, model: str, tokens: int) -> Optional[float]:
+        """RateLimiter.reserve() as one transaction on the shared buckets"""
+        matching = [
+            (key, kind, rate)
+            for key in (provider, f'{provider}/{model}')
+            for kind, rate in self.limits.get(key, {}).items()
+        ]
+        if not matching:
+            return 0.0
+        with self.shared.transaction() as db:
+            now = time.time()   # wall clock: comparable between processes
+            buckets = []
+            for key, kind, rate in matching:
+                bucket = TokenBucket(rate)
+                row = db.execute('SELECT level, updated FROM buckets WHERE key = ? AND kind = ?', (key, kind)).fetchone()
+                bucket._level, bucket._updated = row if row else (bucket.capacity, now)
+                buckets.append((key, kind, bucket, 1 if kind == 'rpm' else tokens))
+            wait = max(bucket.wait_time(amount, now) for _, _, bucket, amount in buckets)
+            if self.max_wait is not None and wait > self.max_wait:
+                return None
+            for key, kind, bucket, amount in buckets:
+                bucket.reserve(amount)
+                db.execute(
+                    'INSERT OR REPLACE INTO buckets (key, kind, level, updated) VALUES (?, ?, ?, ?)',
+                    (key, kind, bucket._level, bucket._updated)
+                )
+            return wait
+    
+    async def aacquire(self, provider: str, model: str, tokens: int) -> bool:
+        """Async acquire(): the transaction runs in a thread (it may wait on another worker's lock)"""
+        wait = await asyncio.to_thread(self.reserve, provider, model, tokens)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+
+class TokenBudget:
+    """
+    Token quotas per period (default: the UTC day) for API keys and tenants
+    
+    limits keys are 'provider', 'provider/model' or 'tenant:<name>'; values
+    are token counts (input + output). A call reserves its estimated cost
+    (prompt tokens + max_tokens) on every matching key before it goes out
+    and is settled with the provider-reported usage afterwards, so
+    concurrent calls cannot overshoot a quota. A call that does not fit is
+    skipped locally, and failover moves the work to a provider that still
+    has budget.
+    """
+    
+    def __init__(self, limits: Dict[str, int], period: float = 86400.0):
+        """
+        Args:
+            limits: e.g. {'groq': 500_000, 'openai/gpt-4': 50_000, 'tenant:acme': 100_000}
+            period: Quota window in seconds, aligned to the epoch (86400 = UTC day)
+        """
+        self.limits = limits
+        self.period = period
+        self._window = self._current_window()
+        self._used: Dict[str, int] = {}
+        self._reserved: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def _current_window(self) -> int:
+        return int(time.time() // self.period)
+    
+    def _roll(self):
+        """Start a new period if the current one is over (caller holds the lock)"""
+        window = self._current_window()
+        if window != self._window:
+            self._window = window
+            self._used = {}
+            # Reservations belong to their period: ones still in flight are
+            # dropped here, and settle() ignores them (window mismatch)
+            self._reserved = {}
+    
+    def _keys(self, provider: str, model: str, tenant: Optional[str]) -> List[str]:
+        keys = [provider, f'{provider}/{model}']
+        if tenant is not None:
+            keys.append(f'tenant:{tenant}')
+        return [key for key in keys if key in self.limits]
+    
+    def reserve(self, provider: str, model: str, tenant: Optional[str], tokens: int) -> Optional[Dict[str, int]]:
+        """
+        Reserve `tokens` on every matching key
+        
+        Returns:
+            The reservation (pass it to settle()), or None if any key would
+            go over its limit (nothing is reserved then)
+        """
+        with self._lock:
+            self._roll()
+            keys = self._keys(provider, model, tenant)
+            for key in keys:
+                if self._used.get(key, 0) + self._reserved.get(key, 0) + tokens > self.limits[key]:
+                    return None
+            for key in keys:
+                self._reserved[key] = self._reserved.get(key, 0) + tokens
+            return {'window': self._window, 'tokens': tokens, 'keys': keys}
+    
+    def settle(self, reservation: Dict[str, Any], used_tokens: int):
+        """
+        Replace a reservation with the tokens actually used (0 for a failed
+        call); settling a reservation again is a no-op
+        """
+        with self._lock:
+            if reservation.get('settled'):
+                return
+            reservation['settled'] = True
+            self._roll()
+            if reservation['window'] != self._window:
+                return   # the period rolled over while the call was in flight
+            for key in reservation['keys']:
+                self._reserved[key] = max(0, self._reserved.get(key, 0) - reservation['tokens'])
+                self._used[key] = self._used.get(key, 0) + used_tokens
+    
+    def remaining(self, key: str) -> Optional[int]:
+        """Tokens left for a key this period (None if the key has no limit)"""
+        if key not in self.limits:
+            return None
+        with self._lock:
+            self._roll()
+            return max(0, self.limits[key] - self._used.get(key, 0) - self._reserved.get(key, 0))
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Usage per limited key: limit, used, reserved, remaining, resets_in (s)"""
+        with self._lock:
+            self._roll()
+            resets_in = (self._window + 1) * self.period - time.time()
+            return {
+                key: {
+                    'limit': limit,
+                    'used': self._used.get(key, 0),
+                    'reserved': self._reserved.get(key, 0),
+                    'remaining': max(0, limit - self._used.get(key, 0) - self._reserved.get(key, 0)),
+                    'resets_in': resets_in,
+                }
+                for key, limit in self.limits.items()
+            }
+
+
+def _ollama_name(model: str) -> str:
+    """Ollama's canonical model name ('llama3' -> 'llama3:latest')"""
+    return model if ':' in model else f'{model}:latest'
+
+
+class OllamaModels:
+    """
+    Local model residency for Ollama
+    
+    Ollama unloads a model keep_alive after its last request (5 minutes by
+    default) and the next request pays the cold load, seconds for a 7B
+    model. This keeps per-model keep_alive settings, names the models to
+    load at startup, and tracks which models are resident (from /api/ps,
+    refreshed in the background) so routing can prefer them.
+    """
+    
+    def __init__(
+        self,
+        keep_alive: Optional[Dict[str, Union[str, int]]] = None,
+        warm_up: Optional[List[str]] = None,
+        alternatives: Optional[Dict[str, List[str]]] = None,
+        prefer_resident: bool = True,
+        ps_ttl: float = 10.0
+    ):
+        """
+        Args:
+            keep_alive: Per-model keep_alive, e.g. {'llama3': '1h', '*': '10m'}
+                        ('*' = every other model; default: OLLAMA_KEEP_ALIVE)
+            warm_up: Models loaded when Ollama is discovered (default: OLLAMA_WARM_MODELS)
+            alternatives: Interchangeable models in preference order, e.g.
+                          {'llama3': ['llama3', 'mistral']}: a llama3 request
+                          goes to the first of them that is resident
+            prefer_resident: With provider='auto', try Ollama after the other
+                             providers while its model is not loaded
+            ps_ttl: Seconds a /api/ps snapshot is trusted before a refresh
+        """
+        self.keep_alive = dict(keep_alive or {})
+        if OLLAMA_KEEP_ALIVE is not None:
+            self.keep_alive.setdefault('*', OLLAMA_KEEP_ALIVE)
+        self.warm_up = OLLAMA_WARM_MODELS if warm_up is None else warm_up
+        self.alternatives = alternatives or {}
+        self.prefer_resident = prefer_resident
+        self.ps_ttl = ps_ttl
+        self._resident: set = set()
+        self._refreshed_at: Optional[float] = None   # None: residency unknown
+        self._refreshing = False
+        self._lock = threading.Lock()
+    
+    def keep_alive_for(self, model: str) -> Optional[Union[str, int]]:
+        """keep_alive to send for a model (None: server default)"""
+        return self.keep_alive.get(model, self.keep_alive.get(_ollama_name(model), self.keep_alive.get('*')))
+    
+    def is_resident(self, model: str) -> Optional[bool]:
+        """Is the model loaded? None if no /api/ps snapshot yet"""
+        with self._lock:
+            if self._refreshed_at is None:
+                return None
+            return _ollama_name(model) in self._resident
+    
+    def choose(self, model: str) -> str:
+        """The requested model, or a resident alternative to it"""
+        candidates = self.alternatives.get(model)
+        if not candidates:
+            return model
+        with self._lock:
+            for candidate in candidates:
+                if _ollama_name(candidate) in self._resident:
+                    return candidate
+        return candidates[0]
+    
+    def needs_refresh(self) -> bool:
+        """Claim the next /api/ps refresh if the snapshot is stale"""
+        with self._lock:
+            if self._refreshing:
+                return False
+            if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.ps_ttl:
+                return False
+            self._refreshing = True
+            return True
+    
+    def update(self, models: Optional[List[Dict[str, Any]]]):
+        """Store an /api/ps answer (None: the refresh failed)"""
+        with self._lock:
+            self._refreshing = False
+            if models is not None:
+                self._resident = {_ollama_name(m.get('name') or m.get('model', '')) for m in models}
+                self._refreshed_at = time.monotonic()
+    
+    def mark_resident(self, model: str):
+        """A model just answered: it is loaded (until the next /api/ps says otherwise)"""
+        with self._lock:
+            self._resident.add(_ollama_name(model))
+
+
+class OllamaPool:
+    """
+    Load balancing across Ollama hosts
+    
+    'least_outstanding' sends a request to the live host with the fewest
+    requests in flight. 'affinity' keeps a model on the hosts that have it
+    loaded (least outstanding among them) and otherwise on one host picked
+    by rendezvous hashing of the model name, so each host loads fewer models.
+    
+    A host is ejected after eject_after consecutive failures (connection
+    errors, 5xx) or a failed health check, for eject_seconds; then it gets
+    requests again and one more failure ejects it again. A passing health
+    check (UnifiedAI polls /api/ps of every host) reinstates it at once.
+    When every host is ejected, all of them are tried anyway.
+    """
+    
+    STRATEGIES = ('least_outstanding', 'affinity')
+    
+    def __init__(
+        self,
+        hosts: Optional[List[str]] = None,
+        strategy: str = 'least_outstanding',
+        eject_after: int = 3,
+        eject_seconds: float = 30.0
+    ):
+        """
+        Args:
+            hosts: Ollama base URLs (default: OLLAMA_URLS, else OLLAMA_URL)
+            strategy: 'least_outstanding' or 'affinity'
+            eject_after: Consecutive failures that eject a host
+            eject_seconds: How long an ejected host gets no requests
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'Unknown strategy: {strategy} (use {" / ".join(self.STRATEGIES)})')
+        self.hosts = [h.rstrip('/') for h in (hosts or OLLAMA_URLS)]
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._hosts = {
+            url: {'outstanding': 0, 'requests': 0, 'failures': 0, 'ejected_until': 0.0, 'resident': set()}
+            for url in self.hosts
+        }
+        self._lock = threading.Lock()
+    
+    def acquire(self, model: Optional[str] = None) -> str:
+        """Pick a host for one request (pair with release())"""
+        with self._lock:
+            now = time.monotonic()
+            live = [url for url in self.hosts if self._hosts[url]['ejected_until'] <= now] or self.hosts
+            if self.strategy == 'affinity' and model:
+                name = _ollama_name(model)
+                warm = [url for url in live if name in self._hosts[url]['resident']]
+                live = warm or [max(live, key=lambda url: zlib.crc32(f'{name}|{url}'.encode()))]
+            url = min(live, key=lambda u: (self._hosts[u]['outstanding'], self._hosts[u]['requests']))
+            self._hosts[url]['outstanding'] += 1
+            self._hosts[url]['requests'] += 1
+        return url
+    
+    def release(self, url: str, failed: bool = False):
+        """A request on `url` finished; `failed` counts towards ejection"""
+        with self._lock:
+            host = self._hosts[url]
+            host['outstanding'] -= 1
+            if not failed:
+                host['failures'] = 0
+                return
+            host['failures'] += 1
+            if host['failures'] >= self.eject_after and host['ejected_until'] <= time.monotonic():
+                host['ejected_until'] = time.monotonic() + self.eject_seconds
+                if len(self.hosts) > 1:
+                    print(f"⚠️ Ollama host {url} ejected for {self.eject_seconds:g}s after {host['failures']} failures")
+    
+    @contextmanager
+    def lease(self, model: Optional[str] = None):
+        """with pool.lease(model) as url: ... (a host for one request)"""
+        url = self.acquire(model)
+        failed = False
+        try:
+            yield url
+        except Exception as e:
+            # Client errors (unknown model, bad request) say nothing about the host
+            failed = not (isinstance(e, ProviderHTTPError) and e.status < 500)
+            raise
+        finally:
+            self.release(url, failed)
+    
+    def health(self, url: str, healthy: bool, resident: Optional[List[str]] = None):
+        """Result of a health check: eject or reinstate the host"""
+        with self._lock:
+            host = self._hosts[url]
+            if healthy:
+                host['failures'] = 0
+                host['ejected_until'] = 0.0
+                if resident is not None:
+                    host['resident'] = {_ollama_name(m) for m in resident}
+            else:
+                host['failures'] = max(host['failures'], self.eject_after)
+                host['ejected_until'] = time.monotonic() + self.eject_seconds
+                host['resident'] = set()
+    
+    def mark_resident(self, url: str, model: str):
+        with self._lock:
+            self._hosts[url]['resident'].add(_ollama_name(model))
+    
+    def live_hosts(self) -> List[str]:
+        """Hosts that are not ejected"""
+        now = time.monotonic()
+        with self._lock:
+            return [url for url in self.hosts if self._hosts[url]['ejected_until'] <= now]
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-host state: outstanding, requests, failures, ejected, resident models"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                url: {
+                    'outstanding': host['outstanding'],
+                    'requests': host['requests'],
+                    'failures': host['failures'],
+                    'ejected': host['ejected_until'] > now,
+                    'resident': sorted(host['resident'])
+                }
+                for url, host in self._hosts.items()
+            }
+
+
+class HuggingFaceBatcher:
+    """
+    Micro-batching for the Hugging Face Inference API
+    
+    Concurrent prompts for the same model and generation parameters that
+    arrive within `window` seconds go out as one request with a list of
+    `inputs` (at most max_batch), and the answers are split back to their
+    callers. The endpoint rate-limits requests, not inputs, so N batched
+    prompts cost one request. Threads batch with threads, asyncio tasks
+    with tasks on the same loop; max_batch=1 turns batching off.
+    
+    Cold models: a 503 "model is loading" is retried by RetryPolicy after
+    its estimated_time, and until that model answers again its requests ask
+    the API to hold them until it is loaded (wait_for_model).
+    """
+    
+    def __init__(
+        self,
+        window: float = 0.01,
+        max_batch: int = 16,
+        wait_for_model: bool = False,
+        use_cache: bool = True
+    ):
+        """
+        Args:
+            window: Seconds the first prompt of a batch waits for others
+            max_batch: Max prompts per request (a full batch goes out at once)
+            wait_for_model: Always let the API hold requests while a model loads
+            use_cache: Allow the API's response cache (off for sampled output
+                       that must differ between identical prompts)
+        """
+        self.window = window
+        self.max_batch = max_batch
+        self.wait_for_model = wait_for_model
+        self.use_cache = use_cache
+        self._batches: Dict[Any, Dict[str, Any]] = {}
+        self._loading: set = set()
+        self._lock = threading.Lock()
+    
+    def options(self, model: str) -> Dict[str, bool]:
+        """Inference API `options` for a request to a model"""
+        return {'wait_for_model': self.wait_for_model or model in self._loading, 'use_cache': self.use_cache}
+    
+    def mark_loading(self, model: str, loading: bool):
+        """A model answered 503 (loading) or answered normally"""
+        with self._lock:
+            if loading:
+                self._loading.add(model)
+            else:
+                self._loading.discard(model)
+    
+    def submit(self, key: Any, item: Any, send: Callable[[List[Any]], List[Any]]) -> Tuple[Any, int]:
+        """
+        Add one input to the open batch for key (threads)
+        
+        The first caller waits the window, sends the batch with
+        send(items) -> answers, and hands every caller its answer.
+        
+        Returns:
+            (answer, batch size)
+        """
+        with self._lock:
+            batch = self._batches.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._batches[key] = {
+                    'items': [], 'full': threading.Event(), 'done': threading.Event(),
+                    'results': None, 'error': None
+                }
+            index = len(batch['items'])
+            batch['items'].append(item)
+            if len(batch['items']) >= self.max_batch:
+                del self._batches[key]
+                batch['full'].set()
+        
+        if not leader:
+            batch['done'].wait()
+        else:
+            batch['full'].wait(self.window)
+            with self._lock:
+                if self._batches.get(key) is batch:
+                    del self._batches[key]
+            try:
+                batch['results'] = send(batch['items'])
+            except BaseException as e:
+                batch['error'] = e
+            finally:
+                batch['done'].set()
+        if batch['error'] is not None:
+            raise batch['error']
+        return batch['results'][index], len(batch['items'])
+    
+    async def asubmit(self, key: Any, item: Any, send: Callable[[List[Any]], Awaitable[List[Any]]]) -> Tuple[Any, int]:
+        """
+        Async submit(): the batch is sent by its own task, so a cancelled
+        caller does not cancel it for the others
+        """
+        loop = asyncio.get_running_loop()
+        batch_key = (id(loop), key)
+        future = loop.create_future()
+        with self._lock:
+            batch = self._batches.get(batch_key)
+            if batch is None:
+                batch = self._batches[batch_key] = {'items': [], 'futures': [], 'full': asyncio.Event()}
+                batch['task'] = loop.create_task(self._aflush(batch_key, batch, send))
+            batch['items'].append(item)
+            batch['futures'].append(future)
+            if len(batch['items']) >= self.max_batch:
+                del self._batches[batch_key]
+                batch['full'].set()
+        return await future
+    
+    async def _aflush(self, batch_key: Any, batch: Dict[str, Any], send: Callable[[List[Any]], Awaitable[List[Any]]]):
+        try:
+            try:
+                await asyncio.wait_for(batch['full'].wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            with self._lock:
+                if self._batches.get(batch_key) is batch:
+                    del self._batches[batch_key]
+            results = await send(batch['items'])
+            if len(results) != len(batch['items']):
+                raise RuntimeError(f"Batch of {len(batch['items'])} got {len(results)} answers")
+            for future, result in zip(batch['futures'], results):
+                if not future.done():
+                    future.set_result((result, len(batch['items'])))
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            for future in batch['futures']:
+                if not future.done():
+                    future.set_exception(e)
+            if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                raise
+        finally:
+            # Flush cancelled: nobody may be left waiting on its futures
+            with self._lock:
+                if self._batches.get(batch_key) is batch:
+                    del self._batches[batch_key]
+            for future in batch['futures']:
+                if not future.done():
+                    future.cancel()
+
+
+class ProviderHTTPError(Exception):
+    """Error response from a raw-HTTP provider (Hugging Face, Ollama)"""
+    
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None, loading: bool = False):
+        super().__init__(f'HTTP {status}: {message}')
+        self.status = status
+        self.retry_after = retry_after
+        self.loading = loading   # Hugging Face cold model: 503 with an estimated_time
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header in seconds (only the delta-seconds form)"""
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RetryPolicy:
+    """
+    Retry transient provider errors with capped exponential backoff
+    
+    Retryable: 408/409/425/429/5xx (incl. Anthropic's 529 "overloaded"),
+    connection errors and timeouts. Retry-After headers and Hugging Face's
+    "model is loading" estimated_time are honoured; otherwise the delay is
+    full-jitter backoff: uniform(0, min(max_delay, base_delay * 2**retry)).
+    """
+    
+    RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+    
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        budget: float = 60.0
+    ):
+        """
+        Args:
+            max_retries: Retries per provider (0 disables retrying)
+            base_delay: First backoff step in seconds
+            max_delay: Cap for a single backoff delay
+            budget: Max total seconds spent waiting between retries per provider
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+    
+    def classify(self, provider: str, error: BaseException) -> Tuple[bool, Optional[float]]:
+        """
+        Is the error transient, and did the provider say when to retry?
+        
+        Returns:
+            (retryable, retry_after_seconds)
+        """
+        # Hugging Face / Ollama (raised by our own response check)
+        if isinstance(error, ProviderHTTPError):
+            return error.status in self.RETRYABLE_STATUS, error.retry_after
+        
+        # OpenAI, Anthropic and Groq SDKs: APIStatusError has status_code + response
+        status = getattr(error, 'status_code', None)
+        if isinstance(status, int):
+            response = getattr(error, 'response', None)
+            headers = getattr(response, 'headers', None) or {}
+            retry_after = _parse_retry_after(headers.get('retry-after'))
+            if retry_after is None and headers.get('retry-after-ms') is not None:
+                retry_after = (_parse_retry_after(headers.get('retry-after-ms')) or 0.0) / 1000
+            return status in self.RETRYABLE_STATUS, retry_after
+        
+        # Gemini (google.api_core exceptions carry the HTTP status in .code)
+        if provider == 'gemini' and isinstance(getattr(error, 'code', None), int):
+            return error.code in self.RETRYABLE_STATUS, None
+        
+        # Connection problems / timeouts (SDK APIConnectionError, httpx.TransportError, ...)
+        names = {cls.__name__ for cls in type(error).__mro__}
+        if (isinstance(error, (ConnectionError, TimeoutError))
+                or 'TransportError' in names
+                or any('Connect' in n or 'Timeout' in n for n in names)):
+            return True, None
+        return False, None
+    
+    def delay(self, provider: str, error: BaseException, retries: int, waited: float) -> Optional[float]:
+        """
+        Seconds to wait before the next try, or None to give up
+        
+        Args:
+            retries: Retries already made for this provider
+            waited: Seconds already spent waiting for this provider
+        """
+        if retries >= self.max_retries:
+            return None
+        retryable, retry_after = self.classify(provider, error)
+        if not retryable:
+            return None
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, 0.1 * retry_after + 0.05)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retries))
+        if waited + delay > self.budget:
+            return None
+        return delay
+
+
+class SingleFlight:
+    """
+    Request coalescing: concurrent identical calls share one upstream call
+    
+    The first caller for a key (the leader) does the work; callers that
+    arrive while it is in flight wait for and receive the same result.
+    Threads coalesce with threads, asyncio tasks with tasks on the same loop.
+    Streams are shared too: followers replay the leader's chunks as they arrive.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[Tuple[int, str], 'asyncio.Task'] = {}
+        self._streams: Dict[Any, Dict[str, Any]] = {}
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn() once per in-flight key (threads)
+        
+        Returns:
+            (result, shared) - shared is True for followers
+        """
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+        
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return flight['result'], True
+        
+        try:
+            flight['result'] = fn()
+        except BaseException as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            flight['done'].set()
+        return flight['result'], False
+    
+    async def ado(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async do(): the work runs as its own task, so a cancelled caller
+        does not cancel it for the others
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        task = self._tasks.get(task_key)
+        shared = task is not None
+        if task is None:
+            task = loop.create_task(factory())
+            self._tasks[task_key] = task
+            task.add_done_callback(
+                lambda done: self._tasks.pop(task_key, None) if self._tasks.get(task_key) is done else None
+            )
+        return await asyncio.shield(task), shared
+    
+    def stream(self, key: str, factory: Callable[[], Iterator[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """Share one stream of records between concurrent identical callers (threads)"""
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = {'records': [], 'done': False, 'cond': threading.Condition()}
+        
+        if leader:
+            try:
+                for record in factory():
+                    with flight['cond']:
+                        flight['records'].append(record)
+                        flight['cond'].notify_all()
+                    yield record
+            finally:
+                with self._lock:
+                    del self._streams[key]
+                with flight['cond']:
+                    flight['done'] = True
+                    flight['cond'].notify_all()
+            return
+        
+        index = 0
+        while True:
+            with flight['cond']:
+                while index >= len(flight['records']) and not flight['done']:
+                    flight['cond'].wait()
+                if index >= len(flight['records']):
+                    break
+                record = flight['records'][index]
+            index += 1
+            yield self._follower_record(record)
+            if record['type'] == 'result':
+                return
+        yield self._abandoned_record()
+    
+    async def astream(self, key: str, factory: Callable[[], AsyncIterator[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+        """Async stream() for tasks on the same event loop"""
+        stream_key = (id(asyncio.get_running_loop()), key)
+        flight = self._streams.get(stream_key)
+        if flight is None:
+            flight = self._streams[stream_key] = {'records': [], 'done': False, 'cond': asyncio.Condition()}
+            try:
+                async for record in factory():
+                    async with flight['cond']:
+                        flight['records'].append(record)
+                        flight['cond'].notify_all()
+                    yield record
+            finally:
+                del self._streams[stream_key]
+                async with flight['cond']:
+                    flight['done'] = True
+                    flight['cond'].notify_all()
+            return
+        
+        index = 0
+        while True:
+            async with flight['cond']:
+                await flight['cond'].wait_for(lambda: index < len(flight['records']) or flight['done'])
+                if index >= len(flight['records']):
+                    break
+                record = flight['records'][index]
+            index += 1
+            yield self._follower_record(record)
+            if record['type'] == 'result':
+                return
+        yield self._abandoned_record()
+    
+    @staticmethod
+    def _follower_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Mark a follower's final record as coalesced"""
+        if record['type'] == 'result':
+            return dict(record, coalesced=True)
+        return record
+    
+    @staticmethod
+    def _abandoned_record() -> Dict[str, Any]:
+        """Final record when the leader stopped reading before the end"""
+        return {
+            'type': 'result',
+            'provider': None,
+            'model': None,
+            'text': None,
+            'success': False,
+            'error': 'Shared stream was closed before it finished',
+            'coalesced': True,
+            'time_to_first_token': None,
+            'latency': None
+        }
+
+
+# Buckets for the in-process histograms (Prometheus 'le' upper bounds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative only when exported)"""
+    
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    In-process metrics for UnifiedAI calls, with a Prometheus text exporter
+    
+    Every series is labelled provider, model, operation (generate, agenerate,
+    stream, astream) and outcome (success, error, cached, coalesced), plus
+    the Instrumentation's constant labels.
+    """
+    
+    # metric name -> (call record field, buckets, help)
+    HISTOGRAMS = {
+        'unified_ai_request_duration_seconds': ('latency', LATENCY_BUCKETS, 'Wall time of a call'),
+        'unified_ai_queue_wait_seconds': ('queue_wait', LATENCY_BUCKETS,
+                                          'Time spent waiting on the local rate limiter and retry backoff'),
+        'unified_ai_time_to_first_token_seconds': ('time_to_first_token', LATENCY_BUCKETS,
+                                                   'Time to the first streamed chunk'),
+        'unified_ai_prompt_tokens': ('prompt_tokens', TOKEN_BUCKETS, 'Prompt tokens per call'),
+        'unified_ai_completion_tokens': ('completion_tokens', TOKEN_BUCKETS, 'Completion tokens per call'),
+        'unified_ai_request_bytes': ('request_bytes', BYTE_BUCKETS, 'Prompt payload bytes (UTF-8)'),
+        'unified_ai_response_bytes': ('response_bytes', BYTE_BUCKETS, 'Response text bytes (UTF-8)'),
+    }
+    COUNTERS = {
+        'unified_ai_requests_total': 'Calls',
+        'unified_ai_retries_total': 'Retries of transient errors',
+    }
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], Histogram]] = {
+            name: {} for name in self.HISTOGRAMS
+        }
+        self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {
+            name: {} for name in self.COUNTERS
+        }
+    
+    def observe(self, record: Dict[str, Any]):
+        """Add one call record (see Instrumentation)"""
+        labels = tuple(sorted(record['labels'].items()))
+        with self._lock:
+            for name, (field, buckets, _) in self.HISTOGRAMS.items():
+                value = record.get(field)
+                if value is None:
+                    continue
+                series = self._histograms[name]
+                histogram = series.get(labels)
+                if histogram is None:
+                    histogram = series[labels] = Histogram(buckets)
+                histogram.observe(value)
+            requests = self._counters['unified_ai_requests_total']
+            requests[labels] = requests.get(labels, 0) + 1
+            if record.get('retries'):
+                retries = self._counters['unified_ai_retries_total']
+                retries[labels] = retries.get(labels, 0) + record['retries']
+    
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        """Merged histogram of every series matching the given labels"""
+        with self._lock:
+            merged = None
+            for key, histogram in self._histograms[name].items():
+                if any(dict(key).get(k) != v for k, v in labels.items()):
+                    continue
+                if merged is None:
+                    merged = Histogram(histogram.buckets)
+                merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                merged.sum += histogram.sum
+                merged.count += histogram.count
+            return merged
+    
+    def summary(self, **labels) -> Dict[str, Dict[str, Optional[float]]]:
+        """count / mean / p50 / p95 / p99 per histogram, e.g. summary(provider='groq')"""
+        result = {}
+        for name in self.HISTOGRAMS:
+            histogram = self.histogram(name, **labels)
+            if histogram is None:
+                continue
+            result[name] = {
+                'count': histogram.count,
+                'mean': histogram.sum / histogram.count,
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99),
+            }
+        return result
+    
+    @staticmethod
+    def _labels_text(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        def escape(value: str) -> str:
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs = labels + extra
+        return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}' if pairs else ''
+    
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (_, buckets, help_text) in self.HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in self._histograms[name].items():
+                    cumulative = 0
+                    for bound, n in zip(list(buckets) + ['+Inf'], histogram.counts):
+                        cumulative += n
+                        lines.append(f'{name}_bucket{self._labels_text(labels, (("le", str(bound)),))} {cumulative}')
+                    lines.append(f'{name}_sum{self._labels_text(labels)} {histogram.sum}')
+                    lines.append(f'{name}_count{self._labels_text(labels)} {histogram.count}')
+            for name, help_text in self.COUNTERS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in self._counters[name].items():
+                    lines.append(f'{name}{self._labels_text(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+    
+    def serve(self, port: int = 9464, host: str = '127.0.0.1'):
+        """
+        Serve prometheus_text() at http://host:port/metrics from a daemon thread
+        
+        Returns:
+            The HTTP server (call .shutdown() to stop it)
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class Instrumentation:
+    """
+    Per-call instrumentation for UnifiedAI
+    
+    After every generate / agenerate / generate_stream / agenerate_stream
+    call a record is built and fed to `metrics` (if any) and to each span
+    callback. When UnifiedAI(instrumentation=None) (the default) none of
+    this runs.
+    
+    Call record:
+        {
+            'operation': 'generate' | 'agenerate' | 'stream' | 'astream',
+            'provider', 'model', 'success', 'error',
+            'started': float,               # epoch seconds
+            'latency': float,               # wall time (s)
+            'queue_wait': float,            # rate limiter + retry backoff (s)
+            'time_to_first_token': float | None,   # streams only
+            'prompt_tokens': int, 'completion_tokens': int,
+            'tokens_estimated': bool,       # True if the provider gave no usage
+            'tenant': str | None,
+            'request_bytes': int, 'response_bytes': int,   # UTF-8 payload text
+            'retries': int, 'cached': bool, 'coalesced': bool,
+            'attempts': [...],              # per-upstream-call spans (see generate())
+            'labels': {'provider', 'model', 'operation', 'outcome', **constant labels}
+        }
+    """
+    
+    def __init__(
+        self,
+        metrics: Optional[Metrics] = None,
+        callbacks: Optional[List[Callable[[Dict[str, Any]], None]]] = None,
+        labels: Optional[Dict[str, str]] = None
+    ):
+        """
+        Args:
+            metrics: Histograms to feed (e.g. Metrics())
+            callbacks: Span callbacks, called with each call record
+                       (e.g. to emit OpenTelemetry spans or structured logs)
+            labels: Constant labels added to every record, e.g. {'service': 'bot'}
+        """
+        self.metrics = metrics
+        self.callbacks = list(callbacks or [])
+        self.labels = dict(labels or {})
+    
+    def add_callback(self, callback: Callable[[Dict[str, Any]], None]):
+        """Register a span callback"""
+        self.callbacks.append(callback)
+    
+    def record(
+        self,
+        operation: str,
+        result: Dict[str, Any],
+        started: float,
+        latency: float,
+        prompt: str,
+        system: Optional[str],
+        tenant: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the call record for a finished call and publish it"""
+        text = result.get('text') or ''
+        usage = result.get('usage')
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage['input_tokens'], usage['output_tokens']
+            estimated = usage['estimated']
+        else:
+            prompt_tokens = estimate_tokens((system or '') + prompt)
+            completion_tokens = estimate_tokens(text) if text else 0
+            estimated = True
+        
+        if result.get('cached'):
+            outcome = 'cached'
+        elif result.get('coalesced'):
+            outcome = 'coalesced'
+        else:
+            outcome = 'success' if result.get('success') else 'error'
+        # Cache hits and coalesced followers made no upstream call of their own
+        upstream = outcome in ('success', 'error')
+        
+        record = {
+            'operation': operation,
+            'provider': result.get('provider'),
+            'model': result.get('model'),
+            'success': bool(result.get('success')),
+            'error': result.get('error'),
+            'started': started,
+            'latency': latency,
+            'queue_wait': result.get('queue_wait', 0.0) if upstream else 0.0,
+            'time_to_first_token': result.get('time_to_first_token'),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'tokens_estimated': estimated,
+            'tenant': tenant,
+            'request_bytes': len(prompt.encode('utf-8')) + len((system or '').encode('utf-8')),
+            'response_bytes': len(text.encode('utf-8')),
+            'retries': result.get('retries', 0) if upstream else 0,
+            'cached': bool(result.get('cached')),
+            'coalesced': bool(result.get('coalesced')),
+            'attempts': result.get('attempts', []) if upstream else [],
+            'labels': {
+                **self.labels,
+                'provider': result.get('provider') or 'none',
+                'model': result.get('model') or 'none',
+                'operation': operation,
+                'outcome': outcome,
+            },
+        }
+        if self.metrics is not None:
+            self.metrics.observe(record)
+        for callback in self.callbacks:
+            try:
+                callback(record)
+            except Exception as e:
+                print(f"⚠️ Instrumentation callback failed: {e}")
+        return record
+
+
 class UnifiedAI:
     """Tüm AI API'lerini tek arayüzle kullan"""
     
-    def __init__(self):
-        """Initialize all available AI clients"""
-        self.available_providers = []
+    def __init__(
+        self,
+        transport: Optional[HTTPTransport] = None,
+        cache: Optional[ResponseCache] = None,
+        router: Optional[ProviderRouter] = None,
+        fallback_chain: Optional[List[str]] = None,
+        breaker_options: Optional[Dict[str, Any]] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        coalesce: bool = True,
+        instrumentation: Optional[Instrumentation] = None,
+        token_budget: Optional[TokenBudget] = None,
+        shared_state: Optional[SharedState] = None,
+        ollama_models: Optional[OllamaModels] = None,
+        ollama_pool: Optional[OllamaPool] = None,
+        hf_batcher: Optional[HuggingFaceBatcher] = None
+    ):
+        """
+        Initialize all available AI clients
+        
+        Args:
+            transport: Pooled HTTP transport for Hugging Face / Ollama
+                       (default: HTTPTransport())
+            cache: Optional response cache (e.g. ResponseCache())
+            router: Routing policy for provider="auto" (default: ProviderRouter())
+            fallback_chain: Providers an explicit-provider call fails over to,
+                            in order ('auto' fails over along the router ranking)
+            breaker_options: CircuitBreaker settings, e.g. {'failure_threshold': 3}
+            rate_limiter: Client-side quotas, e.g. RateLimiter(FREE_TIER_LIMITS)
+            retry_policy: Retry/backoff for transient errors (default: RetryPolicy();
+                          the SDKs' own retries are turned off in favour of it)
+            coalesce: Share one upstream call between concurrent identical requests
+            instrumentation: Per-call metrics / span callbacks, e.g.
+                             Instrumentation(metrics=Metrics()) (None: off, no overhead)
+            token_budget: Per-period token quotas per provider / model / tenant,
+                          e.g. TokenBudget({'groq': 500_000, 'tenant:acme': 50_000})
+            shared_state: Keep circuit breaker state in this SharedState, shared
+                          with other worker processes (pair it with a
+                          SharedRateLimiter and a ResponseCache(sqlite_path=...))
+            ollama_models: Ollama keep_alive / warm-up / residency settings
+                           (default: OllamaModels() from OLLAMA_KEEP_ALIVE and
+                           OLLAMA_WARM_MODELS)
+            ollama_pool: Ollama hosts and balancing strategy (default:
+                         OllamaPool() over OLLAMA_URLS / OLLAMA_URL)
+            hf_batcher: Hugging Face micro-batching and options
+                        (default: HuggingFaceBatcher())
+        """
+        self.http = transport or HTTPTransport()
+        self.cache = cache
+        self.router = router or ProviderRouter()
+        self.fallback_chain = fallback_chain or []
+        self.breaker_options = breaker_options or {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.single_flight = SingleFlight() if coalesce else None
+        self.instrumentation = instrumentation
+        self.token_budget = token_budget
+        self.shared_state = shared_state
+        # SQLite-backed state (shared breakers / limits, disk cache tier)
+        # can wait seconds for another process's lock: keep it off the loop
+        self._offload = shared_state is not None or getattr(cache, '_db', None) is not None
+        self.ollama_models = ollama_models or OllamaModels()
+        self.ollama_pool = ollama_pool or OllamaPool()
+        self.hf_batcher = hf_batcher or HuggingFaceBatcher()
+        
+        # SDK clients are built on first use of each provider (see _lazy_client)
+        self._clients: Dict[str, Any] = {}
+        self._clients_lock = threading.Lock()
+        # (model, system) -> (GenerativeModel, expires_at) for Gemini prefixes
+        self._gemini_models: 'OrderedDict[str, Tuple[Any, float]]' = OrderedDict()
+        # generate_many(): per-provider semaphores of the calling worker thread
+        self._call_limits = threading.local()
+        
+        # Providers are discovered from API keys and installed SDKs only
+        self._providers: List[str] = []
         
-        # Gemini
         self.gemini_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
         if self.gemini_key and GEMINI_AVAILABLE:
-            try:
-                genai.configure(api_key=self.gemini_key)
-                self.gemini = genai.GenerativeModel('gemini-pro')
-                self.available_providers.append('gemini')
-            except Exception as e:
-                print(f"⚠️  Gemini init failed: {e}")
+            self._providers.append('gemini')
         
-        # OpenAI
         self.openai_key = os.getenv('OPENAI_API_KEY')
         if self.openai_key and OPENAI_AVAILABLE:
-            try:
-                self.openai = OpenAI(api_key=self.openai_key)
-                self.available_providers.append('openai')
-            except Exception as e:
-                print(f"⚠️  OpenAI init failed: {e}")
+            self._providers.append('openai')
         
-        # Claude
         self.anthropic_key = os.getenv('ANTHROPIC_API_KEY')
         if self.anthropic_key and CLAUDE_AVAILABLE:
-            try:
-                self.claude = anthropic.Anthropic(api_key=self.anthropic_key)
-                self.available_providers.append('claude')
-            except Exception as e:
-                print(f"⚠️  Claude init failed: {e}")
+            self._providers.append('claude')
         
-        # Groq
         self.groq_key = os.getenv('GROQ_API_KEY')
         if self.groq_key and GROQ_AVAILABLE:
-            try:
-                self.groq = Groq(api_key=self.groq_key)
-                self.available_providers.append('groq')
-            except Exception as e:
-                print(f"⚠️  Groq init failed: {e}")
+            self._providers.append('groq')
         
-        # Hugging Face
         self.hf_key = os.getenv('HUGGINGFACE_API_KEY')
         if self.hf_key:
-            self.available_providers.append('huggingface')
+            self._providers.append('huggingface')
         
-        # Ollama (local)
+        # Ollama (local) is probed in the background; callers only wait for
+        # the probe when they actually need Ollama or the full provider list.
+        # Warm-up runs on its own thread after the probe, so nobody waits for it.
+        self._ollama_warm_up: Optional[threading.Thread] = None
+        self._ollama_probe = threading.Thread(target=self._probe_ollama, daemon=True)
+        self._ollama_probe.start()
+    
+    @property
+    def available_providers(self) -> List[str]:
+        """Available providers (waits for the Ollama probe)"""
+        self._ollama_probe.join()
+        return self._providers
+    
+    def _is_available(self, provider: str) -> bool:
+        """Check a single provider, waiting for the probe only for Ollama"""
+        if provider == 'ollama':
+            self._ollama_probe.join()
+        return provider in self._providers
+    
+    def _probe_ollama(self):
+        """Background Ollama discovery and residency snapshot; starts the warm-up"""
         if self._check_ollama():
-            self.available_providers.append('ollama')
+            self._providers.append('ollama')
+            self._refresh_ollama_ps()
+            if self.ollama_models.warm_up:
+                # Routing sees the models turn resident as they load
+                self._ollama_warm_up = threading.Thread(target=self.warm_up_ollama, daemon=True)
+                self._ollama_warm_up.start()
     
     def _check_ollama(self) -> bool:
-        """Check if Ollama is running"""
-        try:
-            response = requests.get('http://localhost:11434/api/tags', timeout=2)
-            return response.status_code == 200
-        except:
-            return False
+        """Check if Ollama is running (on any host of the pool)"""
+        healthy = False
+        for url in self.ollama_pool.hosts:
+            try:
+                response = self.http.client.get(f'{url}/api/tags', timeout=2)
+                ok = response.status_code == 200
+            except:
+                ok = False
+            self.ollama_pool.health(url, ok)
+            healthy = healthy or ok
+        return healthy
+    
+    def _refresh_ollama_ps(self):
+        """
+        Fetch the loaded models from /api/ps of every host; doubles as the
+        pool's health check (a host that does not answer is ejected)
+        """
+        self.ollama_models.needs_refresh()
+        models = None
+        for url in self.ollama_pool.hosts:
+            try:
+                response = self.http.client.get(f'{url}/api/ps', timeout=2)
+                loaded = response.json().get('models', []) if response.status_code == 200 else None
+            except Exception:
+                loaded = None
+            self.ollama_pool.health(url, loaded is not None,
+                                    [m.get('name') or m.get('model', '') for m in loaded or []])
+            if loaded is not None:
+                models = (models or []) + loaded
+        self.ollama_models.update(models)
+    
+    def _ollama_model(self, model: str) -> str:
+        """
+        Model to send an Ollama request to (a resident alternative if one is
+        configured). Uses the cached /api/ps snapshot and refreshes a stale
+        one in the background, so it never blocks a request.
+        """
+        if self.ollama_models.needs_refresh():
+            threading.Thread(target=self._refresh_ollama_ps, daemon=True).start()
+        return self.ollama_models.choose(model)
+    
+    def warm_up_ollama(self, models: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Load models into Ollama's memory now (an empty /api/generate)
+        
+        With 'least_outstanding' balancing every live host loads every
+        model; with 'affinity' each model is loaded on its own host.
+        
+        Args:
+            models: Models to load (default: OllamaModels.warm_up)
+            
+        Returns:
+            {model: {'success', 'load_duration' (s, slowest host), 'error', 'hosts': [url, ...]}}
+        """
+        report = {}
+        for model in (self.ollama_models.warm_up if models is None else models):
+            payload = {'model': model, 'prompt': ''}
+            keep_alive = self.ollama_models.keep_alive_for(model)
+            if keep_alive is not None:
+                payload['keep_alive'] = keep_alive
+            if self.ollama_pool.strategy == 'affinity':
+                hosts = [self.ollama_pool.acquire(model)]
+                self.ollama_pool.release(hosts[0])
+            else:
+                hosts = self.ollama_pool.live_hosts()
+            report[model] = {'success': True, 'load_duration': 0.0, 'error': None, 'hosts': hosts}
+            for url in hosts:
+                try:
+                    # A cold load can take far longer than a normal request
+                    data = self._check_response(self.http.client.post(f'{url}/api/generate', json=payload, timeout=300))
+                    self.ollama_models.mark_resident(model)
+                    self.ollama_pool.mark_resident(url, model)
+                    report[model]['load_duration'] = max(report[model]['load_duration'], (data.get('load_duration') or 0) / 1e9)
+                except Exception as e:
+                    print(f"⚠️ Ollama warm-up failed for {model} on {url}: {e}")
+                    report[model].update(success=False, error=str(e))
+        return report
+    
+    # ---- Lazy SDK clients ----
+    
+    def _lazy_client(self, name: str) -> Any:
+        """Build (once) and return an SDK client, importing its SDK on first use"""
+        client = self._clients.get(name)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = getattr(self, f'_build_{name}')()
+                    self._clients[name] = client
+        return client
+    
+    def _build_gemini(self):
+        import google.generativeai as genai
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=self.gemini_key, transport='rest',
+                            client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=self.gemini_key)
+        return genai.GenerativeModel('gemini-pro')
+    
+    def _build_openai(self):
+        from openai import OpenAI
+        return OpenAI(api_key=self.openai_key, max_retries=0)
+    
+    def _build_openai_async(self):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=self.openai_key, max_retries=0)
+    
+    def _build_claude(self):
+        import anthropic
+        return anthropic.Anthropic(api_key=self.anthropic_key, max_retries=0)
+    
+    def _build_claude_async(self):
+        import anthropic
+        return anthropic.AsyncAnthropic(api_key=self.anthropic_key, max_retries=0)
+    
+    def _build_groq(self):
+        from groq import Groq
+        return Groq(api_key=self.groq_key, max_retries=0)
+    
+    def _build_groq_async(self):
+        from groq import AsyncGroq
+        return AsyncGroq(api_key=self.groq_key, max_retries=0)
+    
+    gemini = property(lambda self: self._lazy_client('gemini'))
+    openai = property(lambda self: self._lazy_client('openai'))
+    openai_async = property(lambda self: self._lazy_client('openai_async'))
+    claude = property(lambda self: self._lazy_client('claude'))
+    claude_async = property(lambda self: self._lazy_client('claude_async'))
+    groq = property(lambda self: self._lazy_client('groq'))
+    groq_async = property(lambda self: self._lazy_client('groq_async'))
+    
+    @staticmethod
+    def _error_result(provider: Optional[str], model: Optional[str], error: str) -> Dict[str, Any]:
+        """Build a failed result dict"""
+        return {
+            'provider': provider,
+            'model': model,
+            'text': None,
+            'success': False,
+            'error': error
+        }
+    
+    def _resolve_chain(
+        self,
+        provider: str,
+        model: Optional[str],
+        fallback: Optional[List[str]]
+    ) -> Tuple[List[Tuple[str, str]], Optional[Dict[str, Any]]]:
+        """
+        Build the ordered (provider, model) chain a request may fail over along
+        
+        'auto' uses every available provider, ranked by the router. An explicit
+        provider is followed by `fallback` (or the instance fallback_chain);
+        fallbacks use their default model.
+        
+        Returns:
+            (chain, None) on success, ([], error_result) otherwise
+        """
+        if provider == "auto":
+            chain = [
+                (name, model or DEFAULT_MODELS[name])
+                for name in AUTO_PRIORITY if self._is_available(name)
+            ]
+            if not chain:
+                return [], self._error_result(
+                    None, None, 'No AI provider available. Please configure API keys.'
+                )
+            chain = self.router.rank(chain)
+            chain = self._demote_cold_ollama(chain)
+        else:
+            # Check if provider is available
+            if not self._is_available(provider):
+                if provider not in DEFAULT_MODELS:
+                    return [], self._error_result(provider, None, f'Unknown provider: {provider}')
+                return [], self._error_result(
+                    provider, None, f'{provider} not available. Check API key or installation.'
+                )
+            chain = [(provider, model or DEFAULT_MODELS[provider])]
+        
+        for name in (self.fallback_chain if fallback is None else fallback):
+            if name in DEFAULT_MODELS and self._is_available(name) and name not in [p for p, _ in chain]:
+                chain.append((name, DEFAULT_MODELS[name]))
+        chain = [(name, self._ollama_model(m) if name == 'ollama' else m) for name, m in chain]
+        return chain, None
+    
+    def _demote_cold_ollama(self, chain: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """'auto': move Ollama to the end while its model is known not to be loaded"""
+        if not self.ollama_models.prefer_resident:
+            return chain
+        for i, (name, model) in enumerate(chain):
+            if name == 'ollama' and len(chain) > 1:
+                if self.ollama_models.is_resident(self.ollama_models.choose(model)) is False:
+                    return chain[:i] + chain[i + 1:] + [chain[i]]
+        return chain
     
     def generate(
         self, 
@@ -106,118 +2161,1458 @@ class UnifiedAI:
         model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 1000,
+        use_cache: bool = True,
+        fallback: Optional[List[str]] = None,
+        system: Optional[str] = None,
+        tenant: Optional[str] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
         Unified generate method
         
         Args:
-            prompt: User prompt
-            provider: 'auto', 'gemini', 'openai', 'claude', 'groq', 'huggingface', 'ollama'
-            model: Specific model (optional)
-            temperature: 0.0-1.0
-            max_tokens: Maximum output length
-            **kwargs: Additional parameters
+            prompt: User prompt
+            provider: 'auto', 'gemini', 'openai', 'claude', 'groq', 'huggingface', 'ollama'
+            model: Specific model (optional)
+            temperature: 0.0-1.0
+            max_tokens: Maximum output length
+            use_cache: Set False to skip the response cache and request
+                       coalescing for this call (always a fresh upstream call)
+            fallback: Providers to fail over to, in order (default: fallback_chain)
+            system: Stable prefix (system prompt / long shared context), sent
+                    ahead of the prompt and cached provider-side where supported
+                    (Claude cache_control, OpenAI automatic prompt caching,
+                    Gemini cached content / system_instruction)
+            tenant: Tenant charged against TokenBudget 'tenant:<name>' quotas
+            **kwargs: Additional parameters
+            
+        Returns:
+            {
+                'provider': str,
+                'model': str,
+                'text': str,
+                'success': bool,
+                'error': Optional[str],
+                'attempts': [{'provider', 'model', 'success', 'error', 'latency'}, ...],
+                'retries': int,         # retries of transient errors
+                'queue_wait': float,    # seconds spent on the local rate limiter
+                                        # and retry backoff
+                'usage': {              # normalized across providers (on success)
+                    'input_tokens': int,        # all prompt tokens, cached ones included
+                    'output_tokens': int,
+                    'cached_tokens': int,       # read from the provider's prefix cache
+                    'cache_write_tokens': int,  # written to it (Claude)
+                    'total_tokens': int,
+                    'estimated': bool           # True if the provider reported no usage
+                },
+                'timings': {...} | None,  # Ollama: load / prompt_eval / eval / total (s);
+                                          # a large 'load' is a cold start
+                'host': str,              # Ollama: the host (OllamaPool) that answered
+                'cached': True,         # only on cache hits
+                'coalesced': True       # only when shared with a concurrent identical call
+            }
+        """
+        if self.instrumentation is None:
+            return self._generate(prompt, provider, model, temperature, max_tokens, use_cache, fallback, system, tenant, **kwargs)
+        started_at, started = time.time(), time.perf_counter()
+        result = self._generate(prompt, provider, model, temperature, max_tokens, use_cache, fallback, system, tenant, **kwargs)
+        self.instrumentation.record('generate', result, started_at, time.perf_counter() - started, prompt, system, tenant)
+        return result
+    
+    def _generate(
+        self,
+        prompt: str,
+        provider: str,
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        use_cache: bool,
+        fallback: Optional[List[str]],
+        system: Optional[str],
+        tenant: Optional[str],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """generate() without instrumentation"""
+        chain, error = self._resolve_chain(provider, model, fallback)
+        if error:
+            return error
+        provider, model = chain[0]
+        
+        options = dict(kwargs, system=system) if system else kwargs
+        cache_key = self._cache_key(use_cache, provider, model, prompt, temperature, max_tokens, options)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        def call() -> Dict[str, Any]:
+            result, attempts = self._run_chain(chain, prompt, temperature, max_tokens, system, tenant)
+            return self._finish(result, chain, attempts, cache_key)
+        
+        flight_key = self._flight_key(use_cache, provider, model, prompt, temperature, max_tokens, options)
+        if flight_key is None:
+            return call()
+        result, shared = self.single_flight.do(flight_key, call)
+        return dict(result, coalesced=True) if shared else result
+    
+    async def agenerate(
+        self,
+        prompt: str,
+        provider: str = "auto",
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        use_cache: bool = True,
+        fallback: Optional[List[str]] = None,
+        system: Optional[str] = None,
+        tenant: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Async version of generate() - same arguments, same result dict
+        
+        Uses the async SDK clients (AsyncOpenAI, AsyncAnthropic, AsyncGroq,
+        Gemini generate_content_async) and httpx for Hugging Face / Ollama,
+        so many generations can run concurrently on one event loop.
+        """
+        if self.instrumentation is None:
+            return await self._agenerate(prompt, provider, model, temperature, max_tokens, use_cache, fallback, system, tenant, **kwargs)
+        started_at, started = time.time(), time.perf_counter()
+        result = await self._agenerate(prompt, provider, model, temperature, max_tokens, use_cache, fallback, system, tenant, **kwargs)
+        self.instrumentation.record('agenerate', result, started_at, time.perf_counter() - started, prompt, system, tenant)
+        return result
+    
+    async def _agenerate(
+        self,
+        prompt: str,
+        provider: str,
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        use_cache: bool,
+        fallback: Optional[List[str]],
+        system: Optional[str],
+        tenant: Optional[str],
+        **kwargs
+    ) -> Dict[str, Any]:
+        """agenerate() without instrumentation"""
+        chain, error = self._resolve_chain(provider, model, fallback)
+        if error:
+            return error
+        provider, model = chain[0]
+        
+        options = dict(kwargs, system=system) if system else kwargs
+        cache_key = self._cache_key(use_cache, provider, model, prompt, temperature, max_tokens, options)
+        if cache_key:
+            cached = await self._off_loop(self.cache.get, cache_key)
+            if cached is not None:
+                return cached
+        
+        async def call() -> Dict[str, Any]:
+            result, attempts = await self._arun_chain(chain, prompt, temperature, max_tokens, system, tenant)
+            return await self._afinish(result, chain, attempts, cache_key)
+        
+        flight_key = self._flight_key(use_cache, provider, model, prompt, temperature, max_tokens, options)
+        if flight_key is None:
+            return await call()
+        result, shared = await self.single_flight.ado(flight_key, call)
+        return dict(result, coalesced=True) if shared else result
+    
+    # ---- Failover, retries and bookkeeping ----
+    
+    def _run_chain(
+        self,
+        chain: List[Tuple[str, str]],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        system: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Try each (provider, model) in order, retrying transient errors
+        
+        Returns:
+            (last result or None if every provider was skipped, attempts)
+        """
+        attempts: List[Dict[str, Any]] = []
+        result = None
+        retries = 0
+        queue_wait = 0.0
+        for provider, model in chain:
+            tries, waited, calls = 0, 0.0, 0
+            while True:
+                waiting = time.perf_counter()
+                skipped, reservation = self._admit(provider, model, (system or '') + prompt, max_tokens, tenant)
+                queue_wait += time.perf_counter() - waiting
+                if skipped:
+                    attempts.append(self._attempt(provider, model, 0.0, skipped))
+                    break
+                started = time.perf_counter()
+                calls += 1
+                try:
+                    with self._call_limit(provider):
+                        result = self._call_provider(provider, prompt, model, temperature, max_tokens, system)
+                    self._fill_usage(result, prompt, system)
+                    self._settle(reservation, result)
+                    attempts.append(self._record_attempt(provider, model, time.perf_counter() - started, None))
+                    break
+                except Exception as e:
+                    self._settle(reservation, None)
+                    result = self._error_result(provider, model, str(e))
+                    attempts.append(self._record_attempt(provider, model, time.perf_counter() - started, e))
+                    delay = self.retry_policy.delay(provider, e, tries, waited)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+                    tries, waited = tries + 1, waited + delay
+                    queue_wait += delay
+                finally:
+                    # Cancelled (not an Exception): release the reservation
+                    self._settle(reservation, None)
+            retries += max(0, calls - 1)
+            if result is not None and result['success']:
+                break
+        
+        if result is not None:
+            result['retries'] = retries
+            result['queue_wait'] = queue_wait
+        return result, attempts
+    
+    async def _arun_chain(
+        self,
+        chain: List[Tuple[str, str]],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        system: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Async _run_chain()"""
+        attempts: List[Dict[str, Any]] = []
+        result = None
+        retries = 0
+        queue_wait = 0.0
+        for provider, model in chain:
+            tries, waited, calls = 0, 0.0, 0
+            while True:
+                waiting = time.perf_counter()
+                skipped, reservation = await self._aadmit(provider, model, (system or '') + prompt, max_tokens, tenant)
+                queue_wait += time.perf_counter() - waiting
+                if skipped:
+                    attempts.append(self._attempt(provider, model, 0.0, skipped))
+                    break
+                started = time.perf_counter()
+                calls += 1
+                try:
+                    result = await self._acall_provider(provider, prompt, model, temperature, max_tokens, system)
+                    self._fill_usage(result, prompt, system)
+                    self._settle(reservation, result)
+                    attempts.append(await self._arecord_attempt(provider, model, time.perf_counter() - started, None))
+                    break
+                except Exception as e:
+                    self._settle(reservation, None)
+                    result = self._error_result(provider, model, str(e))
+                    attempts.append(await self._arecord_attempt(provider, model, time.perf_counter() - started, e))
+                    delay = self.retry_policy.delay(provider, e, tries, waited)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                    tries, waited = tries + 1, waited + delay
+                    queue_wait += delay
+                finally:
+                    # Cancelled (not an Exception): release the reservation
+                    self._settle(reservation, None)
+            retries += max(0, calls - 1)
+            if result is not None and result['success']:
+                break
+        
+        if result is not None:
+            result['retries'] = retries
+            result['queue_wait'] = queue_wait
+        return result, attempts
+    
+    def _breaker(self, provider: str) -> 'CircuitBreaker':
+        """Circuit breaker for a provider (created on first use)"""
+        breaker = self.breakers.get(provider)
+        if breaker is None:
+            with self._clients_lock:
+                if provider not in self.breakers:
+                    self.breakers[provider] = (
+                        SharedCircuitBreaker(self.shared_state, provider, **self.breaker_options)
+                        if self.shared_state is not None else CircuitBreaker(**self.breaker_options)
+                    )
+                breaker = self.breakers[provider]
+        return breaker
+    
+    def circuit_states(self) -> Dict[str, str]:
+        """Current circuit state per provider"""
+        return {provider: breaker.state for provider, breaker in self.breakers.items()}
+    
+    def ollama_hosts(self) -> Dict[str, Dict[str, Any]]:
+        """Load and health of each Ollama host (see OllamaPool.stats)"""
+        return self.ollama_pool.stats()
+    
+    def _admit(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        max_tokens: int,
+        tenant: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Gate one upstream call: token budget, circuit breaker, then rate limiter (may block)
+        
+        Returns:
+            (None, budget reservation or None) if the call may go out,
+            otherwise (the reason it was skipped, None)
+        """
+        cost = estimate_tokens(prompt) + max_tokens
+        reservation = None
+        if self.token_budget is not None:
+            reservation = self.token_budget.reserve(provider, model, tenant, cost)
+            if reservation is None:
+                return 'token budget exhausted', None
+        if not self._breaker(provider).allow():
+            self._settle(reservation, None)
+            return 'circuit open', None
+        if self.rate_limiter is not None and not self.rate_limiter.acquire(provider, model, cost):
+            self._settle(reservation, None)
+            return 'rate limited (local)', None
+        return None, reservation
+    
+    async def _aadmit(
+        self,
+        provider: str,
+        model: str,
+        prompt: str,
+        max_tokens: int,
+        tenant: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Async _admit() - queues on the rate limiter without blocking the loop"""
+        cost = estimate_tokens(prompt) + max_tokens
+        reservation = None
+        if self.token_budget is not None:
+            reservation = self.token_budget.reserve(provider, model, tenant, cost)
+            if reservation is None:
+                return 'token budget exhausted', None
+        if not await self._off_loop(self._breaker(provider).allow):
+            self._settle(reservation, None)
+            return 'circuit open', None
+        if self.rate_limiter is not None:
+            wait = await self._off_loop(self.rate_limiter.reserve, provider, model, cost)
+            if wait is None:
+                self._settle(reservation, None)
+                return 'rate limited (local)', None
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return None, reservation
+    
+    def _settle(self, reservation: Optional[Dict[str, Any]], result: Optional[Dict[str, Any]]):
+        """Charge a budget reservation with the call's usage (nothing if it failed)"""
+        if reservation is None or reservation.get('settled'):
+            return
+        usage = (result or {}).get('usage') or {}
+        self.token_budget.settle(reservation, usage.get('total_tokens', 0))
+    
+    @staticmethod
+    def _attempt(provider: str, model: str, latency: float, error: Optional[str]) -> Dict[str, Any]:
+        """One entry of result['attempts']"""
+        return {
+            'provider': provider,
+            'model': model,
+            'success': error is None,
+            'error': error,
+            'latency': latency
+        }
+    
+    def _record_attempt(self, provider: str, model: str, latency: float, error: Optional[Exception]) -> Dict[str, Any]:
+        """Feed one upstream call into the circuit breaker and router"""
+        breaker = self._breaker(provider)
+        if error is None:
+            breaker.record_success()
+        elif not getattr(error, 'loading', False):
+            # A model that is still loading is not a broken provider (and one
+            # cold batch would otherwise count once per batched caller)
+            breaker.record_failure()
+        message = None if error is None else str(error)
+        self.router.record(provider, model, latency, message)
+        return self._attempt(provider, model, latency, message)
+    
+    async def _arecord_attempt(self, provider: str, model: str, latency: float, error: Optional[Exception]) -> Dict[str, Any]:
+        """Async _record_attempt() (a shared breaker is updated off the loop)"""
+        breaker = self._breaker(provider)
+        if error is None:
+            await self._off_loop(breaker.record_success)
+        elif not getattr(error, 'loading', False):
+            await self._off_loop(breaker.record_failure)
+        message = None if error is None else str(error)
+        self.router.record(provider, model, latency, message)
+        return self._attempt(provider, model, latency, message)
+    
+    def _finish(
+        self,
+        result: Optional[Dict[str, Any]],
+        chain: List[Tuple[str, str]],
+        attempts: List[Dict[str, Any]],
+        cache_key: Optional[str]
+    ) -> Dict[str, Any]:
+        """Attach attempts to the final result and cache it if successful"""
+        if result is None:
+            provider, model = chain[0]
+            result = self._error_result(
+                provider, model, 'All providers skipped: '
+                + ', '.join(f"{a['provider']} ({a['error']})" for a in attempts)
+            )
+        elif cache_key and result['success']:
+            self.cache.set(cache_key, result)
+        result['attempts'] = attempts
+        return result
+    
+    async def _afinish(
+        self,
+        result: Optional[Dict[str, Any]],
+        chain: List[Tuple[str, str]],
+        attempts: List[Dict[str, Any]],
+        cache_key: Optional[str]
+    ) -> Dict[str, Any]:
+        """Async _finish(): the cache write runs off the event loop"""
+        if result is not None and cache_key and result['success']:
+            await self._off_loop(self.cache.set, cache_key, result)
+        return self._finish(result, chain, attempts, None)
+    
+    async def _off_loop(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        fn(*args) from async code: in a worker thread when it may block on
+        SQLite (shared state, disk cache), inline otherwise
+        """
+        if not self._offload:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+    
+    def _cache_key(
+        self,
+        use_cache: bool,
+        provider: str,
+        model: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        options: Dict[str, Any]
+    ) -> Optional[str]:
+        """Cache key for this call, or None if the cache is off/bypassed"""
+        if self.cache is None or not use_cache:
+            return None
+        return self.cache.key(provider, model, prompt, temperature, max_tokens, options)
+    
+    def _flight_key(
+        self,
+        use_cache: bool,
+        provider: str,
+        model: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        options: Dict[str, Any]
+    ) -> Optional[str]:
+        """Coalescing key for this call, or None if coalescing is off/bypassed"""
+        if self.single_flight is None or not use_cache:
+            return None
+        return request_key(provider, model, prompt, temperature, max_tokens, options)
+    
+    @contextmanager
+    def _call_limit(self, provider: str):
+        """Hold the generate_many() per-provider cap (if any) for the provider actually called"""
+        semaphore = getattr(self._call_limits, 'semaphores', {}).get(provider)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+    
+    def _call_provider(
+        self,
+        provider: str,
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        system: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Dispatch to the provider's sync implementation (raises on failure)"""
+        if provider == "gemini":
+            return self._generate_gemini(prompt, model, temperature, max_tokens, system)
+        elif provider == "openai":
+            return self._generate_openai(prompt, model, temperature, max_tokens, system)
+        elif provider == "claude":
+            return self._generate_claude(prompt, model, temperature, max_tokens, system)
+        elif provider == "groq":
+            return self._generate_groq(prompt, model, temperature, max_tokens, system)
+        elif provider == "huggingface":
+            return self._generate_huggingface(prompt, model, temperature, max_tokens, system)
+        else:
+            return self._generate_ollama(prompt, model, temperature, max_tokens, system)
+    
+    async def _acall_provider(
+        self,
+        provider: str,
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        system: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Dispatch to the provider's async implementation (raises on failure)"""
+        if provider == "gemini":
+            return await self._agenerate_gemini(prompt, model, temperature, max_tokens, system)
+        elif provider == "openai":
+            return await self._agenerate_openai(prompt, model, temperature, max_tokens, system)
+        elif provider == "claude":
+            return await self._agenerate_claude(prompt, model, temperature, max_tokens, system)
+        elif provider == "groq":
+            return await self._agenerate_groq(prompt, model, temperature, max_tokens, system)
+        elif provider == "huggingface":
+            return await self._agenerate_huggingface(prompt, model, temperature, max_tokens, system)
+        else:
+            return await self._agenerate_ollama(prompt, model, temperature, max_tokens, system)
+    
+    def generate_stream(
+        self,
+        prompt: str,
+        provider: str = "auto",
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        use_cache: bool = True,
+        fallback: Optional[List[str]] = None,
+        system: Optional[str] = None,
+        tenant: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming generate - same arguments as generate()
+        
+        Yields:
+            {'type': 'chunk', 'text': str}      for each piece of output, then
+            {'type': 'result', ...generate() result dict...,
+             'time_to_first_token': float, 'latency': float}   (seconds)
+        
+        Failover to the next provider only happens before the first chunk.
+        Hugging Face has no token streaming here; its output arrives as one chunk.
+        """
+        records = self._generate_stream(prompt, provider, model, temperature, max_tokens, use_cache, fallback, system, tenant, **kwargs)
+        if self.instrumentation is None:
+            yield from records
+            return
+        started_at = time.time()
+        for record in records:
+            if record['type'] == 'result':
+                self.instrumentation.record('stream', record, started_at, record['latency'] or 0.0, prompt, system, tenant)
+            yield record
+    
+    def _generate_stream(
+        self,
+        prompt: str,
+        provider: str,
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        use_cache: bool,
+        fallback: Optional[List[str]],
+        system: Optional[str],
+        tenant: Optional[str],
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """generate_stream() without instrumentation"""
+        chain, error = self._resolve_chain(provider, model, fallback)
+        if error:
+            yield self._stream_result(error, None, 0.0)
+            return
+        provider, model = chain[0]
+        
+        started = time.perf_counter()
+        options = dict(kwargs, system=system) if system else kwargs
+        cache_key = self._cache_key(use_cache, provider, model, prompt, temperature, max_tokens, options)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield {'type': 'chunk', 'text': cached['text']}
+                yield self._stream_result(cached, 0.0, time.perf_counter() - started)
+                return
+        
+        def upstream() -> Iterator[Dict[str, Any]]:
+            return self._stream_chain(chain, prompt, temperature, max_tokens, cache_key, started, system, tenant)
+        
+        flight_key = self._flight_key(use_cache, provider, model, prompt, temperature, max_tokens, options)
+        if flight_key is None:
+            yield from upstream()
+        else:
+            yield from self.single_flight.stream(flight_key, upstream)
+    
+    def _stream_chain(
+        self,
+        chain: List[Tuple[str, str]],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        cache_key: Optional[str],
+        started: float,
+        system: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream along the failover chain, retrying before the first chunk"""
+        attempts: List[Dict[str, Any]] = []
+        result = None
+        retries = 0
+        queue_wait = 0.0
+        parts: List[str] = []
+        first_token = None
+        for provider, model in chain:
+            tries, waited, calls = 0, 0.0, 0
+            while True:
+                waiting = time.perf_counter()
+                skipped, reservation = self._admit(provider, model, (system or '') + prompt, max_tokens, tenant)
+                queue_wait += time.perf_counter() - waiting
+                if skipped:
+                    attempts.append(self._attempt(provider, model, 0.0, skipped))
+                    break
+                attempt_started = time.perf_counter()
+                calls += 1
+                try:
+                    final = {}
+                    for text in getattr(self, f'_stream_{provider}')(prompt, model, temperature, max_tokens, system):
+                        if isinstance(text, dict):
+                            final = text   # final record of the stream: usage (+ timings)
+                            continue
+                        if not text:
+                            continue
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(text)
+                        yield {'type': 'chunk', 'text': text}
+                except Exception as e:
+                    attempts.append(self._record_attempt(provider, model, time.perf_counter() - attempt_started, e))
+                    result = self._error_result(provider, model, str(e))
+                    result['text'] = ''.join(parts) or None
+                    # Partial output was generated (and is billed): charge its estimate
+                    self._settle(reservation, {'usage': self._estimate_usage(prompt, system, result['text'])} if parts else None)
+                    # Output already sent: no retry, no failover
+                    delay = None if parts else self.retry_policy.delay(provider, e, tries, waited)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+                    tries, waited = tries + 1, waited + delay
+                    queue_wait += delay
+                    continue
+                else:
+                    attempts.append(self._record_attempt(provider, model, time.perf_counter() - attempt_started, None))
+                    result = self._stream_success(provider, model, ''.join(parts), final.get('usage'))
+                    result.update(final)
+                    self._fill_usage(result, prompt, system)
+                    self._settle(reservation, result)
+                finally:
+                    # Abandoned by the caller (GeneratorExit / aclose()) or
+                    # cancelled: release the reservation, charging partial output
+                    if reservation is not None and not reservation.get('settled'):
+                        self._settle(reservation, {'usage': self._estimate_usage(prompt, system, ''.join(parts))} if parts else None)
+                break
+            retries += max(0, calls - 1)
+            if parts or (result is not None and result['success']):
+                break
+        
+        if result is not None:
+            result['retries'] = retries
+            result['queue_wait'] = queue_wait
+        result = self._finish(result, chain, attempts, cache_key)
+        yield self._stream_result(result, first_token, time.perf_counter() - started)
+    
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        provider: str = "auto",
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        use_cache: bool = True,
+        fallback: Optional[List[str]] = None,
+        system: Optional[str] = None,
+        tenant: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Async version of generate_stream() - same records, as an async iterator"""
+        started_at = time.time()
+        records = self._agenerate_stream(prompt, provider, model, temperature, max_tokens, use_cache, fallback, system, tenant, **kwargs)
+        try:
+            async for record in records:
+                if record['type'] == 'result' and self.instrumentation is not None:
+                    self.instrumentation.record('astream', record, started_at, record['latency'] or 0.0, prompt, system, tenant)
+                yield record
+        finally:
+            # Close the inner generators now (not whenever the loop finalizes
+            # them), so an abandoned stream releases its budget reservation
+            await records.aclose()
+    
+    async def _agenerate_stream(
+        self,
+        prompt: str,
+        provider: str,
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        use_cache: bool,
+        fallback: Optional[List[str]],
+        system: Optional[str],
+        tenant: Optional[str],
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """agenerate_stream() without instrumentation"""
+        chain, error = self._resolve_chain(provider, model, fallback)
+        if error:
+            yield self._stream_result(error, None, 0.0)
+            return
+        provider, model = chain[0]
+        
+        started = time.perf_counter()
+        options = dict(kwargs, system=system) if system else kwargs
+        cache_key = self._cache_key(use_cache, provider, model, prompt, temperature, max_tokens, options)
+        if cache_key:
+            cached = await self._off_loop(self.cache.get, cache_key)
+            if cached is not None:
+                yield {'type': 'chunk', 'text': cached['text']}
+                yield self._stream_result(cached, 0.0, time.perf_counter() - started)
+                return
+        
+        def upstream() -> AsyncIterator[Dict[str, Any]]:
+            return self._astream_chain(chain, prompt, temperature, max_tokens, cache_key, started, system, tenant)
+        
+        flight_key = self._flight_key(use_cache, provider, model, prompt, temperature, max_tokens, options)
+        stream = upstream() if flight_key is None else self.single_flight.astream(flight_key, upstream)
+        try:
+            async for record in stream:
+                yield record
+        finally:
+            await stream.aclose()
+    
+    async def _astream_chain(
+        self,
+        chain: List[Tuple[str, str]],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        cache_key: Optional[str],
+        started: float,
+        system: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Async _stream_chain()"""
+        attempts: List[Dict[str, Any]] = []
+        result = None
+        retries = 0
+        queue_wait = 0.0
+        parts: List[str] = []
+        first_token = None
+        for provider, model in chain:
+            tries, waited, calls = 0, 0.0, 0
+            while True:
+                waiting = time.perf_counter()
+                skipped, reservation = await self._aadmit(provider, model, (system or '') + prompt, max_tokens, tenant)
+                queue_wait += time.perf_counter() - waiting
+                if skipped:
+                    attempts.append(self._attempt(provider, model, 0.0, skipped))
+                    break
+                attempt_started = time.perf_counter()
+                calls += 1
+                pieces = getattr(self, f'_astream_{provider}')(prompt, model, temperature, max_tokens, system)
+                try:
+                    final = {}
+                    async for text in pieces:
+                        if isinstance(text, dict):
+                            final = text   # final record of the stream: usage (+ timings)
+                            continue
+                        if not text:
+                            continue
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(text)
+                        yield {'type': 'chunk', 'text': text}
+                except Exception as e:
+                    attempts.append(await self._arecord_attempt(provider, model, time.perf_counter() - attempt_started, e))
+                    result = self._error_result(provider, model, str(e))
+                    result['text'] = ''.join(parts) or None
+                    # Partial output was generated (and is billed): charge its estimate
+                    self._settle(reservation, {'usage': self._estimate_usage(prompt, system, result['text'])} if parts else None)
+                    # Output already sent: no retry, no failover
+                    delay = None if parts else self.retry_policy.delay(provider, e, tries, waited)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                    tries, waited = tries + 1, waited + delay
+                    queue_wait += delay
+                    continue
+                else:
+                    attempts.append(await self._arecord_attempt(provider, model, time.perf_counter() - attempt_started, None))
+                    result = self._stream_success(provider, model, ''.join(parts), final.get('usage'))
+                    result.update(final)
+                    self._fill_usage(result, prompt, system)
+                    self._settle(reservation, result)
+                finally:
+                    # Abandoned by the caller (GeneratorExit / aclose()) or
+                    # cancelled: release the reservation, charging partial output
+                    if reservation is not None and not reservation.get('settled'):
+                        self._settle(reservation, {'usage': self._estimate_usage(prompt, system, ''.join(parts))} if parts else None)
+                    await pieces.aclose()
+                break
+            retries += max(0, calls - 1)
+            if parts or (result is not None and result['success']):
+                break
+        
+        if result is not None:
+            result['retries'] = retries
+            result['queue_wait'] = queue_wait
+        result = await self._afinish(result, chain, attempts, cache_key)
+        yield self._stream_result(result, first_token, time.perf_counter() - started)
+    
+    @staticmethod
+    def _stream_success(provider: str, model: str, text: str, usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Result dict for a completed stream"""
+        return {
+            'provider': provider,
+            'model': model,
+            'text': text,
+            'success': True,
+            'error': None,
+            'usage': usage
+        }
+    
+    @staticmethod
+    def _stream_result(result: Dict[str, Any], first_token: Optional[float], latency: float) -> Dict[str, Any]:
+        """Final stream record"""
+        return {
+            'type': 'result',
+            **result,
+            'time_to_first_token': first_token,
+            'latency': latency
+        }
+    
+    def close(self):
+        """Close pooled HTTP connections and the cache"""
+        self.http.close()
+        if self.cache is not None and hasattr(self.cache, 'close'):
+            self.cache.close()
+    
+    async def aclose(self):
+        """Close pooled HTTP connections (sync and async)"""
+        await self.http.aclose()
+    
+    def generate_many(
+        self,
+        prompts: Iterable[Union[str, Dict[str, Any]]],
+        provider: str = "auto",
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        max_concurrency: int = 8,
+        per_provider_limits: Optional[Dict[str, int]] = None,
+        as_completed: bool = False,
+        **kwargs
+    ) -> Union[List[Dict[str, Any]], Iterator[Tuple[int, Dict[str, Any]]]]:
+        """
+        Run many generations concurrently in a bounded thread pool
+        
+        Args:
+            prompts: Prompt strings, or dicts of generate() arguments
+                     (e.g. {'prompt': '...', 'provider': 'groq'}) to override
+                     the defaults below per item
+            provider, model, temperature, max_tokens, **kwargs: Defaults for every item
+            max_concurrency: Maximum number of in-flight requests
+            per_provider_limits: Optional cap per provider, e.g. {'groq': 2}
+            as_completed: Yield (index, result) as soon as each item finishes
+                          instead of returning a list in input order
+            
+        Returns:
+            List of result dicts in input order (same shape as generate()),
+            or an iterator of (index, result) tuples when as_completed=True.
+            Failures are reported per item, never raised.
+        """
+        defaults = dict(provider=provider, model=model, temperature=temperature,
+                        max_tokens=max_tokens, **kwargs)
+        items = [
+            {**defaults, 'prompt': item} if isinstance(item, str) else {**defaults, **item}
+            for item in prompts
+        ]
+        results = self._iter_many(items, max_concurrency, per_provider_limits or {})
+        
+        if as_completed:
+            return results
+        
+        ordered: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        for index, result in results:
+            ordered[index] = result
+        return ordered
+    
+    def _iter_many(
+        self,
+        items: List[Dict[str, Any]],
+        max_concurrency: int,
+        per_provider_limits: Dict[str, int]
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Execute generate() calls in a worker pool, yielding as they complete"""
+        semaphores = {
+            name: threading.BoundedSemaphore(max(1, limit))
+            for name, limit in per_provider_limits.items()
+        }
+        
+        def run(index: int, item: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+            # The caps are taken inside the chain (_call_limit), so they apply
+            # to whichever provider 'auto' routing or failover ends up calling
+            self._call_limits.semaphores = semaphores
+            try:
+                return index, self.generate(**item)
+            except Exception as e:
+                return index, self._error_result(item['provider'], item.get('model'), str(e))
+            finally:
+                self._call_limits.semaphores = {}
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = [executor.submit(run, i, item) for i, item in enumerate(items)]
+            for future in futures_as_completed(futures):
+                yield future.result()
+    
+    # ---- Provider Batch APIs (asynchronous, for large offline jobs) ----
+    
+    def submit_batch(
+        self,
+        prompts: Iterable[Union[str, Dict[str, Any]]],
+        provider: str = "openai",
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        system: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Submit prompts to the provider's Batch API (OpenAI, Claude)
+        
+        Batches run asynchronously within 24h, at far higher throughput
+        limits than per-request calls. Inputs larger than the provider's
+        per-batch limit are split over several batches.
+        
+        Args:
+            prompts: Prompt strings, or dicts with 'prompt' and optional
+                     'id', 'model', 'system', 'temperature', 'max_tokens'
+            provider: 'openai' or 'claude'
+            model, temperature, max_tokens, system: Defaults for every item
+            
+        Returns:
+            Batch handle (JSON-serializable, can be saved and collected
+            later): {'provider', 'batches': [{'id', 'offset', 'count'}], 'ids', 'models'}
+        """
+        if provider not in BATCH_MAX_REQUESTS:
+            raise ValueError(f"Batch API not supported for provider: {provider} (use one of {list(BATCH_MAX_REQUESTS)})")
+        if provider not in self.available_providers:
+            raise ValueError(f"Provider not available: {provider}")
+        
+        ids: List[Any] = []
+        models: List[str] = []
+        requests: List[Dict[str, Any]] = []
+        for index, item in enumerate(prompts):
+            if isinstance(item, str):
+                item = {'prompt': item}
+            item_model = item.get('model') or model or DEFAULT_MODELS[provider]
+            ids.append(item.get('id', index))
+            models.append(item_model)
+            requests.append(self._batch_request(
+                provider, f'req-{index}', item['prompt'], item_model,
+                item.get('temperature', temperature), item.get('max_tokens', max_tokens),
+                item.get('system', system)
+            ))
+        
+        limit = BATCH_MAX_REQUESTS[provider]
+        batches = []
+        for offset in range(0, len(requests), limit):
+            chunk = requests[offset:offset + limit]
+            batches.append({'id': self._submit_batch(provider, chunk), 'offset': offset, 'count': len(chunk)})
+        return {'provider': provider, 'batches': batches, 'ids': ids, 'models': models}
+    
+    def batch_status(self, handle: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Progress of a submitted batch job
+        
+        Returns:
+            {'done': bool, 'statuses': [provider status per batch],
+             'counts': {'succeeded', 'failed', 'processing'}}
+        """
+        counts = {'succeeded': 0, 'failed': 0, 'processing': 0}
+        statuses = []
+        for batch in handle['batches']:
+            status, done, batch_counts = self._batch_state(handle['provider'], batch['id'])
+            statuses.append(status)
+            batch['done'] = done
+            for key, value in batch_counts.items():
+                counts[key] += value
+        return {'done': all(batch['done'] for batch in handle['batches']), 'statuses': statuses, 'counts': counts}
+    
+    def collect_batch(
+        self,
+        handle: Dict[str, Any],
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Wait for a submitted batch job and map its results back to the inputs
+        
+        Args:
+            handle: submit_batch() return value
+            poll_interval: Seconds between status checks
+            timeout: Give up waiting after this many seconds (None: wait)
             
         Returns:
-            {
-                'provider': str,
-                'model': str,
-                'text': str,
-                'success': bool,
-                'error': Optional[str]
-            }
+            List of result dicts in input order, same shape as generate()
+            plus 'id' (the input id) and 'batch_id'. Items the provider did
+            not finish (expired, cancelled) are failed results.
         """
+        provider = handle['provider']
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.batch_status(handle)['done']:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Batch not finished after {timeout}s: {[b['id'] for b in handle['batches']]}")
+            time.sleep(poll_interval)
         
-        # Auto-select provider (prefer free)
-        if provider == "auto":
-            if 'gemini' in self.available_providers:
-                provider = 'gemini'
-            elif 'groq' in self.available_providers:
-                provider = 'groq'
-            elif 'ollama' in self.available_providers:
-                provider = 'ollama'
-            elif 'huggingface' in self.available_providers:
-                provider = 'huggingface'
-            elif 'openai' in self.available_providers:
-                provider = 'openai'
-            elif 'claude' in self.available_providers:
-                provider = 'claude'
-            else:
-                return {
-                    'provider': None,
-                    'model': None,
-                    'text': None,
-                    'success': False,
-                    'error': 'No AI provider available. Please configure API keys.'
-                }
-        
-        # Check if provider is available
-        if provider not in self.available_providers:
+        results: List[Optional[Dict[str, Any]]] = [None] * len(handle['ids'])
+        for batch in handle['batches']:
+            for custom_id, result in self._batch_results(provider, batch['id']):
+                index = int(custom_id.split('-', 1)[1])
+                if result['model'] is None:
+                    result['model'] = handle['models'][index]
+                result['batch_id'] = batch['id']
+                results[index] = result
+        for index, result in enumerate(results):
+            if result is None:
+                batch_id = next(b['id'] for b in handle['batches'] if b['offset'] <= index < b['offset'] + b['count'])
+                result = self._error_result(provider, handle['models'][index], 'missing from batch results (expired or cancelled)')
+                result['batch_id'] = batch_id
+                results[index] = result
+            result['id'] = handle['ids'][index]
+        return results
+    
+    def generate_batch(
+        self,
+        prompts: Iterable[Union[str, Dict[str, Any]]],
+        provider: str = "openai",
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        system: Optional[str] = None,
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """submit_batch() + collect_batch(): generate_many() through the provider's Batch API"""
+        handle = self.submit_batch(prompts, provider, model, temperature, max_tokens, system)
+        return self.collect_batch(handle, poll_interval, timeout)
+    
+    def _batch_request(
+        self,
+        provider: str,
+        custom_id: str,
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        system: Optional[str]
+    ) -> Dict[str, Any]:
+        """One request of a batch file (OpenAI) / batch body (Claude)"""
+        if provider == 'openai':
             return {
-                'provider': provider,
-                'model': None,
-                'text': None,
-                'success': False,
-                'error': f'{provider} not available. Check API key or installation.'
-            }
-        
-        # Generate
-        try:
-            if provider == "gemini":
-                result = self._generate_gemini(prompt, temperature, max_tokens)
-            elif provider == "openai":
-                result = self._generate_openai(prompt, model or "gpt-3.5-turbo", temperature, max_tokens)
-            elif provider == "claude":
-                result = self._generate_claude(prompt, model or "claude-3-haiku-20240307", temperature, max_tokens)
-            elif provider == "groq":
-                result = self._generate_groq(prompt, model or "llama3-70b-8192", temperature, max_tokens)
-            elif provider == "huggingface":
-                result = self._generate_huggingface(prompt, model or "gpt2")
-            elif provider == "ollama":
-                result = self._generate_ollama(prompt, model or "llama3", temperature, max_tokens)
-            else:
-                return {
-                    'provider': provider,
-                    'model': None,
-                    'text': None,
-                    'success': False,
-                    'error': f'Unknown provider: {provider}'
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': {
+                    'model': model,
+                    'messages': self._chat_messages(prompt, system),
+                    'temperature': temperature,
+                    'max_tokens': max_tokens
                 }
-            
-            return result
-            
-        except Exception as e:
-            return {
-                'provider': provider,
+            }
+        return {
+            'custom_id': custom_id,
+            'params': {
                 'model': model,
-                'text': None,
-                'success': False,
-                'error': str(e)
+                'max_tokens': max_tokens,
+                'temperature': temperature,
+                'messages': [{"role": "user", "content": prompt}],
+                **self._claude_system(system)
+            }
+        }
+    
+    def _submit_batch(self, provider: str, requests: List[Dict[str, Any]]) -> str:
+        """Create one provider batch, return its id"""
+        if provider == 'openai':
+            data = ''.join(json.dumps(request, ensure_ascii=False) + '\n' for request in requests)
+            input_file = self.openai.files.create(
+                file=('batch.jsonl', data.encode('utf-8')), purpose='batch'
+            )
+            batch = self.openai.batches.create(
+                input_file_id=input_file.id, endpoint='/v1/chat/completions', completion_window='24h'
+            )
+            return batch.id
+        return self.claude.messages.batches.create(requests=requests).id
+    
+    def _batch_state(self, provider: str, batch_id: str) -> Tuple[str, bool, Dict[str, int]]:
+        """(provider status, finished?, {'succeeded', 'failed', 'processing'})"""
+        if provider == 'openai':
+            batch = self.openai.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            succeeded = counts.completed if counts else 0
+            failed = counts.failed if counts else 0
+            return batch.status, batch.status in OPENAI_BATCH_FINAL, {
+                'succeeded': succeeded,
+                'failed': failed,
+                'processing': (counts.total - succeeded - failed) if counts else 0
+            }
+        batch = self.claude.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return batch.processing_status, batch.processing_status == 'ended', {
+            'succeeded': counts.succeeded,
+            'failed': counts.errored + counts.expired + counts.canceled,
+            'processing': counts.processing
+        }
+    
+    def _batch_results(self, provider: str, batch_id: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(custom_id, result dict) for every finished request of one batch"""
+        if provider == 'openai':
+            from openai.types.chat import ChatCompletion
+            batch = self.openai.batches.retrieve(batch_id)
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                for line in self.openai.files.content(file_id).text.splitlines():
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    response = record.get('response') or {}
+                    if record.get('error') or response.get('status_code') != 200:
+                        error = record.get('error') or (response.get('body') or {}).get('error') or {}
+                        yield record['custom_id'], self._error_result(
+                            'openai', None, f"batch request failed ({response.get('status_code')}): {error.get('message', error)}"
+                        )
+                        continue
+                    completion = ChatCompletion.model_validate(response['body'])
+                    yield record['custom_id'], {
+                        'provider': 'openai',
+                        'model': completion.model,
+                        'text': completion.choices[0].message.content,
+                        'success': True,
+                        'error': None,
+                        'usage': self._openai_usage(completion.usage)
+                    }
+            return
+        for entry in self.claude.messages.batches.results(batch_id):
+            result = entry.result
+            if result.type != 'succeeded':
+                error = getattr(getattr(result, 'error', None), 'error', None)
+                yield entry.custom_id, self._error_result(
+                    'claude', None, f"batch request {result.type}: {getattr(error, 'message', '')}".rstrip(': ')
+                )
+                continue
+            message = result.message
+            yield entry.custom_id, {
+                'provider': 'claude',
+                'model': message.model,
+                'text': ''.join(block.text for block in message.content if block.type == 'text'),
+                'success': True,
+                'error': None,
+                'usage': self._claude_usage(message.usage)
+            }
+    
+    # ---- Response parsing (shared by sync and async paths) ----
+    
+    @staticmethod
+    def _check_response(response: 'httpx.Response') -> Any:
+        """
+        Decode a raw-HTTP provider response, raising ProviderHTTPError on
+        error statuses or error bodies (e.g. Hugging Face "model is loading")
+        """
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        error = data.get('error') if isinstance(data, dict) else None
+        if response.status_code >= 400 or error:
+            retry_after = _parse_retry_after(response.headers.get('retry-after'))
+            loading = isinstance(data, dict) and data.get('estimated_time') is not None
+            if loading:
+                retry_after = float(data['estimated_time'])
+            status = response.status_code if response.status_code >= 400 else 503
+            raise ProviderHTTPError(status, str(error or response.text[:200]), retry_after, loading)
+        return data
+    
+    @staticmethod
+    def _parse_huggingface(result: Any) -> str:
+        """Extract generated text from a Hugging Face inference response"""
+        if isinstance(result, list) and len(result) > 0:
+            return result[0].get('generated_text', str(result))
+        elif isinstance(result, dict) and 'generated_text' in result:
+            return result['generated_text']
+        return str(result)
+    
+    def _hf_payload(self, model: str, inputs: List[str], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        """Request body for the Inference API (a single input is sent as a string)"""
+        parameters = {'max_new_tokens': max_tokens}
+        if temperature > 0:
+            parameters['temperature'] = temperature
+        else:
+            parameters['do_sample'] = False   # the API rejects temperature 0
+        return {
+            'inputs': inputs[0] if len(inputs) == 1 else inputs,
+            'parameters': parameters,
+            'options': self.hf_batcher.options(model)
+        }
+    
+    def _hf_answers(self, model: str, inputs: List[str], response: Any) -> List[str]:
+        """Generated text per input of a (batched) Inference API response"""
+        try:
+            data = self._check_response(response)
+        except ProviderHTTPError as e:
+            if e.status == 503:
+                self.hf_batcher.mark_loading(model, True)
+            raise
+        self.hf_batcher.mark_loading(model, False)
+        if len(inputs) == 1:
+            return [self._parse_huggingface(data)]
+        if not isinstance(data, list) or len(data) != len(inputs):
+            raise ProviderHTTPError(502, f'expected {len(inputs)} answers for a batched request')
+        return [self._parse_huggingface(answer if isinstance(answer, list) else [answer]) for answer in data]
+    
+    def _hf_post(self, model: str, inputs: List[str], temperature: float, max_tokens: int) -> List[str]:
+        """One Inference API request for a batch of inputs"""
+        response = self.http.client.post(
+            HF_API_URL.format(model=model), headers={"Authorization": f"Bearer {self.hf_key}"},
+            json=self._hf_payload(model, inputs, temperature, max_tokens)
+        )
+        return self._hf_answers(model, inputs, response)
+    
+    async def _ahf_post(self, model: str, inputs: List[str], temperature: float, max_tokens: int) -> List[str]:
+        """One Inference API request for a batch of inputs (async)"""
+        response = await self.http.async_client.post(
+            HF_API_URL.format(model=model), headers={"Authorization": f"Bearer {self.hf_key}"},
+            json=self._hf_payload(model, inputs, temperature, max_tokens)
+        )
+        return self._hf_answers(model, inputs, response)
+    
+    @staticmethod
+    def _gemini_config(temperature: float, max_tokens: int):
+        """Gemini GenerationConfig"""
+        import google.generativeai as genai
+        return genai.types.GenerationConfig(temperature=temperature, max_output_tokens=max_tokens)
+    
+    @staticmethod
+    def _ollama_payload(
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        stream: bool = False,
+        system: Optional[str] = None,
+        keep_alive: Optional[Union[str, int]] = None
+    ) -> Dict[str, Any]:
+        """Request body for Ollama /api/generate"""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens
             }
+        }
+        if system:
+            payload["system"] = system
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+    
+    # ---- Prompt-prefix caching ----
+    
+    @staticmethod
+    def _chat_messages(prompt: str, system: Optional[str]) -> List[Dict[str, str]]:
+        """
+        OpenAI-style messages (OpenAI, Groq). The stable system prefix goes
+        first and unchanged, so OpenAI's automatic prompt caching can reuse it
+        """
+        if not system:
+            return [{"role": "user", "content": prompt}]
+        return [{"role": "system", "content": system}, {"role": "user", "content": prompt}]
+    
+    @staticmethod
+    def _claude_system(system: Optional[str]) -> Dict[str, Any]:
+        """
+        Claude `system` argument with a cache_control breakpoint on the prefix
+        (prefixes below the model's minimum cacheable length are just not cached)
+        """
+        if not system:
+            return {}
+        return {'system': [{'type': 'text', 'text': system, 'cache_control': {'type': 'ephemeral'}}]}
+    
+    # ---- Token usage (normalized: see generate() 'usage') ----
+    
+    @staticmethod
+    def _usage(
+        input_tokens: int,
+        output_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0,
+        estimated: bool = False
+    ) -> Dict[str, Any]:
+        return {
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cached_tokens': cached_tokens,
+            'cache_write_tokens': cache_write_tokens,
+            'total_tokens': input_tokens + output_tokens,
+            'estimated': estimated
+        }
+    
+    @classmethod
+    def _openai_usage(cls, usage: Any) -> Optional[Dict[str, Any]]:
+        """OpenAI-style usage (OpenAI, Groq): prompt_tokens includes cached ones"""
+        if usage is None or getattr(usage, 'prompt_tokens', None) is None:
+            return None
+        details = getattr(usage, 'prompt_tokens_details', None)
+        return cls._usage(
+            usage.prompt_tokens,
+            usage.completion_tokens or 0,
+            getattr(details, 'cached_tokens', None) or 0
+        )
+    
+    @classmethod
+    def _claude_usage(cls, usage: Any) -> Optional[Dict[str, Any]]:
+        """Claude usage: input_tokens excludes cache reads/writes, so add them back"""
+        if usage is None or getattr(usage, 'input_tokens', None) is None:
+            return None
+        cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+        cache_write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+        return cls._usage(
+            usage.input_tokens + cache_read + cache_write,
+            usage.output_tokens or 0,
+            cache_read,
+            cache_write
+        )
+    
+    @classmethod
+    def _gemini_usage(cls, response: Any) -> Optional[Dict[str, Any]]:
+        """Gemini usage_metadata: prompt_token_count includes cached content"""
+        metadata = getattr(response, 'usage_metadata', None)
+        if metadata is None or not getattr(metadata, 'prompt_token_count', None):
+            return None
+        return cls._usage(
+            metadata.prompt_token_count,
+            getattr(metadata, 'candidates_token_count', None) or 0,
+            getattr(metadata, 'cached_content_token_count', None) or 0
+        )
+    
+    @classmethod
+    def _ollama_usage(cls, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ollama final response: prompt_eval_count / eval_count"""
+        if 'eval_count' not in data:
+            return None
+        # prompt_eval_count is left out when the whole prompt came from the KV cache
+        return cls._usage(data.get('prompt_eval_count', 0), data['eval_count'])
+    
+    def _ollama_extras(self, model: str, data: Dict[str, Any], url: str) -> Dict[str, Any]:
+        """
+        Usage, server timings and host of a finished Ollama response; a
+        response means the model is resident (on that host) now
+        """
+        self.ollama_models.mark_resident(model)
+        self.ollama_pool.mark_resident(url, model)
+        timings = {
+            name: data[f'{name}_duration'] / 1e9
+            for name in ('load', 'prompt_eval', 'eval', 'total')
+            if data.get(f'{name}_duration') is not None
+        }
+        return {'usage': self._ollama_usage(data), 'timings': timings or None, 'host': url}
+    
+    @classmethod
+    def _estimate_usage(cls, prompt: str, system: Optional[str], text: Optional[str]) -> Dict[str, Any]:
+        """Estimated usage when the provider reports none (Hugging Face, mocks)"""
+        return cls._usage(
+            estimate_tokens((system or '') + prompt),
+            estimate_tokens(text) if text else 0,
+            estimated=True
+        )
+    
+    def _fill_usage(self, result: Dict[str, Any], prompt: str, system: Optional[str]):
+        """Make sure a successful result carries usage"""
+        if result.get('usage') is None:
+            result['usage'] = self._estimate_usage(prompt, system, result.get('text'))
+    
+    @staticmethod
+    def _with_system(prompt: str, system: Optional[str]) -> str:
+        """Plain-text prompt with the prefix prepended (Hugging Face)"""
+        return f"{system}\n\n{prompt}" if system else prompt
+    
+    def _gemini_model(self, model: str, system: Optional[str]) -> Any:
+        """
+        Gemini model for a (model, system) pair
+        
+        Long prefixes (>= GEMINI_CACHE_MIN_TOKENS) are uploaded once as
+        CachedContent and reused until they expire; shorter ones use
+        system_instruction. Instances are cached per model name either way.
+        """
+        key = hashlib.sha256(f'{model}\0{system or ""}'.encode('utf-8')).hexdigest()
+        with self._clients_lock:
+            entry = self._gemini_models.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._gemini_models.move_to_end(key)
+                return entry[0]
+        
+        import google.generativeai as genai
+        self.gemini  # make sure genai.configure() ran (done when the client is built)
+        instance, expires_at = None, float('inf')
+        if system and estimate_tokens(system) >= GEMINI_CACHE_MIN_TOKENS:
+            try:
+                import datetime
+                cached = genai.caching.CachedContent.create(
+                    model=f'models/{model}',
+                    system_instruction=system,
+                    ttl=datetime.timedelta(seconds=GEMINI_CACHE_TTL)
+                )
+                instance = genai.GenerativeModel.from_cached_content(cached)
+                # Refresh a little before the server-side copy expires
+                expires_at = time.time() + GEMINI_CACHE_TTL * 0.9
+            except Exception as e:
+                print(f"⚠️ Gemini context cache unavailable for {model}: {e}")
+        if instance is None:
+            instance = genai.GenerativeModel(model, system_instruction=system or None)
+        
+        with self._clients_lock:
+            self._gemini_models[key] = (instance, expires_at)
+            while len(self._gemini_models) > 16:
+                self._gemini_models.popitem(last=False)
+        return instance
     
-    def _generate_gemini(self, prompt: str, temperature: float, max_tokens: int) -> Dict:
+    # ---- Sync provider calls ----
+    
+    def _generate_gemini(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
         """Gemini generation"""
-        response = self.gemini.generate_content(
+        response = self._gemini_model(model, system).generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
-            )
+            generation_config=self._gemini_config(temperature, max_tokens)
         )
         return {
             'provider': 'gemini',
-            'model': 'gemini-pro',
+            'model': model,
             'text': response.text,
             'success': True,
-            'error': None
+            'error': None,
+            'usage': self._gemini_usage(response)
         }
     
-    def _generate_openai(self, prompt: str, model: str, temperature: float, max_tokens: int) -> Dict:
+    def _generate_openai(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
         """OpenAI generation"""
         response = self.openai.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=self._chat_messages(prompt, system),
             temperature=temperature,
             max_tokens=max_tokens
         )
@@ -226,29 +3621,32 @@ class UnifiedAI:
             'model': model,
             'text': response.choices[0].message.content,
             'success': True,
-            'error': None
+            'error': None,
+            'usage': self._openai_usage(response.usage)
         }
     
-    def _generate_claude(self, prompt: str, model: str, temperature: float, max_tokens: int) -> Dict:
+    def _generate_claude(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
         """Claude generation"""
         message = self.claude.messages.create(
             model=model,
             max_tokens=max_tokens,
             temperature=temperature,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            **self._claude_system(system)
         )
         return {
             'provider': 'claude',
             'model': model,
             'text': message.content[0].text,
             'success': True,
-            'error': None
+            'error': None,
+            'usage': self._claude_usage(message.usage)
         }
     
-    def _generate_groq(self, prompt: str, model: str, temperature: float, max_tokens: int) -> Dict:
+    def _generate_groq(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
         """Groq generation"""
         chat_completion = self.groq.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
+            messages=self._chat_messages(prompt, system),
             model=model,
             temperature=temperature,
             max_tokens=max_tokens
@@ -258,61 +3656,551 @@ class UnifiedAI:
             'model': model,
             'text': chat_completion.choices[0].message.content,
             'success': True,
-            'error': None
+            'error': None,
+            'usage': self._openai_usage(chat_completion.usage)
         }
     
-    def _generate_huggingface(self, prompt: str, model: str) -> Dict:
-        """Hugging Face generation"""
-        API_URL = f"https://api-inference.huggingface.co/models/{model}"
-        headers = {"Authorization": f"Bearer {self.hf_key}"}
-        
-        response = requests.post(API_URL, headers=headers, json={"inputs": prompt})
-        result = response.json()
-        
-        if isinstance(result, list) and len(result) > 0:
-            text = result[0].get('generated_text', str(result))
-        elif isinstance(result, dict) and 'generated_text' in result:
-            text = result['generated_text']
-        else:
-            text = str(result)
-        
+    def _generate_huggingface(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
+        """Hugging Face generation (micro-batched with concurrent calls)"""
+        text, batch_size = self.hf_batcher.submit(
+            (model, temperature, max_tokens), self._with_system(prompt, system),
+            lambda inputs: self._hf_post(model, inputs, temperature, max_tokens)
+        )
         return {
             'provider': 'huggingface',
             'model': model,
             'text': text,
             'success': True,
-            'error': None
+            'error': None,
+            'batch_size': batch_size
         }
     
-    def _generate_ollama(self, prompt: str, model: str, temperature: float, max_tokens: int) -> Dict:
+    def _generate_ollama(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
         """Ollama (local) generation"""
-        response = requests.post('http://localhost:11434/api/generate', 
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": max_tokens
-                }
-            }
+        with self.ollama_pool.lease(model) as url:
+            response = self.http.client.post(f'{url}/api/generate',
+                json=self._ollama_payload(prompt, model, temperature, max_tokens, system=system,
+                                     keep_alive=self.ollama_models.keep_alive_for(model))
+            )
+            result = self._check_response(response)
+        return {
+            'provider': 'ollama',
+            'model': model,
+            'text': result.get('response', ''),
+            'success': True,
+            'error': None,
+            **self._ollama_extras(model, result, url)
+        }
+    
+    # ---- Async provider calls ----
+    
+    async def _agenerate_gemini(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
+        """Gemini generation (async)"""
+        response = await self._gemini_model(model, system).generate_content_async(
+            prompt,
+            generation_config=self._gemini_config(temperature, max_tokens)
+        )
+        return {
+            'provider': 'gemini',
+            'model': model,
+            'text': response.text,
+            'success': True,
+            'error': None,
+            'usage': self._gemini_usage(response)
+        }
+    
+    async def _agenerate_openai(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
+        """OpenAI generation (async)"""
+        response = await self.openai_async.chat.completions.create(
+            model=model,
+            messages=self._chat_messages(prompt, system),
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return {
+            'provider': 'openai',
+            'model': model,
+            'text': response.choices[0].message.content,
+            'success': True,
+            'error': None,
+            'usage': self._openai_usage(response.usage)
+        }
+    
+    async def _agenerate_claude(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
+        """Claude generation (async)"""
+        message = await self.claude_async.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}],
+            **self._claude_system(system)
+        )
+        return {
+            'provider': 'claude',
+            'model': model,
+            'text': message.content[0].text,
+            'success': True,
+            'error': None,
+            'usage': self._claude_usage(message.usage)
+        }
+    
+    async def _agenerate_groq(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
+        """Groq generation (async)"""
+        chat_completion = await self.groq_async.chat.completions.create(
+            messages=self._chat_messages(prompt, system),
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        return {
+            'provider': 'groq',
+            'model': model,
+            'text': chat_completion.choices[0].message.content,
+            'success': True,
+            'error': None,
+            'usage': self._openai_usage(chat_completion.usage)
+        }
+    
+    async def _agenerate_huggingface(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
+        """Hugging Face generation (async, micro-batched with concurrent calls)"""
+        text, batch_size = await self.hf_batcher.asubmit(
+            (model, temperature, max_tokens), self._with_system(prompt, system),
+            lambda inputs: self._ahf_post(model, inputs, temperature, max_tokens)
         )
-        result = response.json()
+        return {
+            'provider': 'huggingface',
+            'model': model,
+            'text': text,
+            'success': True,
+            'error': None,
+            'batch_size': batch_size
+        }
+    
+    async def _agenerate_ollama(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Dict:
+        """Ollama (local) generation (async)"""
+        with self.ollama_pool.lease(model) as url:
+            response = await self.http.async_client.post(
+                f'{url}/api/generate',
+                json=self._ollama_payload(prompt, model, temperature, max_tokens, system=system,
+                                     keep_alive=self.ollama_models.keep_alive_for(model))
+            )
+            result = self._check_response(response)
         return {
             'provider': 'ollama',
             'model': model,
             'text': result.get('response', ''),
             'success': True,
-            'error': None
+            'error': None,
+            **self._ollama_extras(model, result, url)
         }
     
+    # ---- Streaming provider calls (yield text pieces, then {'usage': ...}) ----
+    
+    @staticmethod
+    def _delta_text(chunk: Any) -> Optional[str]:
+        """Text delta of an OpenAI-style (OpenAI, Groq) stream chunk"""
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
+    
+    @staticmethod
+    def _chunk_usage(chunk: Any) -> Any:
+        """Usage of an OpenAI-style stream chunk (OpenAI: chunk.usage, Groq: chunk.x_groq.usage)"""
+        return getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+    
+    @staticmethod
+    def _ollama_line(line: str) -> Optional[Dict[str, Any]]:
+        """One parsed Ollama NDJSON stream line"""
+        if not line.strip():
+            return None
+        data = json.loads(line)
+        if 'error' in data:
+            raise ProviderHTTPError(500, data['error'])
+        return data
+    
+    def _stream_gemini(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        response = self._gemini_model(model, system).generate_content(
+            prompt, generation_config=self._gemini_config(temperature, max_tokens), stream=True
+        )
+        for chunk in response:
+            yield chunk.text
+        yield {'usage': self._gemini_usage(response)}
+    
+    def _stream_openai(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        stream = self.openai.chat.completions.create(
+            model=model,
+            messages=self._chat_messages(prompt, system),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        usage = None
+        for chunk in stream:
+            yield self._delta_text(chunk)
+            usage = self._chunk_usage(chunk) or usage
+        yield {'usage': self._openai_usage(usage)}
+    
+    def _stream_claude(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        with self.claude.messages.stream(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}],
+            **self._claude_system(system)
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
+            yield {'usage': self._claude_usage(stream.get_final_message().usage)}
+    
+    def _stream_groq(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        stream = self.groq.chat.completions.create(
+            messages=self._chat_messages(prompt, system),
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        usage = None
+        for chunk in stream:
+            yield self._delta_text(chunk)
+            usage = self._chunk_usage(chunk) or usage
+        yield {'usage': self._openai_usage(usage)}
+    
+    def _stream_huggingface(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        yield self._generate_huggingface(prompt, model, temperature, max_tokens, system)['text']
+    
+    def _stream_ollama(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> Iterator[str]:
+        with self.ollama_pool.lease(model) as url, self.http.client.stream(
+            'POST', f'{url}/api/generate',
+            json=self._ollama_payload(prompt, model, temperature, max_tokens, stream=True, system=system,
+                                 keep_alive=self.ollama_models.keep_alive_for(model))
+        ) as response:
+            if response.status_code >= 400:
+                response.read()
+                self._check_response(response)
+            for line in response.iter_lines():
+                data = self._ollama_line(line)
+                if data is None:
+                    continue
+                yield data.get('response')
+                if data.get('done'):
+                    yield self._ollama_extras(model, data, url)
+    
+    async def _astream_gemini(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        response = await self._gemini_model(model, system).generate_content_async(
+            prompt, generation_config=self._gemini_config(temperature, max_tokens), stream=True
+        )
+        async for chunk in response:
+            yield chunk.text
+        yield {'usage': self._gemini_usage(response)}
+    
+    async def _astream_openai(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        stream = await self.openai_async.chat.completions.create(
+            model=model,
+            messages=self._chat_messages(prompt, system),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        usage = None
+        async for chunk in stream:
+            yield self._delta_text(chunk)
+            usage = self._chunk_usage(chunk) or usage
+        yield {'usage': self._openai_usage(usage)}
+    
+    async def _astream_claude(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        async with self.claude_async.messages.stream(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}],
+            **self._claude_system(system)
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            yield {'usage': self._claude_usage((await stream.get_final_message()).usage)}
+    
+    async def _astream_groq(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        stream = await self.groq_async.chat.completions.create(
+            messages=self._chat_messages(prompt, system),
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        usage = None
+        async for chunk in stream:
+            yield self._delta_text(chunk)
+            usage = self._chunk_usage(chunk) or usage
+        yield {'usage': self._openai_usage(usage)}
+    
+    async def _astream_huggingface(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        yield (await self._agenerate_huggingface(prompt, model, temperature, max_tokens, system))['text']
+    
+    async def _astream_ollama(self, prompt: str, model: str, temperature: float, max_tokens: int, system: Optional[str] = None) -> AsyncIterator[str]:
+        with self.ollama_pool.lease(model) as url:
+            async with self.http.async_client.stream(
+                'POST', f'{url}/api/generate',
+                json=self._ollama_payload(prompt, model, temperature, max_tokens, stream=True, system=system,
+                                     keep_alive=self.ollama_models.keep_alive_for(model))
+            ) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    self._check_response(response)
+                async for line in response.aiter_lines():
+                    data = self._ollama_line(line)
+                    if data is None:
+                        continue
+                    yield data.get('response')
+                    if data.get('done'):
+                        yield self._ollama_extras(model, data, url)
+    
     def list_available(self) -> list:
         """List available providers"""
         return self.available_providers
 
+class JSONLJob:
+    """
+    Bulk generation job: JSONL prompts in, JSONL results out
+    
+    Input lines are prompt strings ("...") or objects of generate()
+    arguments, optionally with an "id" ({"id": "q1", "prompt": "...",
+    "provider": "groq"}). Lines are read lazily and only a bounded window of
+    them is in flight, so memory stays constant however large the input is.
+    Results are appended to the output as they complete (in completion
+    order, tagged with "id" and input "line") and progress is checkpointed:
+    
+        {"next_line": N,          # every line before N is done
+         "done": [...],           # lines >= N already done (at most `window`)
+         "output_bytes": B}       # output size that matches this checkpoint
+    
+    On resume the output is truncated back to output_bytes, so results
+    written after the last checkpoint are redone once instead of duplicated.
+    Resuming from stdin works as long as the same input is piped again.
+    """
+    
+    RESULT_FIELDS = ('provider', 'model', 'text', 'success', 'error', 'usage')
+    
+    def __init__(
+        self,
+        ai: 'UnifiedAI',
+        output_path: str,
+        checkpoint_path: Optional[str] = None,
+        concurrency: int = 8,
+        window: Optional[int] = None,
+        checkpoint_interval: float = 5.0,
+        defaults: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            ai: UnifiedAI client that runs the calls
+            output_path: Results JSONL (appended to)
+            checkpoint_path: Progress file (default: output_path + '.ckpt')
+            concurrency: Calls in flight
+            window: Max input lines read ahead of the oldest unfinished one
+                    (default: 8 * concurrency) - bounds memory when one call is slow
+            checkpoint_interval: Seconds between checkpoint writes
+            defaults: generate() arguments for every line (provider, model, ...)
+        """
+        self.ai = ai
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path or output_path + '.ckpt'
+        self.concurrency = max(1, concurrency)
+        self.window = max(self.concurrency, window or 8 * self.concurrency)
+        self.checkpoint_interval = checkpoint_interval
+        self.defaults = defaults or {}
+        self.stats = {'processed': 0, 'succeeded': 0, 'failed': 0, 'skipped': 0}
+    
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'next_line': 0, 'done': [], 'output_bytes': 0}
+    
+    def _save_checkpoint(self, next_line: int, done: set, output_bytes: int, complete: bool = False):
+        """Atomic write: a crash leaves either the old or the new checkpoint"""
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'next_line': next_line, 'done': sorted(done),
+                       'output_bytes': output_bytes, 'complete': complete}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+    
+    def _parse(self, line_no: int, line: str) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        """(item id, generate() arguments) or (item id, None) for an invalid line"""
+        try:
+            item = json.loads(line)
+        except ValueError:
+            return line_no, None
+        if isinstance(item, str):
+            item = {'prompt': item}
+        if not isinstance(item, dict) or not isinstance(item.get('prompt'), str):
+            return line_no, None
+        item = dict(item)
+        item_id = item.pop('id', line_no)
+        return item_id, {**self.defaults, **item}
+    
+    def _run_one(self, line_no: int, line: str) -> Dict[str, Any]:
+        item_id, kwargs = self._parse(line_no, line)
+        if kwargs is None:
+            result = self.ai._error_result(None, None, 'invalid input line (expected a JSON string or an object with "prompt")')
+        else:
+            try:
+                result = self.ai.generate(**kwargs)
+            except Exception as e:
+                result = self.ai._error_result(kwargs.get('provider'), kwargs.get('model'), str(e))
+        record = {'id': item_id, 'line': line_no}
+        record.update((field, result.get(field)) for field in self.RESULT_FIELDS)
+        return record
+    
+    def run(self, lines: Iterable[str]) -> Dict[str, int]:
+        """
+        Process the input lines (a file object or sys.stdin), resuming from the checkpoint
+        
+        Returns:
+            Stats: processed, succeeded, failed (this run) and skipped (done before)
+        """
+        checkpoint = self._load_checkpoint()
+        next_line = checkpoint['next_line']
+        done = set(checkpoint['done'])
+        
+        # Drop results written after the last checkpoint: they are redone below
+        mode = 'r+b' if checkpoint['output_bytes'] and os.path.exists(self.output_path) else 'wb'
+        output = open(self.output_path, mode)
+        output.truncate(checkpoint['output_bytes'] if mode == 'r+b' else 0)
+        output.seek(0, os.SEEK_END)
+        
+        pending: Dict[Any, int] = {}
+        last_checkpoint = time.monotonic()
+        lines_iter = enumerate(lines)
+        buffered: Optional[Tuple[int, str]] = None
+        exhausted = False
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        
+        def collect(futures: Iterable[Any]):
+            for future in futures:
+                line_no = pending.pop(future)
+                record = future.result()
+                output.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+                # Only a written line counts as done (checkpoint_now flushes
+                # the output before the checkpoint that records it)
+                done.add(line_no)
+                self.stats['processed'] += 1
+                self.stats['succeeded' if record['success'] else 'failed'] += 1
+        
+        def checkpoint_now(complete: bool = False):
+            nonlocal next_line
+            # Advance the watermark over the contiguous finished prefix
+            while next_line in done:
+                done.discard(next_line)
+                next_line += 1
+            output.flush()
+            os.fsync(output.fileno())
+            self._save_checkpoint(next_line, done, output.tell(), complete)
+        
+        try:
+            while True:
+                # Fill the pool, never reading more than `window` lines past the watermark
+                while len(pending) < self.concurrency:
+                    if buffered is None:
+                        buffered = next(lines_iter, None)
+                        if buffered is None:
+                            exhausted = True
+                            break
+                    line_no, line = buffered
+                    if line_no - next_line >= self.window:
+                        break
+                    buffered = None
+                    if line_no < next_line or line_no in done:
+                        self.stats['skipped'] += 1
+                    elif not line.strip():
+                        done.add(line_no)
+                    else:
+                        pending[executor.submit(self._run_one, line_no, line)] = line_no
+                
+                if pending:
+                    finished, _ = futures_wait(list(pending), return_when=FIRST_COMPLETED)
+                    collect(finished)
+                elif exhausted:
+                    break
+                
+                while next_line in done:
+                    done.discard(next_line)
+                    next_line += 1
+                if time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                    checkpoint_now()
+                    last_checkpoint = time.monotonic()
+            
+            checkpoint_now(complete=True)
+        except KeyboardInterrupt:
+            # Drain: let the in-flight calls finish, keep their results, checkpoint
+            executor.shutdown(wait=True)
+            collect([future for future in pending if not future.cancelled()])
+            checkpoint_now()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+            output.close()
+        return self.stats
+
+
 # CLI Usage
+def run_job(args) -> None:
+    """Bulk mode: python unified_ai_client.py --input prompts.jsonl --output results.jsonl"""
+    ai = UnifiedAI()
+    if not ai.available_providers:
+        print("❌ No providers available!", file=sys.stderr)
+        sys.exit(1)
+    defaults = {'provider': args.provider, 'max_tokens': args.max_tokens, 'temperature': args.temperature}
+    if args.model:
+        defaults['model'] = args.model
+    if args.system:
+        defaults['system'] = args.system
+    job = JSONLJob(
+        ai, args.output, checkpoint_path=args.checkpoint, concurrency=args.concurrency,
+        checkpoint_interval=args.checkpoint_interval, defaults=defaults
+    )
+    started = time.perf_counter()
+    try:
+        if args.input == '-':
+            stats = job.run(sys.stdin)
+        else:
+            with open(args.input, encoding='utf-8') as f:
+                stats = job.run(f)
+    except KeyboardInterrupt:
+        print(f"\n⏸️  Interrupted - progress saved to {job.checkpoint_path}, run again to resume", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        ai.close()
+    elapsed = time.perf_counter() - started
+    print(f"✅ {stats['processed']} processed ({stats['succeeded']} ok, {stats['failed']} failed), "
+          f"{stats['skipped']} skipped (already done) in {elapsed:.1f}s -> {args.output}", file=sys.stderr)
+
+
 def main():
     """Main CLI function"""
+    parser = argparse.ArgumentParser(description='Unified AI Client')
+    parser.add_argument('--input', '-i', help='Bulk mode: prompts JSONL file ("-" = stdin)')
+    parser.add_argument('--output', '-o', help='Bulk mode: results JSONL file')
+    parser.add_argument('--checkpoint', help='Progress file (default: OUTPUT.ckpt)')
+    parser.add_argument('--checkpoint-interval', type=float, default=5.0, help='Seconds between checkpoints')
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help='Calls in flight')
+    parser.add_argument('--provider', default='auto')
+    parser.add_argument('--model')
+    parser.add_argument('--system', help='System prompt for every line')
+    parser.add_argument('--max-tokens', type=int, default=1000)
+    parser.add_argument('--temperature', type=float, default=0.7)
+    args = parser.parse_args()
+    if args.input:
+        if not args.output:
+            parser.error('--output is required with --input')
+        run_job(args)
+        return
+    
     print("=" * 60)
     print("🤖 Unified AI Client - All AI APIs in One Interface")
     print("=" * 60)
@@ -344,14 +4232,15 @@ def main():
     # Test prompt
     prompt = "Python nedir? Çok kısa açıkla (max 2 cümle)."
     
-    # Test all available providers
-    for provider in ai.available_providers:
+    # Test all available providers (concurrently, printed in order)
+    results = ai.generate_many(
+        [{'prompt': prompt, 'provider': provider} for provider in ai.available_providers]
+    )
+    for provider, result in zip(ai.available_providers, results):
         print(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
         print(f"Testing: {provider.upper()}")
         print("")
         
-        result = ai.generate(prompt, provider=provider)
-        
         if result['success']:
             print(f"✅ Success!")
             print(f"Model: {result['model']}")
@@ -2,10 +2,29 @@
 """
 Gemini Streaming Example
 Real-time streaming responses
+
+Sıralı mod prompt'ları tek tek stream eder. --concurrent ile tüm stream'ler
+aynı anda çalışır; toplam süre, sürelerin toplamı yerine en yavaş stream'e
+yaklaşır. Her stream'in chunk'ları kendi consumer'ına (terminal paneli,
+dosya veya callback) bounded bir kuyruk üzerinden gider: consumer yavaşsa
+kuyruk dolar ve o stream'in okunması durur (backpressure), diğerleri
+etkilenmez.
+
+Usage:
+    python gemini_streaming.py                          # sıralı
+    python gemini_streaming.py --concurrent             # eşzamanlı, terminal panelleri
+    python gemini_streaming.py --concurrent --output-dir out/   # her stream bir dosyaya
 """
 
 import os
 import sys
+import time
+import queue
+import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
 
@@ -19,7 +38,12 @@ def check_and_configure_api():
         print("❌ HATA: Geçerli bir API key bulunamadı!")
         sys.exit(1)
     
-    genai.configure(api_key=api_key)
+    # GEMINI_API_ENDPOINT: REST endpoint (ör. yerel mock sunucu)
+    endpoint = os.getenv('GEMINI_API_ENDPOINT')
+    if endpoint:
+        genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': endpoint})
+    else:
+        genai.configure(api_key=api_key)
     return api_key
 
 def stream_generate(prompt: str, model_name: str = "gemini-pro"):
@@ -43,8 +67,220 @@ def stream_generate(prompt: str, model_name: str = "gemini-pro"):
     except Exception as e:
         print(f"\n❌ Hata: {str(e)}")
 
+
+class CallbackSink:
+    """Chunk'ları bir fonksiyona ileten consumer"""
+    
+    def __init__(self, callback: Callable[[str], Any]):
+        self.callback = callback
+    
+    def write(self, text: str):
+        self.callback(text)
+    
+    def close(self):
+        pass
+
+
+class TerminalPanes:
+    """
+    Her stream için bir terminal satırı: durum ve metnin son kısmı
+    (ANSI ile yerinde yeniden çizilir, en fazla redraw_interval'de bir)
+    """
+    
+    def __init__(self, titles: List[str], redraw_interval: float = 0.05):
+        self.titles = titles
+        self.texts = [''] * len(titles)
+        self.done = [False] * len(titles)
+        self.redraw_interval = redraw_interval
+        self._drawn_at = 0.0
+        self._lock = threading.Lock()
+        print('\n' * len(titles), end='', flush=True)   # paneller için yer ayır
+    
+    def pane(self, index: int) -> 'TerminalPanes._Pane':
+        return TerminalPanes._Pane(self, index)
+    
+    class _Pane:
+        def __init__(self, panes: 'TerminalPanes', index: int):
+            self.panes = panes
+            self.index = index
+        
+        def write(self, text: str):
+            self.panes._update(self.index, text, False)
+        
+        def close(self):
+            self.panes._update(self.index, '', True)
+    
+    def _update(self, index: int, text: str, done: bool):
+        with self._lock:
+            self.texts[index] += text
+            self.done[index] = self.done[index] or done
+            now = time.monotonic()
+            if done or now - self._drawn_at >= self.redraw_interval:
+                self._drawn_at = now
+                self._draw()
+    
+    def _draw(self):
+        width = shutil.get_terminal_size().columns
+        lines = [f'\x1b[{len(self.titles)}F']   # panellerin başına dön
+        for title, text, done in zip(self.titles, self.texts, self.done):
+            head = f"{'✅' if done else '⏳'} {title}: "
+            tail = ' '.join(text.split())[-max(0, width - len(head) - 2):]
+            lines.append(f'\x1b[2K{head}{tail}\n')
+        sys.stdout.write(''.join(lines))
+        sys.stdout.flush()
+
+
+def _produce(model, prompt: str, chunks: queue.Queue, stats: Dict[str, Any]):
+    """Stream'i oku ve chunk'ları kuyruğa koy (kuyruk doluysa bekle)"""
+    started = time.perf_counter()
+    try:
+        response = model.generate_content(prompt, stream=True)
+        for chunk in response:
+            text = chunk.text
+            if stats['time_to_first_chunk'] is None:
+                stats['time_to_first_chunk'] = time.perf_counter() - started
+            waiting = time.perf_counter()
+            chunks.put(text)   # backpressure: consumer yetişemiyorsa burada durur
+            stats['blocked'] += time.perf_counter() - waiting
+            stats['chunks'] += 1
+        metadata = getattr(response, 'usage_metadata', None)
+        stats['tokens'] = getattr(metadata, 'candidates_token_count', None) or None
+    except Exception as e:
+        stats['error'] = str(e)
+    finally:
+        stats['duration'] = time.perf_counter() - started
+        chunks.put(None)
+
+
+def _consume(chunks: queue.Queue, sink, stats: Dict[str, Any]):
+    """Kuyruktaki chunk'ları stream'in consumer'ına yaz"""
+    parts = []
+    text = ''
+    try:
+        while True:
+            text = chunks.get()
+            if text is None:
+                break
+            parts.append(text)
+            sink.write(text)
+    finally:
+        # Consumer hata verdiyse kuyruğu stream sonuna kadar boşalt: yoksa
+        # producer dolu kuyrukta sonsuza kadar bekler
+        while text is not None:
+            text = chunks.get()
+        stats['text'] = ''.join(parts)
+        if hasattr(sink, 'close'):
+            sink.close()
+
+
+def stream_concurrently(
+    prompts: List[str],
+    model_name: str = "gemini-pro",
+    sinks: Optional[List[Any]] = None,
+    max_concurrency: Optional[int] = None,
+    queue_size: int = 16
+) -> List[Dict[str, Any]]:
+    """
+    Prompt'ları eşzamanlı stream et, chunk'ları stream başına consumer'a dağıt
+    
+    Args:
+        prompts: Prompt listesi
+        model_name: Gemini modeli
+        sinks: Stream başına consumer (write(text) ve isteğe bağlı close()
+               olan nesne: dosya, TerminalPanes.pane(i), CallbackSink);
+               stream bitince close() çağrılır
+        max_concurrency: Aynı anda açık stream sayısı (varsayılan: hepsi)
+        queue_size: Stream başına tamponlanan chunk sayısı (backpressure sınırı)
+    
+    Returns:
+        Stream başına istatistik: time_to_first_chunk, duration, chunks,
+        tokens, tokens_per_second, blocked (backpressure'da geçen süre), text, error
+    
+    Raises:
+        Bir consumer'ın (sink) hatası, tüm stream'ler bittikten sonra
+    """
+    if not prompts:
+        return []
+    model = genai.GenerativeModel(model_name)
+    sinks = sinks or [CallbackSink(lambda text: None) for _ in prompts]
+    stats = [
+        {'prompt': prompt, 'time_to_first_chunk': None, 'duration': None, 'chunks': 0,
+         'tokens': None, 'tokens_per_second': None, 'blocked': 0.0, 'text': '', 'error': None}
+        for prompt in prompts
+    ]
+    queues = [queue.Queue(maxsize=queue_size) for _ in prompts]
+    
+    # Okuyucular sınırlı; yazıcılar her stream için bir thread (biri yavaşsa
+    # sadece kendi stream'i bekler)
+    with ThreadPoolExecutor(max_workers=len(prompts)) as consumers, \
+            ThreadPoolExecutor(max_workers=max_concurrency or len(prompts)) as producers:
+        consuming = [
+            consumers.submit(_consume, chunks, sink, stream_stats)
+            for chunks, sink, stream_stats in zip(queues, sinks, stats)
+        ]
+        for prompt, chunks, stream_stats in zip(prompts, queues, stats):
+            producers.submit(_produce, model, prompt, chunks, stream_stats)
+    for future in consuming:
+        future.result()   # sink hatasını çağırana ilet
+    
+    for stream_stats in stats:
+        if stream_stats['tokens'] is None and stream_stats['text']:
+            # Sunucu token sayısı vermediyse kelime sayısı (yaklaşık)
+            stream_stats['tokens'] = len(stream_stats['text'].split())
+        generating = (stream_stats['duration'] or 0) - (stream_stats['time_to_first_chunk'] or 0)
+        if stream_stats['tokens'] and generating > 0:
+            stream_stats['tokens_per_second'] = stream_stats['tokens'] / generating
+    return stats
+
+
+def print_stream_stats(stats: List[Dict[str, Any]], wall_time: float):
+    """Stream başına TTFC ve tokens/sec tablosu"""
+    print("")
+    print(f"{'#':<4}{'ttfc ms':>9}{'süre s':>9}{'chunk':>7}{'token':>7}{'tok/s':>8}{'bekleme s':>11}  durum")
+    for i, s in enumerate(stats, 1):
+        ttfc = f"{s['time_to_first_chunk'] * 1000:>9.0f}" if s['time_to_first_chunk'] is not None else f"{'-':>9}"
+        rate = f"{s['tokens_per_second']:>8.1f}" if s['tokens_per_second'] else f"{'-':>8}"
+        print(f"{i:<4}{ttfc}{s['duration']:>9.2f}{s['chunks']:>7}{s['tokens'] or 0:>7}{rate}"
+              f"{s['blocked']:>11.2f}  {'❌ ' + s['error'] if s['error'] else '✅'}")
+    total = sum(s['duration'] for s in stats)
+    print(f"\n⏱️  Toplam: {wall_time:.2f}s (sıralı olsaydı ~{total:.2f}s, "
+          f"en yavaş stream {max(s['duration'] for s in stats):.2f}s)")
+
+
+def run_concurrent(prompts: List[str], model_name: str, output_dir: Optional[str], max_concurrency: Optional[int], queue_size: int):
+    """Eşzamanlı mod: terminal panelleri veya dosyalar"""
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        paths = [os.path.join(output_dir, f'stream_{i}.txt') for i in range(1, len(prompts) + 1)]
+        sinks = [open(path, 'w', encoding='utf-8') for path in paths]
+        print(f"📁 Stream'ler yazılıyor: {output_dir}")
+    elif sys.stdout.isatty():
+        panes = TerminalPanes([f'Soru {i}' for i in range(1, len(prompts) + 1)])
+        sinks = [panes.pane(i) for i in range(len(prompts))]
+    else:
+        sinks = None
+    
+    started = time.perf_counter()
+    stats = stream_concurrently(prompts, model_name, sinks, max_concurrency, queue_size)
+    wall_time = time.perf_counter() - started
+    
+    if sinks is None:
+        for i, s in enumerate(stats, 1):
+            print(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+            print(f"📝 Soru {i}: {s['prompt']}")
+            print(f"🌟 Gemini: {s['text']}")
+    print_stream_stats(stats, wall_time)
+
 def main():
     """Ana fonksiyon"""
+    parser = argparse.ArgumentParser(description='Gemini streaming example')
+    parser.add_argument('--concurrent', action='store_true', help="Stream'leri eşzamanlı çalıştır")
+    parser.add_argument('--model', default='gemini-pro')
+    parser.add_argument('--output-dir', help="Eşzamanlı modda her stream'i bir dosyaya yaz")
+    parser.add_argument('--max-concurrency', type=int, help='Aynı anda açık stream sayısı')
+    parser.add_argument('--queue-size', type=int, default=16, help='Stream başına chunk tamponu')
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("🌟 Google Gemini - Streaming Example")
     print("=" * 60)
@@ -62,12 +298,15 @@ def main():
         "Yapay zeka ve makine öğrenmesi arasındaki fark nedir?"
     ]
     
-    for i, prompt in enumerate(prompts, 1):
-        print(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-        print(f"📝 Soru {i}: {prompt}")
-        print("")
-        
-        stream_generate(prompt)
+    if args.concurrent:
+        run_concurrent(prompts, args.model, args.output_dir, args.max_concurrency, args.queue_size)
+    else:
+        for i, prompt in enumerate(prompts, 1):
+            print(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+            print(f"📝 Soru {i}: {prompt}")
+            print("")
+            
+            stream_generate(prompt, args.model)
     
     print("=" * 60)
     print("✅ Tüm streaming örnekleri tamamlandı!")
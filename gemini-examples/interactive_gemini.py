@@ -4,23 +4,47 @@ Interactive Gemini Chat Console
 İnteraktif Gemini konsol uygulaması
 """
 
+import argparse
 import os
 import sys
+from datetime import datetime
+from typing import Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+# Oturum deposu python-examples ile ortak: tek modül, kopyası yok
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python-examples'))
+from session_store import SessionStore
+
 # .env dosyasını yükle
 load_dotenv()
 
 class GeminiChat:
-    def __init__(self, model_name: str = "gemini-pro"):
-        """GeminiChat'i başlat"""
+    def __init__(
+        self,
+        model_name: str = "gemini-pro",
+        session_store: Optional[SessionStore] = None
+    ):
+        """
+        GeminiChat'i başlat
+        
+        Args:
+            model_name: Gemini model ismi
+            session_store: Mesajları diske yazan oturum deposu (None: kalıcı değil)
+        """
         self.model_name = model_name
+        self.session_store = session_store
+        self.session_id: Optional[str] = None
         self.model = None
         self.chat = None
         
-    def initialize(self):
-        """API client'ı başlat"""
+    def initialize(self, session_id: Optional[str] = None):
+        """
+        API client'ı başlat
+        
+        Args:
+            session_id: Devam ettirilecek oturum (session_store gerekli)
+        """
         # Her iki environment variable'ı da kontrol et
         api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
         
@@ -39,11 +63,40 @@ class GeminiChat:
         # Chat session başlat
         self.chat = self.model.start_chat(history=[])
         
+        if self.session_store:
+            if session_id:
+                self.resume(session_id)
+            else:
+                self.session_id = self.session_store.create()
+    
+    def resume(self, session_id: str):
+        """Kayıtlı oturumu devam ettir (sadece son mesajlar okunur)"""
+        history = [
+            {'role': m['role'], 'parts': [m['content']]}
+            for m in self.session_store.load(session_id)
+        ]
+        # History 'user' ile başlamalı
+        while history and history[0]['role'] != 'user':
+            history.pop(0)
+        self.chat = self.model.start_chat(history=history)
+        self.session_id = session_id
+    
+    def _persist(self, user_message: str, reply: str):
+        """Tamamlanan turu oturum log'una ekle"""
+        if not self.session_store:
+            return
+        try:
+            self.session_store.append(self.session_id, 'user', user_message)
+            self.session_store.append(self.session_id, 'model', reply)
+        except Exception as e:
+            print(f"\n⚠️  Oturum kaydedilemedi: {e}")
+        
     def send_message(self, user_message: str) -> dict:
         """Kullanıcı mesajına yanıt ver"""
         try:
             # Mesaj gönder (history otomatik korunur)
             response = self.chat.send_message(user_message)
+            self._persist(user_message, response.text)
             
             return {
                 'success': True,
@@ -61,6 +114,8 @@ class GeminiChat:
     def clear_history(self):
         """Conversation history'yi temizle"""
         self.chat = self.model.start_chat(history=[])
+        if self.session_store:
+            self.session_store.clear(self.session_id)
         print("✅ Conversation history temizlendi")
     
     def get_history_count(self) -> int:
@@ -94,20 +149,51 @@ def print_header():
     print("  /clear   - Conversation history'yi temizle")
     print("  /history - Conversation history'yi göster")
     print("  /count   - Mesaj sayısını göster")
+    print("  /session - Oturum id'sini göster")
+    print("  /sessions - Kayıtlı oturumları listele")
+    print("  /resume <id> - Kayıtlı oturuma geç")
     print("  /quit    - Çıkış")
     print("")
     print("Bir şey sormak için yazmaya başlayın...")
     print("=" * 60)
     print("")
 
+def print_sessions(store: SessionStore):
+    """Kayıtlı oturumları yazdır"""
+    sessions = store.list_sessions()
+    if not sessions:
+        print("📝 Kayıtlı oturum yok")
+        return
+    for s in sessions:
+        updated = datetime.fromtimestamp(s['updated']).strftime('%Y-%m-%d %H:%M')
+        print(f"  {s['id']}  {updated}  {s['messages']:>4} mesaj  {s['title'] or '-'}")
+
 def main():
     """Ana fonksiyon"""
+    parser = argparse.ArgumentParser(description='Interactive Gemini Chat Console')
+    parser.add_argument('--session', help='Kayıtlı oturumu devam ettir (id)')
+    parser.add_argument('--list-sessions', action='store_true', help='Kayıtlı oturumları listele')
+    parser.add_argument('--no-persist', action='store_true', help='Oturumu diske kaydetme')
+    args = parser.parse_args()
+    
+    store = None if args.no_persist else SessionStore()
+    if args.list_sessions:
+        if store:
+            print_sessions(store)
+        return
+    if args.session and (not store or not store.exists(args.session)):
+        print(f"❌ Oturum bulunamadı: {args.session}")
+        sys.exit(1)
+    
     # GeminiChat'i başlat
-    chat = GeminiChat()
-    chat.initialize()
+    chat = GeminiChat(session_store=store)
+    chat.initialize(session_id=args.session)
     
     # Başlık yazdır
     print_header()
+    if chat.session_id:
+        state = "devam ediyor" if args.session else "yeni"
+        print(f"💾 Oturum: {chat.session_id} ({state}, {chat.get_history_count()} mesaj)\n")
     
     # Ana loop
     while True:
@@ -121,7 +207,9 @@ def main():
             
             # Komut kontrolü
             if user_input.startswith('/'):
-                command = user_input.lower()
+                command, _, argument = user_input.partition(' ')
+                command = command.lower()
+                argument = argument.strip()
                 
                 if command == '/quit':
                     print("\n👋 Görüşmek üzere!")
@@ -138,6 +226,19 @@ def main():
                     count = chat.get_history_count()
                     print(f"📝 Conversation history: {count} mesaj")
                     
+                elif command == '/session':
+                    print(f"💾 Oturum: {chat.session_id or '- (kalıcı değil)'}")
+                    
+                elif command == '/sessions' and store:
+                    print_sessions(store)
+                    
+                elif command == '/resume' and store:
+                    if argument and store.exists(argument):
+                        chat.resume(argument)
+                        print(f"✅ Oturum {argument} yüklendi ({chat.get_history_count()} mesaj)")
+                    else:
+                        print(f"❌ Oturum bulunamadı: {argument or '-'}")
+                    
                 elif command == '/help':
                     print_header()
                     
@@ -125,6 +125,9 @@ __pycache__/
 *.log
 gemini_api.log
 
+# Chat oturumları
+chat_sessions.db*
+
 # OS
 .DS_Store
 Thumbs.db
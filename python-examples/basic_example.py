@@ -12,6 +12,10 @@ from dotenv import load_dotenv
 # .env dosyasını yükle
 load_dotenv()
 
+# Her çağrıda aynı ve ilk sırada: OpenAI'ın otomatik prompt caching'i
+# sabit prefix'i (>= 1024 token olduğunda) tekrar kullanır
+SYSTEM_PROMPT = "Sen yardımcı bir asistansın."
+
 def check_api_key():
     """API key'in varlığını kontrol et"""
     api_key = os.getenv('OPENAI_API_KEY')
@@ -53,13 +57,15 @@ def chat_completion(prompt: str, model: str = "gpt-3.5-turbo") -> dict:
         response = client.chat.completions.create(
             model=model,
             messages=[
-                {"role": "system", "content": "Sen yardımcı bir asistansın."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
             max_tokens=500
         )
         
+        details = getattr(response.usage, 'prompt_tokens_details', None)
+        
         # Yanıtı döndür
         return {
             'success': True,
@@ -68,7 +74,8 @@ def chat_completion(prompt: str, model: str = "gpt-3.5-turbo") -> dict:
             'usage': {
                 'prompt_tokens': response.usage.prompt_tokens,
                 'completion_tokens': response.usage.completion_tokens,
-                'total_tokens': response.usage.total_tokens
+                'total_tokens': response.usage.total_tokens,
+                'cached_tokens': getattr(details, 'cached_tokens', None) or 0
             }
         }
         
@@ -112,7 +119,8 @@ def main():
             print(result['content'])
             print("")
             print(f"📊 Token kullanımı: {result['usage']['total_tokens']} tokens")
-            print(f"   (Prompt: {result['usage']['prompt_tokens']}, Completion: {result['usage']['completion_tokens']})")
+            print(f"   (Prompt: {result['usage']['prompt_tokens']}, Completion: {result['usage']['completion_tokens']}, "
+                  f"Cached: {result['usage']['cached_tokens']})")
         else:
             print(f"❌ Hata: {result['error']}")
         
@@ -4,26 +4,214 @@ Interactive ChatGPT Console
 İnteraktif ChatGPT konsol uygulaması
 """
 
+import argparse
 import os
 import sys
+from collections import deque
 from datetime import datetime
 from openai import OpenAI
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Optional, Callable
+
+from session_store import SessionStore
+
+# Opsiyonel: doğru token sayımı için - pip install tiktoken
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
 # .env dosyasını yükle
 load_dotenv()
 
+# Sabit prefix: her istekte ilk mesaj ve hiç değişmez, böylece OpenAI'ın
+# otomatik prompt caching'i (>= 1024 token prefix) tekrar tekrar kullanabilir
+SYSTEM_PROMPT = "Sen yardımcı, arkadaş canlısı ve bilgili bir asistansın. Sorulara detaylı ve anlaşılır yanıtlar veriyorsun."
+
+# Her chat mesajının format maliyeti (role, ayraçlar) - OpenAI chat formatı
+MESSAGE_OVERHEAD_TOKENS = 4
+
+class ContextWindow:
+    """
+    Token bütçesi içinde kalan conversation history
+    
+    System prompt + (opsiyonel) eski mesajların özeti + son mesajlar.
+    Bütçe aşılınca en eski mesajlar pencereden çıkar; summarizer verilmişse
+    çıkan mesajlar toplu olarak rolling summary'ye eklenir. Böylece her
+    turda gönderilen token sayısı (ve gecikme) oturum uzadıkça büyümez.
+    """
+    
+    def __init__(
+        self,
+        system_prompt: str,
+        max_tokens: int = 3000,
+        model: str = "gpt-3.5-turbo",
+        summarizer: Optional[Callable[[str, List[Dict[str, str]]], str]] = None,
+        summary_batch_tokens: int = 500
+    ):
+        """
+        Args:
+            system_prompt: Her istekte gönderilen system mesajı
+            max_tokens: Gönderilen mesajlar için token bütçesi
+            model: Token sayımı için model (tiktoken varsa)
+            summarizer: (eski_özet, çıkan_mesajlar) -> yeni_özet
+            summary_batch_tokens: Özet ancak bu kadar token birikince güncellenir
+                                  (her turda ekstra API çağrısı yapmamak için)
+        """
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.summary_batch_tokens = summary_batch_tokens
+        self._encoding = self._load_encoding(model)
+        
+        self.system = {"role": "system", "content": system_prompt}
+        self.summary = ""
+        self._window: deque = deque()   # (message, tokens)
+        self._window_tokens = 0
+        self._evicted: List[Dict[str, str]] = []
+        self._evicted_tokens = 0
+    
+    @staticmethod
+    def _load_encoding(model: str):
+        """tiktoken encoding (yoksa None -> yaklaşık sayım)"""
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    
+    def count(self, text: str) -> int:
+        """Metnin token sayısı (tiktoken yoksa ~4 karakter = 1 token)"""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(text) // 4 + 1
+    
+    def _message_tokens(self, message: Dict[str, str]) -> int:
+        return self.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+    
+    def _fixed_tokens(self) -> int:
+        """System prompt + özet"""
+        tokens = self._message_tokens(self.system)
+        if self.summary:
+            tokens += self.count(self.summary) + MESSAGE_OVERHEAD_TOKENS
+        return tokens
+    
+    def add(self, role: str, content: str):
+        """Mesaj ekle ve bütçeye sığdır"""
+        message = {"role": role, "content": content}
+        tokens = self._message_tokens(message)
+        self._window.append((message, tokens))
+        self._window_tokens += tokens
+        self._trim()
+    
+    def _trim(self):
+        """En eski mesajları bütçeye sığana kadar çıkar (son mesaj hep kalır)"""
+        while len(self._window) > 1 and self._fixed_tokens() + self._window_tokens > self.max_tokens:
+            self._evict()
+            # Pencere assistant yanıtıyla başlamasın (user/assistant çiftleri birlikte çıkar)
+            while len(self._window) > 1 and self._window[0][0]["role"] == "assistant":
+                self._evict()
+        
+        if self.summarizer and self._evicted_tokens >= self.summary_batch_tokens:
+            self._fold()
+    
+    def _evict(self):
+        message, tokens = self._window.popleft()
+        self._window_tokens -= tokens
+        self._evicted.append(message)
+        self._evicted_tokens += tokens
+    
+    def _fold(self):
+        """Çıkan mesajları rolling summary'ye ekle"""
+        try:
+            self.summary = self.summarizer(self.summary, self._evicted)
+        except Exception as e:
+            print(f"\n⚠️  Özet güncellenemedi: {e}")
+        self._evicted = []
+        self._evicted_tokens = 0
+        # Özet büyüdüyse pencereyi yeniden sığdır (çıkanlar bir sonraki özete girer)
+        while len(self._window) > 1 and self._fixed_tokens() + self._window_tokens > self.max_tokens:
+            self._evict()
+    
+    def restore(self, messages: List[Dict[str, str]]):
+        """Kayıtlı mesajları geri yükle (bütçeye sığmayanlar özetlenmeden atılır)"""
+        self.clear()
+        for message in messages:
+            tokens = self._message_tokens(message)
+            self._window.append((message, tokens))
+            self._window_tokens += tokens
+        while len(self._window) > 1 and self._fixed_tokens() + self._window_tokens > self.max_tokens:
+            self._window_tokens -= self._window.popleft()[1]
+        while len(self._window) > 1 and self._window[0][0]["role"] == "assistant":
+            self._window_tokens -= self._window.popleft()[1]
+    
+    def messages(self) -> List[Dict[str, str]]:
+        """
+        API'ye gönderilecek mesaj listesi
+        
+        Sıra en kararlıdan en değişkene: system prompt, özet (sadece toplu
+        güncellenir), son mesajlar. Provider'ın prefix cache'i en uzun ortak
+        başlangıcı yeniden kullanır.
+        """
+        messages = [self.system]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Önceki konuşmanın özeti: {self.summary}"})
+        messages.extend(message for message, _ in self._window)
+        return messages
+    
+    def tokens(self) -> int:
+        """Bir sonraki istekte gönderilecek tahmini prompt token sayısı"""
+        return self._fixed_tokens() + self._window_tokens
+    
+    def clear(self):
+        """System prompt hariç her şeyi sil"""
+        self.summary = ""
+        self._window.clear()
+        self._window_tokens = 0
+        self._evicted = []
+        self._evicted_tokens = 0
+    
+    def __len__(self) -> int:
+        return len(self._window)
+
 class InteractiveChatBot:
-    def __init__(self, model: str = "gpt-3.5-turbo"):
-        """ChatBot'u başlat"""
+    def __init__(
+        self,
+        model: str = "gpt-3.5-turbo",
+        context_tokens: int = 3000,
+        summarize: bool = True,
+        session_store: Optional[SessionStore] = None
+    ):
+        """
+        ChatBot'u başlat
+        
+        Args:
+            model: OpenAI model ismi
+            context_tokens: Her istekte gönderilen history için token bütçesi
+            summarize: Pencereden çıkan eski mesajları özetle
+            session_store: Mesajları diske yazan oturum deposu (None: kalıcı değil)
+        """
         self.model = model
-        self.messages: List[Dict[str, str]] = []
+        self.context_tokens = context_tokens
+        self.summarize = summarize
+        self.session_store = session_store
+        self.session_id: Optional[str] = None
+        self.context: Optional[ContextWindow] = None
         self.client = None
         self.total_tokens = 0
+    
+    @property
+    def messages(self) -> List[Dict[str, str]]:
+        """Bir sonraki istekte gönderilecek mesajlar"""
+        return self.context.messages()
+        
+    def initialize(self, session_id: Optional[str] = None):
+        """
+        API client'ı başlat
         
-    def initialize(self):
-        """API client'ı başlat"""
+        Args:
+            session_id: Devam ettirilecek oturum (session_store gerekli)
+        """
         api_key = os.getenv('OPENAI_API_KEY')
         
         if not api_key or api_key == 'your-api-key-here':
@@ -33,16 +221,54 @@ class InteractiveChatBot:
         
         self.client = OpenAI(api_key=api_key)
         
-        # System prompt ekle
-        self.messages.append({
-            "role": "system",
-            "content": "Sen yardımcı, arkadaş canlısı ve bilgili bir asistansın. Sorulara detaylı ve anlaşılır yanıtlar veriyorsun."
-        })
+        # System prompt + token bütçeli history
+        self.context = ContextWindow(
+            SYSTEM_PROMPT,
+            max_tokens=self.context_tokens,
+            model=self.model,
+            summarizer=self._summarize if self.summarize else None
+        )
+        
+        if self.session_store:
+            if session_id:
+                self.resume(session_id)
+            else:
+                self.session_id = self.session_store.create()
+    
+    def resume(self, session_id: str):
+        """Kayıtlı oturumu devam ettir (sadece son mesajlar okunur)"""
+        self.context.restore(self.session_store.load(session_id))
+        self.session_id = session_id
+    
+    def _persist(self, role: str, content: str):
+        """Mesajı oturum log'una ekle"""
+        if not self.session_store:
+            return
+        try:
+            self.session_store.append(self.session_id, role, content)
+        except Exception as e:
+            print(f"\n⚠️  Oturum kaydedilemedi: {e}")
+    
+    def _summarize(self, summary: str, messages: List[Dict[str, str]]) -> str:
+        """Eski mesajları mevcut özetle birleştir (kısa bir API çağrısı)"""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "Konuşmayı, sonraki yanıtlar için gereken bilgileri koruyarak birkaç cümleyle özetle."},
+                {"role": "user", "content": f"Mevcut özet:\n{summary or '-'}\n\nYeni mesajlar:\n{transcript}"}
+            ],
+            temperature=0.3,
+            max_tokens=300
+        )
+        self.total_tokens += response.usage.total_tokens
+        return response.choices[0].message.content
         
     def chat(self, user_message: str) -> dict:
         """Kullanıcı mesajına yanıt ver"""
         # Kullanıcı mesajını ekle
-        self.messages.append({"role": "user", "content": user_message})
+        self.context.add("user", user_message)
+        self._persist("user", user_message)
         
         try:
             # API çağrısı
@@ -57,15 +283,18 @@ class InteractiveChatBot:
             assistant_message = response.choices[0].message.content
             
             # Conversation history'ye ekle
-            self.messages.append({"role": "assistant", "content": assistant_message})
+            self.context.add("assistant", assistant_message)
+            self._persist("assistant", assistant_message)
             
             # Token kullanımını güncelle
             self.total_tokens += response.usage.total_tokens
+            details = getattr(response.usage, 'prompt_tokens_details', None)
             
             return {
                 'success': True,
                 'content': assistant_message,
                 'tokens': response.usage.total_tokens,
+                'cached_tokens': getattr(details, 'cached_tokens', None) or 0,
                 'total_tokens': self.total_tokens
             }
             
@@ -74,19 +303,21 @@ class InteractiveChatBot:
                 'success': False,
                 'error': str(e),
                 'tokens': 0,
+                'cached_tokens': 0,
                 'total_tokens': self.total_tokens
             }
     
     def clear_history(self):
         """Conversation history'yi temizle"""
-        system_prompt = self.messages[0]
-        self.messages = [system_prompt]
+        self.context.clear()
+        if self.session_store:
+            self.session_store.clear(self.session_id)
         self.total_tokens = 0
         print("✅ Conversation history temizlendi")
     
     def get_history_count(self) -> int:
-        """Conversation history'deki mesaj sayısı"""
-        return len(self.messages) - 1  # System prompt'u sayma
+        """Context window'daki mesaj sayısı (system prompt ve özet hariç)"""
+        return len(self.context)
 
 def print_header():
     """Başlık yazdır"""
@@ -98,20 +329,51 @@ def print_header():
     print("  /help    - Yardım")
     print("  /clear   - Conversation history'yi temizle")
     print("  /history - Mesaj sayısını göster")
+    print("  /session - Oturum id'sini göster")
+    print("  /sessions - Kayıtlı oturumları listele")
+    print("  /resume <id> - Kayıtlı oturuma geç")
     print("  /quit    - Çıkış")
     print("")
     print("Bir şey sormak için yazmaya başlayın...")
     print("=" * 60)
     print("")
 
+def print_sessions(store: SessionStore):
+    """Kayıtlı oturumları yazdır"""
+    sessions = store.list_sessions()
+    if not sessions:
+        print("📝 Kayıtlı oturum yok")
+        return
+    for s in sessions:
+        updated = datetime.fromtimestamp(s['updated']).strftime('%Y-%m-%d %H:%M')
+        print(f"  {s['id']}  {updated}  {s['messages']:>4} mesaj  {s['title'] or '-'}")
+
 def main():
     """Ana fonksiyon"""
+    parser = argparse.ArgumentParser(description='Interactive ChatGPT Console')
+    parser.add_argument('--session', help='Kayıtlı oturumu devam ettir (id)')
+    parser.add_argument('--list-sessions', action='store_true', help='Kayıtlı oturumları listele')
+    parser.add_argument('--no-persist', action='store_true', help='Oturumu diske kaydetme')
+    args = parser.parse_args()
+    
+    store = None if args.no_persist else SessionStore()
+    if args.list_sessions:
+        if store:
+            print_sessions(store)
+        return
+    if args.session and (not store or not store.exists(args.session)):
+        print(f"❌ Oturum bulunamadı: {args.session}")
+        sys.exit(1)
+    
     # ChatBot'u başlat
-    bot = InteractiveChatBot()
-    bot.initialize()
+    bot = InteractiveChatBot(session_store=store)
+    bot.initialize(session_id=args.session)
     
     # Başlık yazdır
     print_header()
+    if bot.session_id:
+        state = "devam ediyor" if args.session else "yeni"
+        print(f"💾 Oturum: {bot.session_id} ({state}, {bot.get_history_count()} mesaj)\n")
     
     # Ana loop
     while True:
@@ -125,7 +387,9 @@ def main():
             
             # Komut kontrolü
             if user_input.startswith('/'):
-                command = user_input.lower()
+                command, _, argument = user_input.partition(' ')
+                command = command.lower()
+                argument = argument.strip()
                 
                 if command == '/quit':
                     print("\n👋 Görüşmek üzere!")
@@ -137,7 +401,21 @@ def main():
                     
                 elif command == '/history':
                     count = bot.get_history_count()
-                    print(f"📝 Conversation history: {count} mesaj")
+                    print(f"📝 Conversation history: {count} mesaj, ~{bot.context.tokens()} token"
+                          + (" (+ özet)" if bot.context.summary else ""))
+                    
+                elif command == '/session':
+                    print(f"💾 Oturum: {bot.session_id or '- (kalıcı değil)'}")
+                    
+                elif command == '/sessions' and store:
+                    print_sessions(store)
+                    
+                elif command == '/resume' and store:
+                    if argument and store.exists(argument):
+                        bot.resume(argument)
+                        print(f"✅ Oturum {argument} yüklendi ({bot.get_history_count()} mesaj)")
+                    else:
+                        print(f"❌ Oturum bulunamadı: {argument or '-'}")
                     
                 elif command == '/help':
                     print_header()
@@ -155,7 +433,8 @@ def main():
             if result['success']:
                 # Yanıtı yazdır
                 print(result['content'])
-                print(f"\n   [Tokens: {result['tokens']}, Total: {result['total_tokens']}]")
+                cached = f", Cached: {result['cached_tokens']}" if result['cached_tokens'] else ""
+                print(f"\n   [Tokens: {result['tokens']}{cached}, Total: {result['total_tokens']}]")
             else:
                 print(f"\n❌ Hata: {result['error']}")
             
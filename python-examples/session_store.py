@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Chat Session Store
+Kalıcı, kaldığı yerden devam ettirilebilen chat oturumları
+
+Append-only SQLite (WAL mode) log: her mesaj tek bir INSERT, hiçbir şey
+yeniden yazılmaz. Oturumlar id ile devam ettirilir ve sadece son N mesaj
+okunur (tüm dosya belleğe yüklenmez). Aynı process içinde çok sayıda
+oturum olabilir; bellekte sadece en son kullanılan oturumların kuyruğu
+tutulur, soğuk oturumlar bellekten atılır (veri zaten diskte).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import List, Dict, Optional, Any
+
+DEFAULT_DB_PATH = os.getenv('CHAT_SESSIONS_DB', 'chat_sessions.db')
+
+# /clear işareti: load() sadece son işaretten sonraki mesajları döndürür
+CLEAR_MARKER = '_clear'
+
+class SessionStore:
+    """Append-only, disk tabanlı chat oturum deposu"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_DB_PATH,
+        max_cached_sessions: int = 32,
+        tail_messages: int = 200
+    ):
+        """
+        Args:
+            path: SQLite dosyası
+            max_cached_sessions: Bellekte tutulan (sıcak) oturum sayısı
+            tail_messages: Oturum başına bellekte/okumada tutulan son mesaj sayısı
+        """
+        self.path = path
+        self.max_cached_sessions = max_cached_sessions
+        self.tail_messages = tail_messages
+        self._lock = threading.Lock()
+        # session_id -> {'seq': son sıra no, 'tail': deque(son mesajlar)}
+        self._cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'id TEXT PRIMARY KEY, created REAL, updated REAL, title TEXT)'
+        )
+        # (session_id, seq) primary key + WITHOUT ROWID: bir oturumun mesajları
+        # diskte yan yana durur, son N mesaj tek bir index aralığı okumasıdır
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS messages ('
+            'session_id TEXT, seq INTEGER, role TEXT, content TEXT, ts REAL, '
+            'PRIMARY KEY (session_id, seq)) WITHOUT ROWID'
+        )
+        self._db.commit()
+
+    def create(self, title: str = '') -> str:
+        """Yeni oturum aç, id döndür"""
+        session_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO sessions (id, created, updated, title) VALUES (?, ?, ?, ?)',
+                (session_id, now, now, title)
+            )
+            self._db.commit()
+            self._remember(session_id, {'seq': 0, 'tail': deque(maxlen=self.tail_messages)})
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        """Oturum var mı?"""
+        with self._lock:
+            if session_id in self._cache:
+                return True
+            row = self._db.execute('SELECT 1 FROM sessions WHERE id = ?', (session_id,)).fetchone()
+            return row is not None
+
+    def append(self, session_id: str, role: str, content: str):
+        """Oturuma bir mesaj ekle (tek INSERT)"""
+        now = time.time()
+        with self._lock:
+            entry = self._page_in(session_id)
+            entry['seq'] += 1
+            self._db.execute(
+                'INSERT INTO messages (session_id, seq, role, content, ts) VALUES (?, ?, ?, ?, ?)',
+                (session_id, entry['seq'], role, content, now)
+            )
+            self._db.execute(
+                'UPDATE sessions SET updated = ?, title = CASE WHEN title = \'\' AND ? = \'user\' '
+                'THEN substr(?, 1, 60) ELSE title END WHERE id = ?',
+                (now, role, content, session_id)
+            )
+            self._db.commit()
+            if role == CLEAR_MARKER:
+                entry['tail'].clear()
+            else:
+                entry['tail'].append({'role': role, 'content': content})
+
+    def clear(self, session_id: str):
+        """Oturumu temizle (append-only: silmek yerine işaret ekler)"""
+        self.append(session_id, CLEAR_MARKER, '')
+
+    def load(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Oturumun son mesajları (eskiden yeniye)
+
+        Args:
+            limit: En fazla kaç mesaj (varsayılan: tail_messages)
+        """
+        limit = min(limit or self.tail_messages, self.tail_messages)
+        with self._lock:
+            entry = self._page_in(session_id)
+            return list(entry['tail'])[-limit:]
+
+    def list_sessions(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """En son güncellenen oturumlar"""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT s.id, s.created, s.updated, s.title, '
+                '(SELECT COUNT(*) FROM messages m WHERE m.session_id = s.id AND m.role != ?) '
+                'FROM sessions s ORDER BY s.updated DESC LIMIT ?',
+                (CLEAR_MARKER, limit)
+            ).fetchall()
+        return [
+            {'id': r[0], 'created': r[1], 'updated': r[2], 'title': r[3], 'messages': r[4]}
+            for r in rows
+        ]
+
+    def _page_in(self, session_id: str) -> Dict[str, Any]:
+        """Oturumu belleğe al: sadece son işaretten sonraki son N mesaj okunur"""
+        entry = self._cache.get(session_id)
+        if entry is not None:
+            self._cache.move_to_end(session_id)
+            return entry
+
+        if self._db.execute('SELECT 1 FROM sessions WHERE id = ?', (session_id,)).fetchone() is None:
+            raise KeyError(f'Session not found: {session_id}')
+
+        seq = self._db.execute(
+            'SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session_id = ?', (session_id,)
+        ).fetchone()[0]
+        cleared_at = self._db.execute(
+            'SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session_id = ? AND role = ?',
+            (session_id, CLEAR_MARKER)
+        ).fetchone()[0]
+        rows = self._db.execute(
+            'SELECT role, content FROM messages WHERE session_id = ? AND seq > ? '
+            'ORDER BY seq DESC LIMIT ?',
+            (session_id, cleared_at, self.tail_messages)
+        ).fetchall()
+
+        tail = deque(
+            ({'role': role, 'content': content} for role, content in reversed(rows)),
+            maxlen=self.tail_messages
+        )
+        entry = {'seq': seq, 'tail': tail}
+        self._remember(session_id, entry)
+        return entry
+
+    def _remember(self, session_id: str, entry: Dict[str, Any]):
+        """LRU'ya ekle, soğuk oturumları bellekten at"""
+        self._cache[session_id] = entry
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.max_cached_sessions:
+            self._cache.popitem(last=False)
+
+    def close(self):
+        """Veritabanını kapat"""
+        with self._lock:
+            self._db.close()
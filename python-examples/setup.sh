@@ -102,6 +102,9 @@ __pycache__/
 *.log
 chatgpt_api.log
 
+# Chat oturumları
+chat_sessions.db*
+
 # OS
 .DS_Store
 Thumbs.db